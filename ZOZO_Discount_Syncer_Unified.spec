@@ -5,7 +5,7 @@ a = Analysis(
     ['sync_zozo_discounts_gui_enhanced.py'],
     pathex=[],
     binaries=[('geckodriver', '.')],
-    datas=[('sku_variant_mapping.xlsx', '.'), ('config.py', '.'), ('zozo_html_parser.py', '.'), ('zozo_discount_sync_processor.py', '.'), ('sync_zozo_discounts_integrated.py', '.'), ('zozo_selenium_fetcher.py', '.'), ('zozo_session.py', '.'), ('firefox_profile', 'firefox_profile')],
+    datas=[('sku_variant_mapping.xlsx', '.'), ('config.py', '.'), ('zozo_html_parser.py', '.'), ('zozo_discount_sync_processor.py', '.'), ('sync_zozo_discounts_integrated.py', '.'), ('zozo_selenium_fetcher.py', '.'), ('zozo_session.py', '.'), ('zozo_fetch_scheduler.py', '.'), ('zozo_tiered_fetcher.py', '.'), ('easystore_client.py', '.'), ('sku_variant_index.py', '.'), ('zozo_parser_backends.py', '.'), ('zozo_sku_engine.py', '.'), ('zozo_html_cache.py', '.'), ('zozo_parse_cache.py', '.'), ('zozo_urls.py', '.'), ('zozo_state_store.py', '.'), ('zozo_priority_scheduler.py', '.'), ('zozo_deadline_restorer.py', '.'), ('zozo_page_corpus.py', '.'), ('firefox_profile', 'firefox_profile')],
     hiddenimports=['selenium', 'selenium.webdriver', 'selenium.webdriver.firefox', 'selenium.webdriver.firefox.options', 'selenium.webdriver.common.by', 'selenium.webdriver.support.ui', 'selenium.webdriver.support', 'selenium.common.exceptions', 'beautifulsoup4', 'bs4', 'pandas', 'openpyxl', 'requests', 'hashlib', 're', 'json', 'datetime', 'collections', 'urllib.parse'],
     hookspath=[],
     hooksconfig={},
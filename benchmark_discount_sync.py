@@ -0,0 +1,344 @@
+# benchmark_discount_sync.py
+"""
+折扣同步流程端到端效能測試
+涵蓋 ZozoHtmlParser.parse（各模式）、SKU 生成、映射表載入、find_matching_sku，
+以及以離線語料庫（ReplayFetcher）與本機 Easy Store 測試伺服器執行的完整 sync_discount
+每項報告吞吐量、p50 / p95 / p99 延遲與程序記憶體峰值，結果存成 JSON 以便比較不同版本
+
+使用方式：
+  python benchmark_discount_sync.py                       # 使用最新的語料庫
+  python benchmark_discount_sync.py --corpus 20250101-120000 --repeat 5
+  python benchmark_discount_sync.py --html page1.html page2.html --only parse,sku
+  python benchmark_discount_sync.py --compare benchmark_results/benchmark_20250101-120000.json
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+from datetime import datetime
+
+import pandas as pd
+from config import WORK_DIR
+from zozo_html_parser import ZozoHtmlParser
+from zozo_sku_engine import SkuEngine, INVENTORY_COLOR_MAP, INVENTORY_PRODUCT_ID_PATTERNS, generate_skus_bulk
+from zozo_discount_sync_processor import ZozoDiscountSyncProcessor
+from zozo_parse_cache import ParseCache, set_parse_cache
+from zozo_page_corpus import PageCorpus, ReplayFetcher, list_corpora
+from sku_variant_index import SkuVariantIndex, load_sku_variant_index, index_cache_path, _read_index_cache
+from easystore_client import EasyStoreClient
+from fake_easystore_server import FakeEasyStore, start_fake_server
+from sync_zozo_discounts_integrated import ZozoDiscountSyncer
+
+RESULTS_DIR = os.path.join(WORK_DIR, "benchmark_results")
+SECTIONS = ("parse", "sku", "mapping", "match", "sync")
+BENCHMARK_MAPPING_NAME = "benchmark_sku_mapping.xlsx"
+DEFAULT_BENCHMARK_PRICE = 10000
+SKU_SAMPLE_SIZE = 20000
+BULK_ROWS = 100000
+
+
+def percentile(sorted_values, pct):
+    """線性內插百分位數（sorted_values 已排序）"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def peak_rss_mb():
+    """程序記憶體峰值（MB），無法取得時為 None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 單位為 KB，macOS 為 bytes
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+    except Exception:
+        return None
+
+
+class BenchmarkRunner:
+    """執行各項測試並彙總結果"""
+
+    def __init__(self, quiet=True):
+        self.quiet = quiet
+        self.results = {}
+
+    def measure(self, name, func, inputs, items_per_call=1, setup=None):
+        """
+        對每個輸入呼叫 func 並記錄延遲
+
+        Args:
+            name: 測試名稱
+            func: func(input)
+            inputs: 輸入列表（每個元素呼叫一次）
+            items_per_call: 每次呼叫處理的項目數（吞吐量以項目數計算）
+            setup: 每次呼叫前執行的 setup(input)，不列入計時
+        """
+        timings = []
+        with open(os.devnull, "w", encoding="utf-8") as devnull:
+            for item in inputs:
+                if setup:
+                    setup(item)
+                call_start = time.perf_counter()
+                if self.quiet:
+                    with redirect_stdout(devnull):
+                        func(item)
+                else:
+                    func(item)
+                timings.append(time.perf_counter() - call_start)
+        total = sum(timings)
+
+        timings.sort()
+        self.results[name] = {
+            "calls": len(timings),
+            "items": len(timings) * items_per_call,
+            "total_s": round(total, 4),
+            "throughput_per_s": round(len(timings) * items_per_call / total, 2) if total > 0 else None,
+            "mean_ms": round(sum(timings) / len(timings) * 1000, 3) if timings else 0,
+            "p50_ms": round(percentile(timings, 50) * 1000, 3),
+            "p95_ms": round(percentile(timings, 95) * 1000, 3),
+            "p99_ms": round(percentile(timings, 99) * 1000, 3),
+            "peak_rss_mb": peak_rss_mb()
+        }
+        result = self.results[name]
+        print(f"  {name:<28} {result['throughput_per_s'] or 0:>12,.1f}/s   "
+              f"p50 {result['p50_ms']:>9.3f}ms   p95 {result['p95_ms']:>9.3f}ms   "
+              f"p99 {result['p99_ms']:>9.3f}ms   RSS {result['peak_rss_mb']}MB")
+        return result
+
+
+def load_pages(args):
+    """測試頁面：--html 檔案（存成暫存語料庫）或指定 / 最新的語料庫"""
+    if args.html:
+        corpus = PageCorpus.create("html", root=tempfile.mkdtemp(prefix="zozo_bench_corpus_"))
+        for i, path in enumerate(args.html, 1):
+            with open(path, "r", encoding="utf-8") as f:
+                corpus.add(f"https://zozo.jp/shop/benchmark/goods/{90000000 + i}/", f.read())
+        return corpus
+    if args.corpus or list_corpora():
+        return PageCorpus.open(args.corpus)
+    return None
+
+
+def bench_parse(runner, corpus, repeat):
+    pages = [(url, corpus.get(url)) for url in corpus.urls()] * repeat
+    for mode in ("full", "discount_only"):
+        def parse(page, mode=mode):
+            parser = ZozoHtmlParser(page[0])
+            parser.html = page[1]
+            parser.parse(mode=mode, use_cache=False)
+        runner.measure(f"parse_{mode}", parse, pages)
+
+
+def bench_sku(runner):
+    rng = random.Random(42)
+    colors = list(INVENTORY_COLOR_MAP) + ["未映射カラー"]
+    sizes = ["XS", "S", "M", "L", "XL", "FREE", "24.5cm", "26.0cm"]
+    cases = [(rng.choice(colors), rng.choice(sizes), f"https://zozo.jp/shop/benchmark/goods/{rng.randint(1, 5000)}/")
+             for _ in range(SKU_SAMPLE_SIZE)]
+
+    engine = SkuEngine(INVENTORY_COLOR_MAP, INVENTORY_PRODUCT_ID_PATTERNS)
+    logging.getLogger().setLevel(logging.ERROR)  # 未映射顏色警告不列入計時
+    runner.measure("sku_generate_cold", lambda case: engine.generate(*case), cases)
+    runner.measure("sku_generate_warm", lambda case: engine.generate(*case), cases)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    bulk = [[rng.choice(cases) for _ in range(BULK_ROWS)] for _ in range(3)]
+    runner.measure(
+        "sku_bulk",
+        lambda rows: generate_skus_bulk([r[0] for r in rows], [r[1] for r in rows], urls=[r[2] for r in rows], engine=engine),
+        bulk, items_per_call=BULK_ROWS
+    )
+
+
+def bench_mapping(runner, mapping_path, repeat):
+    mapping_path = os.path.abspath(mapping_path)
+    runner.measure(
+        "mapping_load_excel",
+        lambda _: SkuVariantIndex.from_dataframe(pd.read_excel(mapping_path, engine="openpyxl")),
+        range(repeat)
+    )
+    load_sku_variant_index(mapping_path)  # 建立索引快取
+    cache_path = index_cache_path(mapping_path)
+    runner.measure(
+        "mapping_load_cache",
+        lambda _: SkuVariantIndex(_read_index_cache(cache_path, mapping_path, os.stat(mapping_path))["entries"]),
+        range(repeat)
+    )
+
+
+def bench_match(runner, mapping_path):
+    syncer = ZozoDiscountSyncer(mapping_path)
+    rng = random.Random(7)
+    skus = list(syncer.sku_index)
+    product_infos = [
+        {"main_sku": "", "skus": ["ZO-0000-UNK-X", "ZO-FFFF-UNK-Y", rng.choice(skus)]}
+        for _ in range(min(SKU_SAMPLE_SIZE, len(skus) * 10))
+    ] if skus else []
+    runner.measure("find_matching_sku", syncer.find_matching_sku, product_infos)
+
+
+def build_benchmark_mapping(corpus, directory):
+    """由語料庫頁面的 SKU 建立映射表（每頁一個商品），讓測試不依賴正式映射表"""
+    processor = ZozoDiscountSyncProcessor(fetch_func=ReplayFetcher(corpus))
+    rows = []
+    with open(os.devnull, "w", encoding="utf-8") as devnull, redirect_stdout(devnull):
+        for product_index, url in enumerate(corpus.urls(), 1):
+            data = processor.process_product_for_discount_sync(url)
+            for variant_index, variant in enumerate(data.get("variants", []), 1):
+                rows.append({
+                    "Variant ID": product_index * 1000 + variant_index,
+                    "SKU": variant.get("sku", ""),
+                    "product_id": product_index,
+                    "商品名稱": data.get("product_name", ""),
+                    "price": DEFAULT_BENCHMARK_PRICE,
+                    "compare_at_price": DEFAULT_BENCHMARK_PRICE
+                })
+    path = os.path.join(directory, BENCHMARK_MAPPING_NAME)
+    pd.DataFrame(rows).to_excel(path, index=False)
+    return path, len(rows)
+
+
+def bench_sync(runner, corpus, repeat, args):
+    directory = tempfile.mkdtemp(prefix="zozo_bench_")
+    mapping_path, variant_count = build_benchmark_mapping(corpus, directory)
+    if not variant_count:
+        print("  ⚠️ 語料庫頁面沒有任何變體，略過 sync_discount")
+        return
+
+    store = FakeEasyStore.from_mapping(
+        mapping_path, latency=args.store_latency, rate_limit_rate=args.store_429_rate, seed=1
+    )
+    seed_products = copy.deepcopy(store.products)
+    server = start_fake_server(store)
+    api = EasyStoreClient(base_api=server.base_api)
+    try:
+        syncer = ZozoDiscountSyncer(mapping_path, fetch_func=ReplayFetcher(corpus, latency=args.fetch_latency))
+        syncer.api = api
+        urls = corpus.urls()
+
+        # 每次都從原價開始，所有變體都需要寫入
+        runner.measure("sync_discount_write", syncer.sync_discount, urls * repeat,
+                       setup=lambda _: _reset_store(store, seed_products))
+        runner.measure("sync_discount_noop", lambda url: syncer.sync_discount(url), urls * repeat)
+        runner.results["sync_discount_noop"]["store_requests"] = dict(store.stats)
+    finally:
+        server.shutdown()
+        api.close()
+        try:
+            os.remove(index_cache_path(mapping_path))
+        except OSError:
+            pass
+
+
+def _reset_store(store, seed_products):
+    """還原測試伺服器的商品資料（sync_discount_write 每次呼叫前）"""
+    with store._lock:
+        store.products = copy.deepcopy(seed_products)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare_results(current, previous_path):
+    """與先前的結果比較吞吐量與 p50"""
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = json.load(f)["benchmarks"]
+    print(f"\n📈 與 {os.path.basename(previous_path)} 比較：")
+    for name, result in current.items():
+        old = previous.get(name)
+        if not old or not old.get("throughput_per_s") or not result.get("throughput_per_s"):
+            continue
+        throughput_change = (result["throughput_per_s"] / old["throughput_per_s"] - 1) * 100
+        p50_change = (result["p50_ms"] / old["p50_ms"] - 1) * 100 if old["p50_ms"] else 0
+        print(f"  {name:<28} 吞吐量 {throughput_change:+7.1f}%   p50 {p50_change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="折扣同步流程效能測試")
+    parser.add_argument("--corpus", help="語料庫名稱（預設為最新的語料庫）")
+    parser.add_argument("--html", nargs="+", help="改用指定的 HTML 檔案作為測試頁面")
+    parser.add_argument("--mapping", default="sku_variant_mapping.xlsx", help="映射表載入 / SKU 匹配測試使用的映射表")
+    parser.add_argument("--repeat", type=int, default=3, help="每頁 / 每項重複次數")
+    parser.add_argument("--only", default=",".join(SECTIONS), help=f"只執行指定項目（{','.join(SECTIONS)}）")
+    parser.add_argument("--store-latency", type=float, default=0.0, help="測試伺服器每個請求的延遲（秒）")
+    parser.add_argument("--store-429-rate", type=float, default=0.0, help="測試伺服器回應 429 的機率")
+    parser.add_argument("--fetch-latency", type=float, default=0.0, help="回放頁面時模擬的抓取延遲（秒）")
+    parser.add_argument("--parse-cache", action="store_true", help="sync_discount 使用解析快取（預設停用）")
+    parser.add_argument("--output", help="結果 JSON 路徑（預設為 benchmark_results/benchmark_<時間>.json）")
+    parser.add_argument("--compare", help="與先前的結果 JSON 比較")
+    args = parser.parse_args()
+
+    sections = [section.strip() for section in args.only.split(",") if section.strip()]
+    logging.getLogger().setLevel(logging.WARNING)
+    # 測試不讀寫磁碟上的解析快取；未指定 --parse-cache 時每次都重新解析
+    set_parse_cache(ParseCache(sqlite_path=None, max_entries=512 if args.parse_cache else 0))
+
+    corpus = load_pages(args) if {"parse", "sync"} & set(sections) else None
+    runner = BenchmarkRunner()
+    print(f"🏁 開始效能測試（{', '.join(sections)}）")
+
+    if "parse" in sections:
+        if corpus and len(corpus):
+            bench_parse(runner, corpus, args.repeat)
+        else:
+            print("  ⚠️ 沒有語料庫或 HTML 檔案，略過 parse")
+    if "sku" in sections:
+        bench_sku(runner)
+    if "mapping" in sections:
+        bench_mapping(runner, args.mapping, args.repeat)
+    if "match" in sections:
+        bench_match(runner, args.mapping)
+    if "sync" in sections:
+        if corpus and len(corpus):
+            bench_sync(runner, corpus, args.repeat, args)
+        else:
+            print("  ⚠️ 沒有語料庫或 HTML 檔案，略過 sync_discount")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "corpus": corpus.manifest.get("name") if corpus else None,
+            "pages": len(corpus) if corpus else 0,
+            "args": vars(args)
+        },
+        "benchmarks": runner.results
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"benchmark_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ 結果已儲存至 {output}")
+
+    if args.compare:
+        compare_results(runner.results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,4 +17,5 @@ API_HEADERS = {
     "EasyStore-Access-Token": ACCESS_TOKEN,
     "Content-Type": "application/json"
 }
-BASE_API = f"https://{STORE_URL}.easy.co/api/3.0"
+# 可用環境變數 EASYSTORE_BASE_API 指向本機測試伺服器（fake_easystore_server.py）
+BASE_API = os.environ.get("EASYSTORE_BASE_API", f"https://{STORE_URL}.easy.co/api/3.0")
@@ -4,11 +4,11 @@ Easy Store API 連接測試工具
 完全按照 sync_zozo_discounts_integrated.py 的邏輯進行測試
 """
 
-import requests
 import json
 import pandas as pd
 import os
 from config import BASE_API, API_HEADERS
+from easystore_client import get_easystore_client, EasyStoreAPIError
 
 def test_api_with_real_product():
     """使用真實的 product_id 測試 API（模擬原始代碼的使用方式）"""
@@ -58,7 +58,7 @@ def test_product_api(product_id, variant_id=None):
         url = f"{BASE_API}/products/{product_id}.json"
         print(f"🌐 請求 URL: {url}")
         
-        response = requests.get(url, headers=API_HEADERS, timeout=10)
+        response = get_easystore_client().get(url, raise_for_status=False)
         print(f"📊 HTTP 狀態碼: {response.status_code}")
         
         if response.status_code == 200:
@@ -119,7 +119,7 @@ def test_product_api(product_id, variant_id=None):
             print("錯誤內容:", response.text)
             return False
             
-    except requests.exceptions.RequestException as e:
+    except EasyStoreAPIError as e:
         print(f"❌ 網路連接錯誤: {e}")
         return False
     except Exception as e:
@@ -152,7 +152,8 @@ def test_variant_update(product_id, variant_id, variant_data):
         print(f"🌐 更新 URL: {url}")
         print(f"📤 請求資料: {json.dumps(payload)}")
         
-        response = requests.put(url, headers=API_HEADERS, json=payload, timeout=10)
+        client = get_easystore_client()
+        response = client.put(url, json=payload, raise_for_status=False)
         print(f"📊 更新狀態碼: {response.status_code}")
         
         if response.status_code == 200:
@@ -160,7 +161,7 @@ def test_variant_update(product_id, variant_id, variant_data):
             
             # 立即還原原價
             restore_payload = {"variant": {"price": current_price}}
-            restore_response = requests.put(url, headers=API_HEADERS, json=restore_payload, timeout=10)
+            restore_response = client.put(url, json=restore_payload, raise_for_status=False)
             
             if restore_response.status_code == 200:
                 print(f"✅ 原價還原成功: {test_price} → {current_price}")
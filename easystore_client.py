@@ -0,0 +1,289 @@
+# easystore_client.py
+"""
+Easy Store API 共用客戶端
+所有 Easy Store 呼叫共用同一個 keep-alive 連線池（有安裝 httpx + h2 時使用 HTTP/2），
+並在 429 / 5xx 時以指數退避自動重試，遵守伺服器回傳的 Retry-After
+"""
+
+import time
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from config import BASE_API, API_HEADERS
+
+try:
+    import httpx
+    import h2  # noqa: F401  httpx 的 HTTP/2 支援需要 h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTP2_AVAILABLE = False
+
+# 預設值
+DEFAULT_TIMEOUT = 20            # 單次請求逾時（秒）
+DEFAULT_MAX_RETRIES = 5         # 429 / 5xx / 連線錯誤最多重試次數
+DEFAULT_BACKOFF_BASE = 0.5      # 指數退避起始秒數
+DEFAULT_BACKOFF_MAX = 30        # 單次等待上限（秒）
+DEFAULT_POOL_SIZE = 16          # 連線池大小
+DEFAULT_WRITE_CONCURRENCY = 4   # 變體寫入的初始並行數
+MAX_WRITE_CONCURRENCY = 8       # 變體寫入的並行上限
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class EasyStoreAPIError(Exception):
+    """Easy Store API 呼叫失敗（已用完重試次數或非可重試的錯誤）"""
+
+    def __init__(self, message, status_code=None, response=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = response
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 標頭（秒數或 HTTP 日期），回傳等待秒數或 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    自適應並行限制器（AIMD）
+    連續成功時逐步增加並行數，收到 429 時立即減半
+    """
+
+    def __init__(self, initial=DEFAULT_WRITE_CONCURRENCY, min_limit=1,
+                 max_limit=MAX_WRITE_CONCURRENCY, increase_every=10, cooldown=1.0):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = max(min_limit, min(initial, max_limit))
+        self.increase_every = increase_every
+        self.cooldown = cooldown
+        self._in_flight = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """等待可用的並行名額"""
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, success=True):
+        """歸還名額；成功累積到一定次數後加大並行數"""
+        with self._cond:
+            self._in_flight -= 1
+            if success:
+                self._successes += 1
+                if self._successes >= self.increase_every and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+    def on_throttle(self):
+        """收到 429 時減半並行數（冷卻時間內只減一次，避免同一波 429 連續減半）"""
+        with self._cond:
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self._successes = 0
+            new_limit = max(self.min_limit, self.limit // 2)
+            if new_limit != self.limit:
+                logging.warning(f"Easy Store 限流，寫入並行數 {self.limit} -> {new_limit}")
+                self.limit = new_limit
+
+    @contextmanager
+    def slot(self):
+        """以 with 區塊佔用一個並行名額"""
+        self.acquire()
+        success = False
+        try:
+            yield
+            success = True
+        finally:
+            self.release(success)
+
+
+class EasyStoreClient:
+    """Easy Store REST API 客戶端（連線池 + 自動重試）"""
+
+    def __init__(self, base_api=BASE_API, headers=API_HEADERS, timeout=DEFAULT_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff_base=DEFAULT_BACKOFF_BASE,
+                 backoff_max=DEFAULT_BACKOFF_MAX, pool_size=DEFAULT_POOL_SIZE, http2=True):
+        self.base_api = base_api.rstrip("/")
+        self.headers = dict(headers)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.use_http2 = http2 and HTTP2_AVAILABLE
+        self.write_limiter = AdaptiveConcurrencyLimiter()
+
+        if self.use_http2:
+            self._session = httpx.Client(
+                http2=True,
+                headers=self.headers,
+                timeout=timeout,
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            )
+            self._transport_errors = (httpx.TransportError,)
+        else:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(self.headers)
+            self._session = session
+            self._transport_errors = (requests.ConnectionError, requests.Timeout)
+
+    def _url(self, path):
+        """組合完整 URL（接受相對於 BASE_API 的路徑或完整 URL）"""
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_api}/{path.lstrip('/')}"
+
+    def _backoff_delay(self, attempt, retry_after=None):
+        """計算第 attempt 次重試前的等待秒數"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        delay += random.uniform(0, delay * 0.1)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max * 4))
+        return delay
+
+    def request(self, method, path, params=None, json=None, raise_for_status=True):
+        """
+        發送 API 請求，遇到 429 / 5xx / 連線錯誤時自動重試
+
+        Args:
+            method: HTTP 方法
+            path: 相對於 BASE_API 的路徑（例如 /products/1.json）
+            params: 查詢參數
+            json: JSON 請求內容
+            raise_for_status: 最終回應非 2xx 時是否拋出 EasyStoreAPIError
+
+        Returns:
+            回應物件（requests.Response 或 httpx.Response）
+        """
+        url = self._url(path)
+        attempt = 0
+
+        while True:
+            try:
+                response = self._session.request(method, url, params=params, json=json, timeout=self.timeout)
+            except self._transport_errors as e:
+                if attempt >= self.max_retries:
+                    raise EasyStoreAPIError(f"{method} {url} 連線失敗: {e}") from e
+                delay = self._backoff_delay(attempt)
+                logging.warning(f"Easy Store 連線錯誤，{delay:.1f}s 後重試 ({attempt + 1}/{self.max_retries}): {e}")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            status = response.status_code
+            if status == 429:
+                self.write_limiter.on_throttle()
+
+            if status in RETRY_STATUS_CODES and attempt < self.max_retries:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                delay = self._backoff_delay(attempt, retry_after)
+                logging.warning(f"Easy Store 回應 {status}，{delay:.1f}s 後重試 ({attempt + 1}/{self.max_retries}): {url}")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            if raise_for_status and not (200 <= status < 300):
+                raise EasyStoreAPIError(
+                    f"{method} {url} 失敗: HTTP {status} {response.text[:200]}",
+                    status_code=status,
+                    response=response
+                )
+            return response
+
+    def get(self, path, params=None, **kwargs):
+        """GET 請求"""
+        return self.request("GET", path, params=params, **kwargs)
+
+    def put(self, path, json=None, **kwargs):
+        """PUT 請求"""
+        return self.request("PUT", path, json=json, **kwargs)
+
+    def get_product(self, product_id):
+        """取得單一商品（含所有變體）"""
+        return self.get(f"/products/{product_id}.json").json().get("product", {})
+
+    def list_products(self, page=1, **params):
+        """取得商品列表的一頁，回傳完整 JSON"""
+        params["page"] = page
+        return self.get("/products.json", params=params).json()
+
+    def update_variant(self, product_id, variant_id, fields):
+        """更新變體欄位（例如 {"price": 1000}）"""
+        payload = {"variant": fields}
+        return self.put(f"/products/{product_id}/variants/{variant_id}.json", json=payload).json()
+
+    def update_variants(self, product_id, updates):
+        """
+        並行更新同一商品的多個變體，並行數由 write_limiter 自動調整
+
+        Args:
+            product_id: 商品 ID
+            updates: [(variant_id, fields), ...]
+
+        Returns:
+            list: 與 updates 順序一致的 {"variant_id", "success", "result" 或 "error"}
+        """
+        def update_one(item):
+            variant_id, fields = item
+            try:
+                with self.write_limiter.slot():
+                    result = self.update_variant(product_id, variant_id, fields)
+                return {"variant_id": variant_id, "success": True, "result": result}
+            except Exception as e:
+                return {"variant_id": variant_id, "success": False, "error": str(e)}
+
+        if not updates:
+            return []
+        max_workers = min(len(updates), self.write_limiter.max_limit)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(update_one, updates))
+
+    def close(self):
+        """關閉連線池"""
+        try:
+            self._session.close()
+        except Exception:
+            pass
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_easystore_client():
+    """取得全局共用的 Easy Store 客戶端"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = EasyStoreClient()
+            logging.info(f"Easy Store 客戶端已建立 ({'HTTP/2' if _client.use_http2 else 'HTTP/1.1 keep-alive'})")
+        return _client
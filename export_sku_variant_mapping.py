@@ -1,7 +1,13 @@
 # export_sku_variant_mapping.py
-import os, requests, pandas as pd
-from config import BASE_API, API_HEADERS, RESOURCE_DIR, WORK_DIR
+import os, pandas as pd
+from config import RESOURCE_DIR, WORK_DIR
+from easystore_client import get_easystore_client
 import sys
+import json
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from openpyxl import Workbook
 if getattr(sys, "frozen", False):
     exe_dir      = os.path.dirname(sys.executable)
     WORK_DIR     = os.path.normpath(os.path.join(exe_dir, "..", "..", ".."))
@@ -10,45 +16,216 @@ else:
     WORK_DIR     = os.path.dirname(os.path.abspath(__file__))
     RESOURCE_DIR = WORK_DIR
 
+# 匯出設定
+EXPORT_COLUMNS = ["Variant ID", "SKU", "product_id", "商品名稱"]
+DEFAULT_EXPORT_WORKERS = 4   # 同時抓取的頁數
+PAGE_COUNT_KEYS = ("page_count", "total_pages", "last_page")
+
+def _page_count(data):
+    """從列表回應取得總頁數，API 未提供時為 None"""
+    for key in PAGE_COUNT_KEYS:
+        if isinstance(data.get(key), int):
+            return data[key]
+    return None
+
+def iter_products(client=None, workers=DEFAULT_EXPORT_WORKERS, published_only=True, **params):
+    """
+    依頁序逐頁產出商品
+    published_only 時只產出已上架商品，且遇到沒有已上架商品的頁即停止（與原本逐頁抓取的停止條件相同）
+    第一頁回應含總頁數時並行抓取其餘頁；否則以 workers 頁為一個視窗並行探測，遇到空頁為止
+    同時保留的頁數不超過 2 × workers，記憶體用量與商品總數無關
+
+    Args:
+        params: 其他查詢參數（例如 updated_at_min）
+    """
+    client = client or get_easystore_client()
+    first = client.list_products(1, **params)
+    page_count = _page_count(first)
+    window = max(1, workers) * 2
+
+    def fetch(page):
+        return client.list_products(page, **params).get("products", [])
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending = deque()
+        next_page = 2
+        prods = first.get("products", [])
+        while True:
+            if not prods:
+                break
+            pub = [p for p in prods if p.get("is_published")] if published_only else prods
+            if not pub:
+                break
+            yield from pub
+
+            # 補滿視窗（已知總頁數時不超過最後一頁）
+            while len(pending) < window and (page_count is None or next_page <= page_count):
+                pending.append(executor.submit(fetch, next_page))
+                next_page += 1
+            if not pending:
+                break
+            prods = pending.popleft().result()
+
+        for future in pending:
+            future.cancel()
+
+def iter_published_products(client=None, workers=DEFAULT_EXPORT_WORKERS):
+    return iter_products(client, workers)
+
 def fetch_all_published_products():
-    all_p = []
-    page = 1
-    while True:
-        r = requests.get(f"{BASE_API}/products.json?page={page}", headers=API_HEADERS)
-        r.raise_for_status()
-        prods = r.json().get("products", [])
-        if not prods:
-            break
-        pub = [p for p in prods if p.get("is_published")]
-        if not pub:
-            break
-        all_p += pub
-        page += 1
-    return all_p
+    return list(iter_published_products())
 
-def extract_variant_mapping(products):
-    rows = []
+def iter_variant_rows(products):
     for p in products:
         for v in p.get("variants", []):
-            rows.append({
+            yield {
                 "Variant ID": v["id"],
                 "SKU":       v.get("sku","").strip(),
                 "product_id": p["id"],
                 "商品名稱":  p.get("title",""),
                 # …如需 Option1, Option2 …
-            })
-    return rows
+            }
 
-def export_mapping(output_filename="sku_variant_mapping.xlsx") -> str:
-    ps = fetch_all_published_products()
-    rows = extract_variant_mapping(ps)
-    if not rows:
-        raise RuntimeError("無任何已上架商品")
+def extract_variant_mapping(products):
+    return list(iter_variant_rows(products))
+
+def export_mapping(output_filename="sku_variant_mapping.xlsx", workers=DEFAULT_EXPORT_WORKERS) -> str:
+    """
+    並行抓取商品頁並直接串流寫入 Excel（openpyxl write-only），不在記憶體中保留整個商品目錄
+    先寫入暫存檔，完成後才取代原檔
+    """
     path = os.path.join(WORK_DIR, output_filename)
-    pd.DataFrame(rows).to_excel(path, index=False)
+    started_at = datetime.now(timezone.utc)
+    if not write_mapping_rows(path, iter_variant_rows(iter_published_products(workers=workers))):
+        raise RuntimeError("無任何已上架商品")
+    save_refresh_state(path, started_at)
     return path
 
+def write_mapping_rows(path, rows):
+    """串流寫入映射表（先寫暫存檔再取代），回傳寫入筆數，0 筆時不寫入"""
+    tmp_path = f"{path}.tmp.xlsx"
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(EXPORT_COLUMNS)
+    count = 0
+    for row in rows:
+        ws.append([row[column] for column in EXPORT_COLUMNS])
+        count += 1
+    if not count:
+        wb.close()
+        return 0
+    wb.save(tmp_path)
+    os.replace(tmp_path, path)
+    return count
+
+# ---------- 增量更新 ----------
+
+REFRESH_OVERLAP = timedelta(minutes=5)  # 與上次更新時間重疊的區間，避免時鐘誤差漏掉商品
+
+def refresh_state_path(path):
+    return f"{os.path.splitext(path)[0]}_state.json"
+
+def changes_log_path(path):
+    return f"{os.path.splitext(path)[0]}_changes.jsonl"
+
+def load_refresh_state(path):
+    try:
+        with open(refresh_state_path(path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_refresh_state(path, started_at):
+    """記錄本次更新開始時間（下次只抓取此時間之後更新的商品）"""
+    with open(refresh_state_path(path), "w", encoding="utf-8") as f:
+        json.dump({"last_refresh": started_at.isoformat(timespec="seconds")}, f, ensure_ascii=False, indent=2)
+
+def read_mapping_rows(path):
+    df = pd.read_excel(path, dtype={"SKU": str, "商品名稱": str}, keep_default_na=False)
+    for column in ("Variant ID", "product_id"):
+        df[column] = df[column].astype("int64")
+    return df[EXPORT_COLUMNS].to_dict("records")
+
+def merge_changed_products(rows, products):
+    """
+    將更新過的商品合併進映射表：已上架的商品以最新變體取代（保持原本位置，新商品加在最後），
+    已下架的商品移除
+
+    Returns:
+        (合併後的列, 變更記錄 {"added", "updated", "removed"})
+    """
+    changed = {p["id"]: (list(iter_variant_rows([p])) if p.get("is_published") else []) for p in products}
+    old_by_product = {}
+    for row in rows:
+        if row["product_id"] in changed:
+            old_by_product.setdefault(row["product_id"], []).append(row)
+
+    merged = []
+    emitted = set()
+    for row in rows:
+        product_id = row["product_id"]
+        if product_id not in changed:
+            merged.append(row)
+        elif product_id not in emitted:
+            emitted.add(product_id)
+            merged.extend(changed[product_id])
+    for product_id, new_rows in changed.items():
+        if product_id not in emitted:
+            merged.extend(new_rows)
+
+    changes = {"added": [], "updated": [], "removed": []}
+    for product_id, new_rows in changed.items():
+        old_rows = {row["Variant ID"]: row for row in old_by_product.get(product_id, [])}
+        new_by_variant = {row["Variant ID"]: row for row in new_rows}
+        for variant_id, row in new_by_variant.items():
+            if variant_id not in old_rows:
+                changes["added"].append(row)
+            elif old_rows[variant_id] != row:
+                changes["updated"].append(row)
+        changes["removed"].extend(row for variant_id, row in old_rows.items() if variant_id not in new_by_variant)
+    return merged, changes
+
+def refresh_mapping(output_filename="sku_variant_mapping.xlsx", workers=DEFAULT_EXPORT_WORKERS):
+    """
+    增量更新映射表：只抓取上次更新後有變動的商品（updated_at_min），合併後寫回，
+    變更內容附加到 *_changes.jsonl；沒有映射表或更新記錄時改為完整匯出
+    （已刪除的商品不會出現在更新列表中，需定期完整匯出才會移除）
+
+    Returns:
+        dict: path, mode（full / incremental）, products, added, updated, removed
+    """
+    path = os.path.join(WORK_DIR, output_filename)
+    last_refresh = load_refresh_state(path).get("last_refresh")
+    if not last_refresh or not os.path.exists(path):
+        export_mapping(output_filename, workers)
+        return {"path": path, "mode": "full", "products": None, "added": 0, "updated": 0, "removed": 0}
+
+    started_at = datetime.now(timezone.utc)
+    since = datetime.fromisoformat(last_refresh) - REFRESH_OVERLAP
+    products = list(iter_products(workers=workers, published_only=False,
+                                  updated_at_min=since.isoformat(timespec="seconds")))
+    merged, changes = merge_changed_products(read_mapping_rows(path), products)
+
+    if any(changes.values()):
+        if not write_mapping_rows(path, merged):
+            raise RuntimeError("無任何已上架商品")
+        with open(changes_log_path(path), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"refreshed_at": started_at.isoformat(timespec="seconds"), **changes},
+                               ensure_ascii=False) + "\n")
+    save_refresh_state(path, started_at)
+    return {"path": path, "mode": "incremental", "products": len(products),
+            **{kind: len(rows) for kind, rows in changes.items()}}
+
 if __name__ == "__main__":
-    print("🔄 產生 SKU ↔ Variant mapping…")
-    p = export_mapping()
-    print("✅ 輸出至：", p)
+    if "--incremental" in sys.argv:
+        print("🔄 增量更新 SKU ↔ Variant mapping…")
+        r = refresh_mapping()
+        if r["mode"] == "full":
+            print("📝 沒有上次更新記錄，已完整匯出")
+        else:
+            print(f"📦 {r['products']} 個商品有更新：新增 {r['added']}、修改 {r['updated']}、移除 {r['removed']} 筆")
+        print("✅ 輸出至：", r["path"])
+    else:
+        print("🔄 產生 SKU ↔ Variant mapping…")
+        p = export_mapping()
+        print("✅ 輸出至：", p)
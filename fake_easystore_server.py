@@ -0,0 +1,301 @@
+# fake_easystore_server.py
+"""
+本機 Easy Store API 測試伺服器（壓力測試 / 效能測試用）
+實作折扣同步與映射匯出使用的端點：
+  GET /products.json、GET /products/{id}.json、PUT /products/{id}/variants/{vid}.json
+資料由 sku_variant_mapping.xlsx 產生，可設定延遲、429 限流與錯誤率
+
+使用方式：
+  python fake_easystore_server.py --port 8765 --latency 0.05 --rate-limit-rate 0.02
+  set EASYSTORE_BASE_API=http://127.0.0.1:8765/api/3.0（之後啟動的程式都會連到本機伺服器）
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import pandas as pd
+
+# 預設值
+DEFAULT_PORT = 8765
+DEFAULT_PAGE_LIMIT = 50        # /products.json 每頁商品數
+DEFAULT_PRICE = 10000          # 映射表沒有價格欄位時的原價
+API_PREFIX = "/api/3.0"
+
+PRODUCTS_PATH = re.compile(r"/products\.json$")
+PRODUCT_PATH = re.compile(r"/products/(\d+)\.json$")
+VARIANT_PATH = re.compile(r"/products/(\d+)/variants/(\d+)\.json$")
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class FakeEasyStore:
+    """記憶體中的商品資料與故障注入設定"""
+
+    def __init__(self, products=None, latency=0.0, jitter=0.0, rate_limit_rate=0.0, max_rps=0,
+                 error_rate=0.0, retry_after=1, page_limit=DEFAULT_PAGE_LIMIT, seed=None):
+        """
+        Args:
+            products: {product_id: 商品 dict}
+            latency: 每個請求的固定延遲（秒）
+            jitter: 額外的隨機延遲上限（秒）
+            rate_limit_rate: 隨機回應 429 的機率
+            max_rps: 每秒請求數上限，超過時回應 429，0 表示不限制
+            error_rate: 隨機回應 500 的機率
+            retry_after: 429 回應的 Retry-After 秒數
+            page_limit: /products.json 預設每頁商品數
+            seed: 亂數種子（固定時故障注入可重現）
+        """
+        self.products = products or {}
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.max_rps = max_rps
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.page_limit = page_limit
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self.stats = {"requests": 0, "reads": 0, "writes": 0, "throttled": 0, "errors": 0}
+
+    @classmethod
+    def from_mapping(cls, mapping_path="sku_variant_mapping.xlsx", **kwargs):
+        """由 SKU 映射表建立商品資料（每個 product_id 一個商品，每列一個變體）"""
+        df = pd.read_excel(mapping_path, engine="openpyxl", dtype={"SKU": str})
+        df = df.dropna(subset=["product_id", "Variant ID"])
+        prices = df["price"].tolist() if "price" in df.columns else [None] * len(df)
+        compare_prices = df["compare_at_price"].tolist() if "compare_at_price" in df.columns else [None] * len(df)
+        titles = df["商品名稱"].tolist() if "商品名稱" in df.columns else [""] * len(df)
+
+        products = {}
+        updated_at = _now_iso()
+        for sku, product_id, variant_id, title, price, compare_price in zip(
+                df["SKU"].tolist(), df["product_id"].tolist(), df["Variant ID"].tolist(), titles, prices, compare_prices):
+            product_id = int(product_id)
+            compare_price = compare_price if pd.notna(compare_price) and compare_price else DEFAULT_PRICE
+            price = price if pd.notna(price) and price else compare_price
+            product = products.setdefault(product_id, {
+                "id": product_id,
+                "title": title if isinstance(title, str) else "",
+                "is_published": True,
+                "updated_at": updated_at,
+                "variants": []
+            })
+            product["variants"].append({
+                "id": int(variant_id),
+                "product_id": product_id,
+                "sku": sku if isinstance(sku, str) else "",
+                "price": f"{float(price):.2f}",
+                "compare_at_price": f"{float(compare_price):.2f}"
+            })
+        return cls(products, **kwargs)
+
+    def inject_fault(self):
+        """依設定決定這個請求是否回應 429 / 500，回傳 (status, headers) 或 None"""
+        with self._lock:
+            self.stats["requests"] += 1
+            if self.max_rps:
+                now = time.monotonic()
+                if now - self._window_start >= 1:
+                    self._window_start, self._window_count = now, 0
+                self._window_count += 1
+                if self._window_count > self.max_rps:
+                    self.stats["throttled"] += 1
+                    return 429, {"Retry-After": str(self.retry_after)}
+            roll = self._random.random()
+            if roll < self.rate_limit_rate:
+                self.stats["throttled"] += 1
+                return 429, {"Retry-After": str(self.retry_after)}
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.stats["errors"] += 1
+                return 500, {}
+        return None
+
+    def delay(self):
+        """模擬網路 / 伺服器延遲"""
+        seconds = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def list_products(self, query):
+        """GET /products.json（支援 page / limit / updated_at_min）"""
+        page = max(1, int(query.get("page", ["1"])[0]))
+        limit = max(1, int(query.get("limit", [self.page_limit])[0]))
+        updated_at_min = query.get("updated_at_min", [None])[0]
+        with self._lock:
+            self.stats["reads"] += 1
+            products = [self.products[product_id] for product_id in sorted(self.products)]
+            if updated_at_min:
+                since = datetime.fromisoformat(updated_at_min)
+                products = [p for p in products if datetime.fromisoformat(p["updated_at"]) >= since]
+            total = len(products)
+            page_products = json.loads(json.dumps(products[(page - 1) * limit:page * limit]))
+        return {
+            "products": page_products,
+            "page": page,
+            "limit": limit,
+            "total_count": total,
+            "page_count": (total + limit - 1) // limit
+        }
+
+    def get_product(self, product_id):
+        """GET /products/{id}.json"""
+        with self._lock:
+            self.stats["reads"] += 1
+            product = self.products.get(product_id)
+            return json.loads(json.dumps(product)) if product else None
+
+    def update_variant(self, product_id, variant_id, fields):
+        """PUT /products/{id}/variants/{vid}.json"""
+        with self._lock:
+            product = self.products.get(product_id)
+            variant = next((v for v in product["variants"] if v["id"] == variant_id), None) if product else None
+            if variant is None:
+                return None
+            self.stats["writes"] += 1
+            for key, value in fields.items():
+                if key in ("price", "compare_at_price"):
+                    value = f"{float(value):.2f}"
+                variant[key] = value
+            product["updated_at"] = _now_iso()
+            return dict(variant)
+
+
+class FakeEasyStoreHandler(BaseHTTPRequestHandler):
+    """HTTP 請求處理（store 由 server 提供）"""
+
+    protocol_version = "HTTP/1.1"  # keep-alive，與正式 API 的連線池行為相同
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, data=None, headers=None):
+        body = json.dumps(data if data is not None else {"errors": "error"}, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+        except ValueError:
+            return {}
+
+    def _handle(self, method):
+        store = self.server.store
+        parts = urlsplit(self.path)
+        body = self._read_json() if method == "PUT" else None
+
+        store.delay()
+        fault = store.inject_fault()
+        if fault:
+            status, headers = fault
+            self._send_json(status, {"errors": "Too Many Requests" if status == 429 else "Internal Server Error"}, headers)
+            return
+
+        if method == "GET" and PRODUCTS_PATH.search(parts.path):
+            self._send_json(200, store.list_products(parse_qs(parts.query)))
+            return
+
+        match = PRODUCT_PATH.search(parts.path)
+        if method == "GET" and match:
+            product = store.get_product(int(match.group(1)))
+            self._send_json(200, {"product": product}) if product else self._send_json(404, {"errors": "Not Found"})
+            return
+
+        match = VARIANT_PATH.search(parts.path)
+        if method == "PUT" and match:
+            variant = store.update_variant(int(match.group(1)), int(match.group(2)), body.get("variant", {}))
+            self._send_json(200, {"variant": variant}) if variant else self._send_json(404, {"errors": "Not Found"})
+            return
+
+        self._send_json(404, {"errors": "Not Found"})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+
+class FakeEasyStoreServer(ThreadingHTTPServer):
+    """測試伺服器（每個連線一個線程）"""
+
+    daemon_threads = True
+
+    def __init__(self, store, host="127.0.0.1", port=DEFAULT_PORT):
+        super().__init__((host, port), FakeEasyStoreHandler)
+        self.store = store
+
+    @property
+    def base_api(self):
+        """可設定為 EASYSTORE_BASE_API / EasyStoreClient(base_api=...) 的網址"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+
+def start_fake_server(store, host="127.0.0.1", port=0):
+    """
+    在背景線程啟動測試伺服器
+
+    Args:
+        store: FakeEasyStore
+        port: 0 表示自動選擇可用埠
+
+    Returns:
+        FakeEasyStoreServer（結束時呼叫 shutdown()）
+    """
+    server = FakeEasyStoreServer(store, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本機 Easy Store API 測試伺服器")
+    parser.add_argument("--mapping", default="sku_variant_mapping.xlsx", help="產生商品資料的映射表")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="每個請求的固定延遲（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="額外的隨機延遲上限（秒）")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="隨機回應 429 的機率")
+    parser.add_argument("--max-rps", type=int, default=0, help="每秒請求數上限（超過回應 429）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="隨機回應 500 的機率")
+    parser.add_argument("--seed", type=int, default=None, help="亂數種子")
+    args = parser.parse_args()
+
+    store = FakeEasyStore.from_mapping(
+        args.mapping, latency=args.latency, jitter=args.jitter, rate_limit_rate=args.rate_limit_rate,
+        max_rps=args.max_rps, error_rate=args.error_rate, seed=args.seed
+    )
+    server = FakeEasyStoreServer(store, args.host, args.port)
+    variant_count = sum(len(p["variants"]) for p in store.products.values())
+    print(f"✅ 測試伺服器已啟動: {server.base_api}（{len(store.products)} 個商品，{variant_count} 個變體）")
+    print(f"   設定環境變數 EASYSTORE_BASE_API={server.base_api} 後執行同步 / 匯出")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"📊 請求統計: {store.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# sku_variant_index.py
+"""
+SKU → Easy Store 變體索引
+由 sku_variant_mapping.xlsx 一次建立，之後查詢皆為常數時間
+建立後的索引會序列化到 WORK_DIR 的快取檔，Excel 未變更時直接載入快取，不再以 openpyxl 解析
+"""
+
+import os
+import math
+import time
+import pickle
+import hashlib
+import logging
+import threading
+from itertools import islice
+
+import pandas as pd
+from config import WORK_DIR
+
+INDEX_CACHE_VERSION = 1  # 索引格式變更時遞增，使舊快取失效
+
+
+def _is_missing(value):
+    """判斷儲存格是否為空值（None / NaN）"""
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+class SkuVariantIndex:
+    """SKU → (product_id, variant_id, price, compare_at_price) 索引"""
+
+    def __init__(self, entries=None):
+        self._entries = entries or {}
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """
+        由映射表 DataFrame 建立索引（逐欄讀取，不使用 iterrows）
+
+        Args:
+            df: 含 SKU / product_id / Variant ID 欄位的 DataFrame，price / compare_at_price 欄位可選
+
+        Returns:
+            SkuVariantIndex
+        """
+        row_count = len(df)
+        skus = df['SKU'].tolist()
+        product_ids = df['product_id'].tolist()
+        variant_ids = df['Variant ID'].tolist()
+        prices = df['price'].tolist() if 'price' in df.columns else [0] * row_count
+        compare_prices = df['compare_at_price'].tolist() if 'compare_at_price' in df.columns else [0] * row_count
+
+        entries = {}
+        invalid_rows = 0
+        for sku, product_id, variant_id, price, compare_price in zip(
+                skus, product_ids, variant_ids, prices, compare_prices):
+            if _is_missing(sku):
+                continue
+            sku = str(sku).strip()
+            if not sku or sku in entries:
+                # 重複 SKU 以第一筆為準（與原本 DataFrame 篩選取 iat[0] 一致）
+                continue
+            try:
+                entries[sku] = (int(product_id), int(variant_id), price, compare_price)
+            except (TypeError, ValueError):
+                invalid_rows += 1
+
+        if invalid_rows:
+            logging.warning(f"映射表中有 {invalid_rows} 筆 product_id / Variant ID 無效，已略過")
+        return cls(entries)
+
+    def get(self, sku):
+        """查詢 SKU，找不到時回傳 None"""
+        return self._entries.get(str(sku).strip())
+
+    def __contains__(self, sku):
+        return sku in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def sample(self, count=10):
+        """取前幾個 SKU 作為格式參考"""
+        return list(islice(self._entries, count))
+
+
+def _file_sha1(path):
+    """計算檔案內容的 SHA-1"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def index_cache_path(mapping_path):
+    """映射檔對應的索引快取路徑（放在 WORK_DIR，打包後的唯讀資源目錄也能使用）"""
+    name = os.path.splitext(os.path.basename(mapping_path))[0]
+    return os.path.join(WORK_DIR, f"{name}.index.pkl")
+
+
+def _read_index_cache(cache_path, mapping_path, stat):
+    """讀取快取；快取不存在、版本不符或 Excel 內容已變更時回傳 None"""
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'rb') as f:
+            payload = pickle.load(f)
+    except Exception as e:
+        logging.warning(f"讀取 SKU 索引快取失敗，改為讀取 Excel: {e}")
+        return None
+
+    if payload.get("version") != INDEX_CACHE_VERSION:
+        return None
+    if payload.get("mtime_ns") == stat.st_mtime_ns and payload.get("size") == stat.st_size:
+        return payload
+    # 修改時間不同但內容相同（例如重新複製檔案）時仍視為有效
+    if payload.get("size") == stat.st_size and payload.get("sha1") == _file_sha1(mapping_path):
+        return payload
+    return None
+
+
+def _write_index_cache(cache_path, mapping_path, stat, index):
+    """寫入快取（先寫暫存檔再取代，避免中斷時留下不完整的快取）"""
+    payload = {
+        "version": INDEX_CACHE_VERSION,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha1": _file_sha1(mapping_path),
+        "entries": index._entries,
+    }
+    tmp_path = f"{cache_path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        logging.warning(f"寫入 SKU 索引快取失敗: {e}")
+
+
+_loaded_indexes = {}
+_loaded_indexes_lock = threading.Lock()
+
+
+def load_sku_variant_index(mapping_path, use_cache=True):
+    """
+    載入 SKU 索引（每個程序只載入一次，映射檔變更後下次呼叫會自動重新載入）
+
+    Args:
+        mapping_path: sku_variant_mapping.xlsx 路徑
+        use_cache: 是否使用 / 更新 WORK_DIR 的索引快取檔
+
+    Returns:
+        SkuVariantIndex
+    """
+    mapping_path = os.path.abspath(mapping_path)
+    stat = os.stat(mapping_path)
+    key = (stat.st_mtime_ns, stat.st_size)
+
+    with _loaded_indexes_lock:
+        loaded = _loaded_indexes.get(mapping_path)
+        if loaded and loaded[0] == key:
+            return loaded[1]
+
+        start_time = time.perf_counter()
+        cache_path = index_cache_path(mapping_path)
+        payload = _read_index_cache(cache_path, mapping_path, stat) if use_cache else None
+
+        if payload is not None:
+            index = SkuVariantIndex(payload["entries"])
+            logging.info(f"SKU 索引快取載入: {len(index)} 個 SKU，耗時 {time.perf_counter() - start_time:.3f}s")
+        else:
+            df = pd.read_excel(mapping_path, engine='openpyxl')
+            index = SkuVariantIndex.from_dataframe(df)
+            logging.info(f"SKU 索引由 Excel 建立: {len(df)} 筆 → {len(index)} 個 SKU，耗時 {time.perf_counter() - start_time:.3f}s")
+            if use_cache:
+                _write_index_cache(cache_path, mapping_path, stat, index)
+
+        _loaded_indexes[mapping_path] = (key, index)
+        return index
@@ -8,7 +8,7 @@ import tkinter as tk
 from tkinter import messagebox, scrolledtext, ttk, filedialog, simpledialog
 import threading
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
 import sys
 import json
@@ -17,9 +17,16 @@ import time
 from urllib.parse import urlparse
 # 導入 ZOZO 會員登入模組
 from zozo_session import setup_zozo_session, cleanup_zozo_session, get_zozo_product_info
+from zozo_selenium_fetcher import shutdown_driver_pools
+from zozo_fetch_scheduler import ZozoFetchScheduler, DEFAULT_FETCH_WORKERS, DEFAULT_HOST_RATE
+from zozo_html_cache import get_html_cache, DEFAULT_HTML_CACHE_TTL
+from zozo_urls import group_urls
+from zozo_state_store import get_state_store
+from zozo_priority_scheduler import SyncPriorityScheduler
+from zozo_deadline_restorer import DeadlineRestorer
 
 # 導入核心同步模組
-from sync_zozo_discounts_integrated import ZozoDiscountSyncer
+from sync_zozo_discounts_integrated import get_shared_syncer
 
 
 class EnhancedZozoDiscountSyncApp:
@@ -36,7 +43,8 @@ class EnhancedZozoDiscountSyncApp:
         
         # 初始化屬性
         self.log_box = None
-        self.sync_results = []
+        self.state_store = get_state_store()  # 同步結果與商品狀態（SQLite）
+        self.last_run_id = None  # 最近一次手動同步 / 還原的執行編號
         self.is_syncing = False
         self.schedule_thread = None
         self.stop_schedule = False
@@ -52,12 +60,17 @@ class EnhancedZozoDiscountSyncApp:
         
         # 初始化同步器
         try:
-            self.syncer = ZozoDiscountSyncer()
+            self.syncer = get_shared_syncer()
             self.log("✅ ZOZO 同步器初始化成功")
         except Exception as e:
             self.log(f"❌ 同步器初始化失敗: {e}")
             messagebox.showerror("初始化錯誤", f"同步器初始化失敗:\n{e}")
         
+        # 折扣截止自動還原
+        self.deadline_restorer = DeadlineRestorer(on_restored=self.on_deadline_restored)
+        if self.config.get('auto_restore_on_deadline', True):
+            self.deadline_restorer.start()
+        
         # 載入追蹤 URL
         self.load_tracked_urls()
         
@@ -88,13 +101,25 @@ class EnhancedZozoDiscountSyncApp:
             'retry_delay': 5,
             'validate_urls': True,
             'backup_before_sync': True,
-            'log_level': 'INFO'
+            'log_level': 'INFO',
+            'fetch_workers': DEFAULT_FETCH_WORKERS,
+            'host_rate_per_sec': DEFAULT_HOST_RATE,
+            'html_cache_ttl_minutes': DEFAULT_HTML_CACHE_TTL // 60,
+            'auto_restore_on_deadline': True
         }
         
         for key, value in defaults.items():
             if key not in self.config:
                 self.config[key] = value
 
+    def create_fetch_scheduler(self):
+        """依設定建立並行抓取排程器"""
+        get_html_cache().ttl = self.config.get('html_cache_ttl_minutes', DEFAULT_HTML_CACHE_TTL // 60) * 60
+        return ZozoFetchScheduler(
+            max_workers=self.config.get('fetch_workers', DEFAULT_FETCH_WORKERS),
+            rate_per_host=self.config.get('host_rate_per_sec', DEFAULT_HOST_RATE)
+        )
+
     def save_config(self):
         """儲存設定檔"""
         try:
@@ -461,6 +486,59 @@ class EnhancedZozoDiscountSyncApp:
         )
         delay_spin.pack(side='left', padx=10)
         
+        # 並行抓取設定
+        fetch_frame = ttk.LabelFrame(scrollable_frame, text="🚀 並行抓取")
+        fetch_frame.pack(fill='x', padx=10, pady=10)
+        
+        # 同時抓取數
+        workers_frame = ttk.Frame(fetch_frame)
+        workers_frame.pack(fill='x', padx=10, pady=5)
+        
+        ttk.Label(workers_frame, text="同時抓取數:").pack(side='left')
+        self.fetch_workers_var = tk.IntVar(value=self.config.get('fetch_workers', DEFAULT_FETCH_WORKERS))
+        workers_spin = tk.Spinbox(
+            workers_frame,
+            from_=1,
+            to=8,
+            textvariable=self.fetch_workers_var,
+            width=5,
+            command=self.save_fetch_settings
+        )
+        workers_spin.pack(side='left', padx=10)
+        
+        # 每主機請求速率
+        rate_frame = ttk.Frame(fetch_frame)
+        rate_frame.pack(fill='x', padx=10, pady=5)
+        
+        ttk.Label(rate_frame, text="每主機請求速率(次/秒):").pack(side='left')
+        self.host_rate_var = tk.DoubleVar(value=self.config.get('host_rate_per_sec', DEFAULT_HOST_RATE))
+        rate_spin = tk.Spinbox(
+            rate_frame,
+            from_=0.2,
+            to=10,
+            increment=0.2,
+            textvariable=self.host_rate_var,
+            width=5,
+            command=self.save_fetch_settings
+        )
+        rate_spin.pack(side='left', padx=10)
+        
+        # 頁面快取有效時間
+        cache_frame = ttk.Frame(fetch_frame)
+        cache_frame.pack(fill='x', padx=10, pady=5)
+        
+        ttk.Label(cache_frame, text="頁面快取有效時間(分鐘，0=每次重新驗證):").pack(side='left')
+        self.html_cache_ttl_var = tk.IntVar(value=self.config.get('html_cache_ttl_minutes', DEFAULT_HTML_CACHE_TTL // 60))
+        cache_spin = tk.Spinbox(
+            cache_frame,
+            from_=0,
+            to=120,
+            textvariable=self.html_cache_ttl_var,
+            width=5,
+            command=self.save_fetch_settings
+        )
+        cache_spin.pack(side='left', padx=10)
+        
         # 折扣策略設定
         strategy_frame = ttk.LabelFrame(scrollable_frame, text="💰 折扣策略")
         strategy_frame.pack(fill='x', padx=10, pady=10)
@@ -559,6 +637,15 @@ class EnhancedZozoDiscountSyncApp:
         )
         self.stop_schedule_btn.pack(side='left', padx=5)
         
+        # 折扣截止自動還原
+        self.auto_restore_var = tk.BooleanVar(value=self.config.get('auto_restore_on_deadline', True))
+        ttk.Checkbutton(
+            schedule_config_frame,
+            text="折扣截止時自動還原原價",
+            variable=self.auto_restore_var,
+            command=self.toggle_auto_restore
+        ).pack(anchor='w', padx=10, pady=5)
+        
         # 下次執行時間
         self.next_run_var = tk.StringVar(value="")
         ttk.Label(schedule_config_frame, textvariable=self.next_run_var).pack(pady=5)
@@ -568,13 +655,14 @@ class EnhancedZozoDiscountSyncApp:
         history_frame.pack(fill='both', expand=True, padx=10, pady=10)
         
         # 歷史記錄列表
-        history_columns = ('time', 'status', 'processed', 'success', 'failed')
+        history_columns = ('time', 'status', 'processed', 'success', 'unchanged', 'failed')
         self.history_tree = ttk.Treeview(history_frame, columns=history_columns, show='headings', height=8)
         
         self.history_tree.heading('time', text='執行時間')
         self.history_tree.heading('status', text='狀態')
         self.history_tree.heading('processed', text='處理數')
         self.history_tree.heading('success', text='成功數')
+        self.history_tree.heading('unchanged', text='未變動')
         self.history_tree.heading('failed', text='失敗數')
         
         self.history_tree.pack(fill='both', expand=True, padx=5, pady=5)
@@ -762,6 +850,13 @@ class EnhancedZozoDiscountSyncApp:
         self.config['retry_delay'] = self.retry_delay_var.get()
         self.save_config()
 
+    def save_fetch_settings(self):
+        """儲存並行抓取設定"""
+        self.config['fetch_workers'] = self.fetch_workers_var.get()
+        self.config['host_rate_per_sec'] = self.host_rate_var.get()
+        self.config['html_cache_ttl_minutes'] = self.html_cache_ttl_var.get()
+        self.save_config()
+
     def save_threshold_setting(self):
         """儲存高價門檻設定"""
         self.config['high_price_threshold'] = self.high_price_threshold_var.get()
@@ -778,7 +873,11 @@ class EnhancedZozoDiscountSyncApp:
             if os.path.exists(self.urls_file_path):
                 with open(self.urls_file_path, 'r', encoding='utf-8') as f:
                     urls = [line.strip() for line in f if line.strip()]
-                
+            else:
+                # 沒有文字檔時使用狀態資料庫中的追蹤 URL
+                urls = self.state_store.get_tracked_urls()
+            
+            if urls:
                 # 清空現有項目
                 for item in self.url_tree.get_children():
                     self.url_tree.delete(item)
@@ -807,6 +906,7 @@ class EnhancedZozoDiscountSyncApp:
             
             with open(self.urls_file_path, 'w', encoding='utf-8') as f:
                 f.write('\n'.join(urls))
+            self.state_store.replace_tracked_urls(urls)
         except Exception as e:
             self.log(f"❌ 自動儲存 URL 失敗: {e}")
 
@@ -988,7 +1088,6 @@ class EnhancedZozoDiscountSyncApp:
         # 重置進度條和結果
         self.progress_var.set(0)
         self.progress['maximum'] = len(urls)
-        self.sync_results = []
         self.is_syncing = True
         
         # 更新 UI 狀態
@@ -1002,6 +1101,12 @@ class EnhancedZozoDiscountSyncApp:
             daemon=True
         ).start()
 
+    def find_tree_items(self, urls):
+        """找出 URL 列表對應的所有樹狀項目"""
+        urls = set(urls)
+        return [item for item in self.url_tree.get_children()
+                if self.url_tree.item(item, 'values')[0] in urls]
+
     def sync_worker(self, urls, apply_additional_discount):
         """同步處理線程 - 增強版"""
         
@@ -1013,49 +1118,63 @@ class EnhancedZozoDiscountSyncApp:
         success_count = 0
         fail_count = 0
         failed_urls = []
+        failed_results = {}  # 失敗的結果等重試結束後才寫入，避免同一 URL 同時記為失敗與成功
         
         self.root.after(0, lambda: self.log(f"🚀 開始同步 {total} 個 ZOZO 商品..."))
+        run_id = self.last_run_id = self.state_store.start_run('manual', total)
         
         try:
-            for i, url in enumerate(urls):
+            # 映射檔有更新時重新載入
+            self.syncer = get_shared_syncer()
+            
+            # 同一商品的多個 URL 只抓取一次，結果套用到所有對應項目
+            url_groups = group_urls(urls)
+            if len(url_groups) < total:
+                self.root.after(0, lambda n=len(url_groups): self.log(f"🔗 {total} 個 URL 對應 {n} 個商品，重複商品只處理一次"))
+            
+            # 並行抓取頁面，抓取完成的頁面立即進入同步
+            scheduler = self.create_fetch_scheduler()
+            fetched = scheduler.iter_fetch(list(url_groups), should_stop=lambda: not self.is_syncing)
+            
+            for url, html, fetch_error in fetched:
                 if not self.is_syncing:  # 檢查是否被停止
                     break
                     
-                completed += 1
-                current_item = None
+                group = url_groups[url]
+                completed += len(group)
                 
-                # 找到對應的樹狀項目
-                for item in self.url_tree.get_children():
-                    if self.url_tree.item(item, 'values')[0] == url:
-                        current_item = item
-                        break
+                # 找到對應的樹狀項目（同一商品的所有 URL）
+                current_items = self.find_tree_items(group)
                 
                 try:
                     # 更新狀態
                     self.root.after(0, lambda c=completed, t=total:
                                   self.status_var.set(f"🔄 同步中... ({c}/{t})"))
                     
-                    self.root.after(0, lambda: self.progress_text_var.set(f"處理中: {url[:50]}..."))
+                    self.root.after(0, lambda u=url: self.progress_text_var.set(f"處理中: {u[:50]}..."))
                     
-                    if current_item:
+                    for current_item in current_items:
                         self.root.after(0, lambda i=current_item: self.url_tree.set(i, 'status', '🔄 處理中'))
                     
                     # 同步折扣
                     self.root.after(0, lambda u=url, c=completed, t=total:
                                   self.log(f"📝 處理 [{c}/{t}] {u}"))
                     
-                    result = self.syncer.sync_discount(url, apply_additional_discount)
-                    
-                    # 儲存結果
-                    self.sync_results.append(result)
+                    if fetch_error:
+                        result = {'success': False, 'url': url, 'error': fetch_error}
+                    else:
+                        result = self.syncer.sync_discount(url, apply_additional_discount, html_content=html)
                     
                     # 更新日誌和 UI
                     if result['success']:
-                        success_count += 1
+                        # 儲存結果（每個 URL 各一筆）
+                        self.state_store.add_results(run_id, [dict(result, url=group_url) for group_url in group])
+                        success_count += len(group)
                         
                         log_msg = (f"✅ [成功] {result['zozo_sku']} -> {result['easy_sku']} - "
                                  f"ZOZO {result['zozo_discount']}% -> Easy {result['easy_discount']}%, "
-                                 f"更新了 {result['updated_variants_count']} 個變體")
+                                 f"更新了 {result['updated_variants_count']} 個變體"
+                                 f"（略過 {result.get('skipped_variants_count', 0)} 個未變動）")
                         
                         if result.get('additional_discount_applied'):
                             log_msg += f" (含高價商品額外折扣)"
@@ -1063,39 +1182,38 @@ class EnhancedZozoDiscountSyncApp:
                         self.root.after(0, lambda msg=log_msg: self.log(msg, "SUCCESS"))
                         
                         # 更新樹狀列表
-                        if current_item:
-                            current_time = datetime.now().strftime("%m-%d %H:%M")
-                            discount_text = f"{result['easy_discount']}%"
+                        current_time = datetime.now().strftime("%m-%d %H:%M")
+                        discount_text = f"{result['easy_discount']}%"
+                        for current_item in current_items:
                             self.root.after(0, lambda i=current_item, t=current_time, d=discount_text: (
                                 self.url_tree.set(i, 'status', '✅ 成功'),
                                 self.url_tree.set(i, 'last_sync', t),
                                 self.url_tree.set(i, 'discount', d)
                             ))
                     else:
-                        fail_count += 1
+                        fail_count += len(group)
                         failed_urls.append(url)
+                        failed_results[url] = result
                         error_msg = result.get('error', '未知錯誤')
                         
                         self.root.after(0, lambda err=error_msg, u=url:
                                       self.log(f"❌ [失敗] {u} - {err}", "ERROR"))
                         
-                        if current_item:
+                        for current_item in current_items:
                             self.root.after(0, lambda i=current_item: self.url_tree.set(i, 'status', '❌ 失敗'))
                     
                     # 更新進度條
                     self.root.after(0, lambda: self.progress_var.set(completed))
                     
                 except Exception as e:
-                    fail_count += 1
+                    fail_count += len(group)
                     failed_urls.append(url)
+                    failed_results[url] = {'success': False, 'url': url, 'error': str(e)}
                     self.root.after(0, lambda err=str(e), u=url:
                                   self.log(f"💥 [錯誤] 處理 {u} 時發生異常: {err}", "ERROR"))
                     
-                    if current_item:
+                    for current_item in current_items:
                         self.root.after(0, lambda i=current_item: self.url_tree.set(i, 'status', '💥 錯誤'))
-                
-                # 短暫延遲避免過於頻繁的請求
-                time.sleep(1)
             
             # 自動重試失敗的項目
             if failed_urls and self.auto_retry_var.get() and self.is_syncing:
@@ -1120,25 +1238,28 @@ class EnhancedZozoDiscountSyncApp:
                             result = self.syncer.sync_discount(url, apply_additional_discount)
                             
                             if result['success']:
-                                success_count += 1
-                                fail_count -= 1
+                                failed_results.pop(url, None)
+                                self.state_store.add_results(run_id, [dict(result, url=group_url)
+                                                                      for group_url in url_groups[url]])
+                                success_count += len(url_groups[url])
+                                fail_count -= len(url_groups[url])
                                 self.root.after(0, lambda u=url: self.log(f"✅ 重試成功: {u}", "SUCCESS"))
                                 
-                                # 更新對應的樹狀項目
-                                for item in self.url_tree.get_children():
-                                    if self.url_tree.item(item, 'values')[0] == url:
-                                        current_time = datetime.now().strftime("%m-%d %H:%M")
-                                        discount_text = f"{result['easy_discount']}%"
-                                        self.root.after(0, lambda i=item, t=current_time, d=discount_text: (
-                                            self.url_tree.set(i, 'status', '✅ 成功'),
-                                            self.url_tree.set(i, 'last_sync', t),
-                                            self.url_tree.set(i, 'discount', d)
-                                        ))
-                                        break
+                                # 更新對應的樹狀項目（同一商品的所有 URL）
+                                current_time = datetime.now().strftime("%m-%d %H:%M")
+                                discount_text = f"{result['easy_discount']}%"
+                                for item in self.find_tree_items(url_groups[url]):
+                                    self.root.after(0, lambda i=item, t=current_time, d=discount_text: (
+                                        self.url_tree.set(i, 'status', '✅ 成功'),
+                                        self.url_tree.set(i, 'last_sync', t),
+                                        self.url_tree.set(i, 'discount', d)
+                                    ))
                             else:
+                                failed_results[url] = result
                                 retry_failed.append(url)
                                 
                         except Exception as e:
+                            failed_results[url] = {'success': False, 'url': url, 'error': str(e)}
                             retry_failed.append(url)
                             self.root.after(0, lambda u=url, err=str(e):
                                           self.log(f"❌ 重試失敗: {u} - {err}", "ERROR"))
@@ -1151,6 +1272,10 @@ class EnhancedZozoDiscountSyncApp:
             self.root.after(0, lambda err=str(e): self.log(f"💥 [嚴重錯誤] 同步過程中斷: {err}", "ERROR"))
         finally:
             self.is_syncing = False
+            # 寫入重試後仍失敗的結果（最後一次的錯誤）
+            for url, result in failed_results.items():
+                self.state_store.add_results(run_id, [dict(result, url=group_url) for group_url in url_groups[url]])
+            self.state_store.finish_run(run_id)
             
             # 完成處理
             self.root.after(0, lambda: self.log(f"🎉 同步完成! 共處理 {total} 個 URL，成功 {success_count} 個，失敗 {fail_count} 個", "SUCCESS"))
@@ -1259,7 +1384,7 @@ class EnhancedZozoDiscountSyncApp:
             if result['success']:
                 self.root.after(0, lambda: self.log(f"✅ [測試成功] {result['zozo_sku']} -> {result['easy_sku']}", "SUCCESS"))
                 self.root.after(0, lambda: self.log(f"📊 折扣: ZOZO {result['zozo_discount']}% -> Easy {result['easy_discount']}%"))
-                self.root.after(0, lambda: self.log(f"🔧 更新了 {result['updated_variants_count']} 個變體"))
+                self.root.after(0, lambda: self.log(f"🔧 更新了 {result['updated_variants_count']} 個變體，略過 {result.get('skipped_variants_count', 0)} 個未變動"))
                 self.root.after(0, lambda: self.log(f"⏱️ 處理時間: {processing_time:.1f} 秒"))
                 
                 # 詳細結果對話框
@@ -1269,6 +1394,7 @@ class EnhancedZozoDiscountSyncApp:
                     f"🏪 Easy SKU: {result['easy_sku']}\n"
                     f"💰 折扣: {result['zozo_discount']}% → {result['easy_discount']}%\n"
                     f"🔧 更新變體數: {result['updated_variants_count']}\n"
+                    f"⏭️ 略過未變動: {result.get('skipped_variants_count', 0)}\n"
                     f"💵 原價: ¥{result.get('original_price', 'N/A')}\n"
                     f"💸 最終價格: ¥{result.get('final_price', 'N/A')}\n"
                     f"⚡ 高價折扣: {'是' if result.get('additional_discount_applied') else '否'}\n"
@@ -1311,7 +1437,6 @@ class EnhancedZozoDiscountSyncApp:
         # 重置進度條
         self.progress_var.set(0)
         self.progress['maximum'] = len(urls)
-        self.sync_results = []
         self.is_syncing = True
         
         # 更新 UI 狀態
@@ -1333,8 +1458,12 @@ class EnhancedZozoDiscountSyncApp:
         fail_count = 0
         
         self.root.after(0, lambda: self.log(f"🔙 開始還原 {total} 個商品的原價...", "INFO"))
+        run_id = self.last_run_id = self.state_store.start_run('restore', total)
         
         try:
+            # 映射檔有更新時重新載入
+            self.syncer = get_shared_syncer()
+            
             for url in urls:
                 if not self.is_syncing:  # 檢查是否被停止
                     break
@@ -1365,7 +1494,7 @@ class EnhancedZozoDiscountSyncApp:
                     result = self.syncer.restore_original_prices(url)
                     
                     # 儲存結果
-                    self.sync_results.append(result)
+                    self.state_store.add_results(run_id, [result], operation='restore')
                     
                     # 更新日誌
                     if result['success']:
@@ -1409,6 +1538,7 @@ class EnhancedZozoDiscountSyncApp:
             self.root.after(0, lambda err=str(e): self.log(f"💥 [嚴重錯誤] 還原過程中斷: {err}", "ERROR"))
         finally:
             self.is_syncing = False
+            self.state_store.finish_run(run_id)
             
             # 完成處理
             self.root.after(0, lambda: self.log(f"🎉 還原完成! 共處理 {total} 個 URL，成功 {success_count} 個，失敗 {fail_count} 個", "SUCCESS"))
@@ -1525,8 +1655,9 @@ class EnhancedZozoDiscountSyncApp:
             self.log("🧹 日誌已清空")
 
     def export_results(self):
-        """匯出同步結果 - 增強版"""
-        if not self.sync_results:
+        """匯出同步結果 - 增強版（最近一次手動同步 / 還原，從狀態資料庫查詢）"""
+        results = self.state_store.get_run_results(self.last_run_id) if self.last_run_id else []
+        if not results:
             messagebox.showinfo("提示", "沒有同步結果可匯出")
             return
             
@@ -1547,16 +1678,16 @@ class EnhancedZozoDiscountSyncApp:
             try:
                 # 準備匯出資料
                 export_data = []
-                for i, r in enumerate(self.sync_results, 1):
+                for i, r in enumerate(results, 1):
                     base_data = {
                         '序號': i,
-                        '時間戳': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                        '時間戳': datetime.fromtimestamp(r['timestamp']).strftime('%Y-%m-%d %H:%M:%S'),
                         'URL': r.get('url', ''),
                         '狀態': '成功' if r.get('success', False) else '失敗'
                     }
                     
                     if r.get('success', False):
-                        if 'zozo_discount' in r:  # 折扣同步
+                        if r.get('operation') == 'discount':  # 折扣同步
                             base_data.update({
                                 '操作類型': '折扣同步',
                                 'ZOZO SKU': r.get('zozo_sku', ''),
@@ -1567,6 +1698,7 @@ class EnhancedZozoDiscountSyncApp:
                                 '最終價格': r.get('final_price', ''),
                                 '高價商品額外折扣': '是' if r.get('additional_discount_applied', False) else '否',
                                 '更新變體數': r.get('updated_variants_count', ''),
+                                '略過變體數': r.get('skipped_variants_count', ''),
                                 'Product ID': r.get('product_id', ''),
                                 '折扣截止': r.get('discount_deadline', ''),
                                 '節省金額': r.get('original_price', 0) - r.get('final_price', 0) if r.get('original_price') and r.get('final_price') else 0
@@ -1597,16 +1729,15 @@ class EnhancedZozoDiscountSyncApp:
                         df.to_excel(writer, sheet_name='同步結果', index=False)
                         
                         # 統計摘要
+                        summary = self.state_store.get_run_summary(self.last_run_id)
                         summary_data = {
                             '項目': ['總處理數', '成功數', '失敗數', '成功率', '總節省金額'],
                             '數值': [
-                                len(self.sync_results),
-                                len([r for r in self.sync_results if r.get('success')]),
-                                len([r for r in self.sync_results if not r.get('success')]),
-                                f"{len([r for r in self.sync_results if r.get('success')])/len(self.sync_results)*100:.1f}%",
-                                sum([r.get('original_price', 0) - r.get('final_price', 0)
-                                    for r in self.sync_results
-                                    if r.get('success') and r.get('original_price') and r.get('final_price')])
+                                summary['total'],
+                                summary['success'],
+                                summary['failed'],
+                                f"{summary['success']/summary['total']*100:.1f}%",
+                                summary['savings']
                             ]
                         }
                         pd.DataFrame(summary_data).to_excel(writer, sheet_name='統計摘要', index=False)
@@ -1698,101 +1829,156 @@ class EnhancedZozoDiscountSyncApp:
         self.log("⏹️ 自動排程已停止", "WARNING")
 
     def schedule_worker(self):
-        """排程工作線程"""
+        """
+        排程工作線程
+        每個商品依優先佇列排程：折扣截止後立即重新檢查，價格穩定的商品逐步拉長間隔
+        """
+        priority = None
+        
         while not self.stop_schedule:
             try:
-                interval_minutes = self.schedule_interval_var.get()
-                next_run = datetime.now() + timedelta(minutes=interval_minutes)
+                interval_seconds = self.schedule_interval_var.get() * 60
+                if priority is None or priority.base_interval != max(interval_seconds, priority.min_interval):
+                    # 啟動或間隔設定變更時重建排程，第一次檢查在一個間隔後
+                    priority = SyncPriorityScheduler(interval_seconds)
+                
+                urls = []
+                for item in self.url_tree.get_children():
+                    values = self.url_tree.item(item, 'values')
+                    urls.append(values[0])
+                priority.set_urls(urls, initial_delay=interval_seconds)
                 
                 # 更新下次執行時間
-                self.root.after(0, lambda: self.next_run_var.set(f"下次執行: {next_run.strftime('%H:%M:%S')}"))
+                next_due = priority.next_due_time()
+                if next_due is not None:
+                    next_run = datetime.fromtimestamp(next_due)
+                    self.root.after(0, lambda t=next_run: self.next_run_var.set(f"下次執行: {t.strftime('%H:%M:%S')}"))
                 
-                # 等待到執行時間
-                for remaining in range(interval_minutes * 60, 0, -1):
+                # 等待到最近的到期時間（最多 60 秒，期間新增的 URL 也會加入排程）
+                wait_until = min(next_due or float('inf'), time.time() + 60)
+                while time.time() < wait_until:
                     if self.stop_schedule:
                         return
-                    
                     time.sleep(1)
-                    
-                    # 每分鐘更新一次顯示
-                    if remaining % 60 == 0:
-                        minutes_left = remaining // 60
-                        self.root.after(0, lambda m=minutes_left:
-                                      self.next_run_var.set(f"下次執行: {m} 分鐘後"))
                 
                 if self.stop_schedule:
                     return
+                if self.is_syncing:
+                    # 手動同步進行中：到期時間已過時上面的等待不會休眠，需等待後再檢查
+                    time.sleep(1)
+                    continue
+                
+                due = priority.pop_due()
+                if not due:
+                    continue
                 
                 # 執行同步
-                self.root.after(0, lambda: self.log("⏰ 排程觸發自動同步", "INFO"))
+                url_groups = dict(due)
+                total_urls = sum(len(group) for group in url_groups.values())
+                self.root.after(0, lambda n=len(url_groups): self.log(f"⏰ 排程觸發自動同步（{n} 個商品到期）", "INFO"))
                 
-                urls = []
-                for item in self.url_tree.get_children():
-                    values = self.url_tree.item(item, 'values')
-                    urls.append(values[0])
+                # 記錄排程執行
+                start_time = datetime.now()
                 
-                if urls and not self.is_syncing:
-                    # 記錄排程執行
-                    start_time = datetime.now()
-                    
-                    # 執行同步（簡化版，不更新 UI 進度）
-                    success_count = 0
-                    fail_count = 0
-                    
-                    for url in urls:
+                # 執行同步（簡化版，不更新 UI 進度；增量模式，價格未變動的商品不更新 Easy Store）
+                success_count = 0
+                unchanged_count = 0
+                fail_count = 0
+                
+                recorded = set()
+                run_id = None
+                try:
+                    self.syncer = get_shared_syncer()
+                    run_id = self.state_store.start_run('schedule', total_urls)
+                    scheduler = self.create_fetch_scheduler()
+                    for url, html, fetch_error in scheduler.iter_fetch(list(url_groups), should_stop=lambda: self.stop_schedule):
                         if self.stop_schedule:
                             break
-                        try:
-                            result = self.syncer.sync_discount(url, self.high_price_var.get())
-                            if result['success']:
-                                success_count += 1
-                            else:
-                                fail_count += 1
-                        except:
-                            fail_count += 1
-                    
-                    # 更新排程歷史
-                    history_item = (
-                        start_time.strftime('%Y-%m-%d %H:%M:%S'),
-                        '完成',
-                        len(urls),
-                        success_count,
-                        fail_count
-                    )
-                    
-                    self.root.after(0, lambda: self.history_tree.insert('', 0, values=history_item))
-                    self.root.after(0, lambda: self.log(f"⏰ 排程同步完成: 成功 {success_count}, 失敗 {fail_count}", "SUCCESS"))
+                        group = url_groups[url]
+                        if fetch_error:
+                            result = {'success': False, 'url': url, 'error': fetch_error}
+                        else:
+                            try:
+                                result = self.syncer.sync_discount(url, self.high_price_var.get(), html_content=html,
+                                                                   incremental=True)
+                            except Exception as e:
+                                result = {'success': False, 'url': url, 'error': str(e)}
+                        if result.get('outcome') == 'unchanged':
+                            unchanged_count += len(group)
+                        elif result['success']:
+                            success_count += len(group)
+                        else:
+                            fail_count += len(group)
+                        priority.record(url, result)
+                        recorded.add(url)
+                        self.state_store.add_results(run_id, [dict(result, url=group_url) for group_url in group])
+                finally:
+                    # 未記錄結果的商品（錯誤或中止）重新排入，否則會永遠不再同步
+                    for url in url_groups:
+                        if url not in recorded:
+                            priority.requeue(url)
+                    if run_id is not None:
+                        self.state_store.finish_run(run_id)
+                
+                # 更新排程歷史
+                history_item = (
+                    start_time.strftime('%Y-%m-%d %H:%M:%S'),
+                    '完成',
+                    total_urls,
+                    success_count,
+                    unchanged_count,
+                    fail_count
+                )
+                
+                self.root.after(0, lambda h=history_item: self.history_tree.insert('', 0, values=h))
+                self.root.after(0, lambda s=success_count, u=unchanged_count, f=fail_count:
+                              self.log(f"⏰ 排程同步完成: 成功 {s}, 未變動 {u}, 失敗 {f}", "SUCCESS"))
                 
             except Exception as e:
                 self.root.after(0, lambda err=str(e): self.log(f"❌ 排程執行錯誤: {err}", "ERROR"))
+                time.sleep(5)
+
+    def toggle_auto_restore(self):
+        """切換折扣截止自動還原"""
+        self.config['auto_restore_on_deadline'] = self.auto_restore_var.get()
+        self.save_config()
+        if self.auto_restore_var.get():
+            self.deadline_restorer.start()
+            self.log("▶️ 折扣截止自動還原已啟用", "SUCCESS")
+        else:
+            self.deadline_restorer.stop()
+            self.log("⏹️ 折扣截止自動還原已停用", "WARNING")
+
+    def on_deadline_restored(self, results):
+        """自動還原完成（背景線程呼叫）"""
+        def update():
+            current_time = datetime.now().strftime("%m-%d %H:%M")
+            restored_urls = set()
+            for result in results:
+                if result['success']:
+                    restored_urls.add(result['url'])
+                    self.log(f"⏰ [自動還原] 折扣已於 {result['discount_deadline']} 截止，"
+                             f"已還原 {result['restored_variants_count']} 個變體: {result['url']}", "SUCCESS")
+                else:
+                    self.log(f"❌ [自動還原失敗] {result['url']} - {result.get('error', '未知錯誤')}", "ERROR")
+            for item in self.find_tree_items(restored_urls):
+                self.url_tree.set(item, 'status', '🔙 已還原')
+                self.url_tree.set(item, 'last_sync', current_time)
+                self.url_tree.set(item, 'discount', '原價')
+        self.root.after(0, update)
 
     def update_stats(self):
         """更新統計資料"""
         try:
-            # 這裡可以實現統計資料的計算
-            # 目前是簡化版本
-            
-            total_syncs = len(self.sync_results)
-            successful_syncs = len([r for r in self.sync_results if r.get('success')])
-            failed_syncs = total_syncs - successful_syncs
-            
-            # 計算總節省金額
-            total_savings = sum([
-                r.get('original_price', 0) - r.get('final_price', 0)
-                for r in self.sync_results
-                if r.get('success') and r.get('original_price') and r.get('final_price')
-            ])
-            
-            # 計算平均折扣
-            discounts = [r.get('easy_discount', 0) for r in self.sync_results if r.get('success') and r.get('easy_discount')]
-            avg_discount = sum(discounts) / len(discounts) if discounts else 0
+            # 所有折扣同步結果的統計（狀態資料庫以 SQL 彙總）
+            stats = self.state_store.get_stats()
             
-            # 最後同步時間
-            last_sync = max([
-                r.get('timestamp', datetime.min)
-                for r in self.sync_results
-                if r.get('success')
-            ], default=datetime.min)
+            total_syncs = stats['total']
+            successful_syncs = stats['success']
+            failed_syncs = stats['failed']
+            total_savings = stats['total_savings']
+            avg_discount = stats['avg_discount']
+            last_sync = datetime.fromtimestamp(stats['last_sync']) if stats['last_sync'] else datetime.min
             
             # 更新顯示
             self.stats_labels['total_syncs'].config(text=str(total_syncs))
@@ -1904,6 +2090,14 @@ class EnhancedZozoDiscountSyncApp:
             except:
                 pass
             
+            self.deadline_restorer.stop()
+            
+            try:
+                shutdown_driver_pools()
+                self.log("🗑️ 已關閉瀏覽器連線池")
+            except:
+                pass
+            
             # 自動儲存 URL 和設定
             self.save_tracked_urls()
             self.save_config()
@@ -4,7 +4,6 @@ ZOZO Town 折扣同步核心模組 - 統一版本
 使用與庫存同步系統完全一致的HTML解析邏輯和SKU生成邏輯
 """
 
-import requests
 import pandas as pd
 import json
 import logging
@@ -13,12 +12,15 @@ import re
 import os
 import sys
 import hashlib
-from config import BASE_API, API_HEADERS
+import threading
+from easystore_client import get_easystore_client
 
 # ✅ 導入統一的ZOZO解析模組
-from zozo_selenium_fetcher import fetch_html_from_url_optimized
 from zozo_html_parser import ZozoHtmlParser  # 使用統一版本
 from zozo_discount_sync_processor import ZozoDiscountSyncProcessor
+from sku_variant_index import load_sku_variant_index
+from zozo_state_store import get_state_store
+from zozo_urls import extract_goods_id
 
 # 路徑工具
 if getattr(sys, 'frozen', False):
@@ -47,32 +49,66 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(mess
 
 
 class ZozoDiscountSyncer:
-    def __init__(self, sku_mapping_file='sku_variant_mapping.xlsx'):
-        """初始化 ZOZO 折扣同步器"""
-        # 讀取 SKU 映射檔案
-        sku_mapping_path = resource_path(sku_mapping_file)
-        logging.info(f"讀取映射檔案: {sku_mapping_path}")
+    def __init__(self, sku_mapping_file='sku_variant_mapping.xlsx', fetch_func=None):
+        """
+        初始化 ZOZO 折扣同步器
         
-        self.variant_df = pd.read_excel(sku_mapping_path, engine='openpyxl')
-        logging.info(f"已載入 {len(self.variant_df)} 筆變體映射資料")
+        Args:
+            sku_mapping_file: SKU 映射檔
+            fetch_func: ZOZO 頁面抓取函數（預設為經過 HTML 快取的分層抓取；離線測試可傳入 ReplayFetcher）
+        """
+        # 讀取 SKU 映射檔案（Excel 未變更時直接使用索引快取）
+        self.sku_mapping_path = resource_path(sku_mapping_file)
+        logging.info(f"讀取映射檔案: {self.sku_mapping_path}")
+        self._variant_df = None
         
         # ✅ 初始化統一的折扣同步處理器
-        self.discount_processor = ZozoDiscountSyncProcessor()
+        self.discount_processor = ZozoDiscountSyncProcessor(fetch_func)
+        
+        # 共用的 Easy Store 客戶端（連線池 + 自動重試）
+        self.api = get_easystore_client()
+        
+        # ✅ SKU -> 變體索引（一次建立，查詢為常數時間）
+        self._mapping_stamp = None
+        self.reload()
+
+    def _read_mapping_stamp(self):
+        """映射檔的 (修改時間, 大小)，用來判斷是否需要重新載入"""
+        stat = os.stat(self.sku_mapping_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self):
+        """重新載入 SKU 映射（映射檔更新後呼叫）"""
+        self._mapping_stamp = self._read_mapping_stamp()
+        sku_index = load_sku_variant_index(self.sku_mapping_path)
         
         # 創建 SKU 映射表 (ZOZO SKU -> Easy Store SKU)
-        self.sku_map = {}
-        for _, row in self.variant_df.iterrows():
-            sku = str(row.get("SKU", "")).strip()
-            if sku:
-                self.sku_map[sku] = sku  # ZOZO SKU 對應到 Easy Store SKU
+        sku_map = {sku: sku for sku in sku_index}
         
+        # 先建好再整組替換，其他線程不會看到一半的映射
+        self.sku_index, self.sku_map, self._variant_df = sku_index, sku_map, None
         logging.info(f"已載入 {len(self.sku_map)} 個 SKU 映射")
 
-    def get_zozo_product_info(self, url):
-        """✅ 使用統一解析器獲取 ZOZO Town 商品資訊"""
+    def mapping_changed(self):
+        """映射檔是否在載入後被修改"""
+        try:
+            return self._read_mapping_stamp() != self._mapping_stamp
+        except OSError:
+            return False
+
+    @property
+    def variant_df(self):
+        """完整映射表 DataFrame（僅在需要時才讀取 Excel）"""
+        if self._variant_df is None:
+            self._variant_df = pd.read_excel(self.sku_mapping_path, engine='openpyxl')
+            logging.info(f"已載入 {len(self._variant_df)} 筆變體映射資料")
+        return self._variant_df
+
+    def get_zozo_product_info(self, url, html_content=None):
+        """✅ 使用統一解析器獲取 ZOZO Town 商品資訊（html_content 已由排程器抓取時直接解析）"""
         try:
             # 使用統一的折扣同步處理器
-            discount_data = self.discount_processor.process_product_for_discount_sync(url)
+            discount_data = self.discount_processor.process_product_for_discount_sync(url, html_content)
             
             if "error" in discount_data:
                 raise ValueError(discount_data["error"])
@@ -143,7 +179,7 @@ class ZozoDiscountSyncer:
                 logging.warning(f"  {i+1}. {sku}")
         
         # 列出一些現有的 SKU 作為參考
-        existing_skus = list(self.sku_map.keys())[:10]
+        existing_skus = self.sku_index.sample(10)
         logging.warning("參考現有 SKU 格式:")
         for i, sku in enumerate(existing_skus):
             logging.warning(f"  {i+1}. {sku}")
@@ -154,17 +190,16 @@ class ZozoDiscountSyncer:
         """獲取變體資訊"""
         easy_sku_str = str(easy_sku).strip()
         
-        # 從本地映射表查找
-        row = self.variant_df[
-            self.variant_df['SKU'].astype(str).str.strip() == easy_sku_str
-        ]
+        # 從本地索引查找
+        entry = self.sku_index.get(easy_sku_str)
         
-        if not row.empty:
+        if entry is not None:
+            product_id, variant_id, price, compare_at_price = entry
             return {
-                "product_id": int(row['product_id'].iat[0]),
-                "variant_id": int(row['Variant ID'].iat[0]),
-                "price": row.get('price', [0]).iat[0] if 'price' in row else 0,
-                "compare_at_price": row.get('compare_at_price', [0]).iat[0] if 'compare_at_price' in row else 0
+                "product_id": product_id,
+                "variant_id": variant_id,
+                "price": price,
+                "compare_at_price": compare_at_price
             }
         
         raise ValueError(f"找不到對應的 Variant ID: {easy_sku_str}")
@@ -172,11 +207,7 @@ class ZozoDiscountSyncer:
     def get_all_product_variants(self, product_id):
         """獲取指定商品的所有變體"""
         try:
-            url = f"{BASE_API}/products/{product_id}.json"
-            resp = requests.get(url, headers=API_HEADERS)
-            resp.raise_for_status()
-            
-            product_data = resp.json().get("product", {})
+            product_data = self.api.get_product(product_id)
             variants = product_data.get("variants", [])
             
             # 確保價格字段是數值類型
@@ -200,23 +231,58 @@ class ZozoDiscountSyncer:
     def update_variant_price(self, product_id, variant_id, new_price):
         """更新 Easy Store 商品變體的價格"""
         try:
-            url = f"{BASE_API}/products/{product_id}/variants/{variant_id}.json"
-            payload = {"variant": {"price": new_price}}
-            resp = requests.put(url, headers=API_HEADERS, json=payload)
-            resp.raise_for_status()
+            result = self.api.update_variant(product_id, variant_id, {"price": new_price})
             logging.info(f"已更新變體 {variant_id} 價格: {new_price}")
-            return resp.json()
+            return result
             
         except Exception as e:
             logging.error(f"更新變體價格失敗: {variant_id} => {e}")
             raise
 
-    def sync_discount(self, url, apply_additional_discount=False):
-        """✅ 同步單一 URL 的折扣到 Easy Store 所有變體"""
+    def apply_variant_prices(self, product_id, variant_records, price_key):
+        """
+        並行寫入變體價格，並在每筆記錄上標註 success / error
+        
+        Args:
+            product_id: Easy Store 商品 ID
+            variant_records: 含 variant_id 與價格欄位的記錄列表
+            price_key: 要寫入的價格欄位名稱
+            
+        Returns:
+            list: 更新失敗的記錄
+        """
+        updates = [(record["variant_id"], {"price": record[price_key]}) for record in variant_records]
+        outcomes = self.api.update_variants(product_id, updates)
+        
+        failed = []
+        for record, outcome in zip(variant_records, outcomes):
+            record["success"] = outcome["success"]
+            if outcome["success"]:
+                logging.info(f"已更新變體 {record['variant_id']} 價格: {record[price_key]}")
+            else:
+                record["error"] = outcome["error"]
+                failed.append(record)
+                logging.error(f"更新變體價格失敗: {record['variant_id']} => {outcome['error']}")
+        return failed
+
+    def sync_discount(self, url, apply_additional_discount=False, html_content=None, incremental=False):
+        """
+        ✅ 同步單一 URL 的折扣到 Easy Store 所有變體
+
+        incremental=True 時，ZOZO 價格、原價、折扣比例與高價額外折扣設定都與最後一次成功同步相同的商品
+        不讀取也不寫入 Easy Store，回傳 outcome 為 'unchanged' 的結果
+        """
         try:
             # 1. 獲取 ZOZO 商品資訊（使用統一解析器）
             logging.info(f"開始處理 ZOZO 商品: {url}")
-            product_info = self.get_zozo_product_info(url)
+            product_info = self.get_zozo_product_info(url, html_content)
+            
+            # 增量模式：價格未變動時直接結束
+            if incremental:
+                unchanged = self.get_unchanged_result(url, product_info, apply_additional_discount)
+                if unchanged is not None:
+                    logging.info(f"ZOZO 價格未變動，略過 Easy Store 更新: {url}")
+                    return unchanged
             
             # 2. 找到匹配的 SKU
             zozo_sku, easy_sku = self.find_matching_sku(product_info)
@@ -236,7 +302,7 @@ class ZozoDiscountSyncer:
             all_variants = self.get_all_product_variants(product_id)
             logging.info(f"準備更新 {len(all_variants)} 個變體的價格")
             
-            # 6. 對所有變體套用相同折扣
+            # 6. 對所有變體計算相同折扣
             updated_variants = []
             final_price = 0
             
@@ -262,39 +328,52 @@ class ZozoDiscountSyncer:
                     final_price = discounted_price
                     need_additional_discount = False
                 
-                # 更新價格
-                self.update_variant_price(product_id, variant_id, final_price)
-                
-                # 記錄更新結果
+                # 記錄更新內容（現價已等於目標價格的變體不需寫入）
                 updated_variants.append({
                     "variant_id": variant_id,
                     "sku": variant.get("sku", ""),
+                    "current_price": price,
                     "original_price": compare_price,
                     "discounted_price": discounted_price,
                     "final_price": final_price,
-                    "additional_discount": need_additional_discount
+                    "additional_discount": need_additional_discount,
+                    "skipped": price == final_price
                 })
             
-            logging.info(f"成功更新 {len(updated_variants)} 個變體")
+            # 7. 只並行更新價格有變動的變體
+            to_write = [v for v in updated_variants if not v["skipped"]]
+            skipped_count = len(updated_variants) - len(to_write)
+            failed_variants = self.apply_variant_prices(product_id, to_write, "final_price")
+            written_count = len(to_write) - len(failed_variants)
+            logging.info(f"成功更新 {written_count} 個變體，{skipped_count} 個變體價格未變動已略過")
             
-            # 7. 返回結果
-            return {
-                'success': True,
+            # 8. 返回結果
+            result = {
+                'success': not failed_variants,
                 'zozo_sku': zozo_sku,
                 'easy_sku': easy_sku,
                 'url': url,
                 'zozo_discount': zozo_discount,
                 'easy_discount': easy_discount,
+                'zozo_price': product_info['price'],
+                'zozo_discount_ratio': product_info['discount_ratio'],
                 'original_price': product_info['original_price'],
                 'final_price': final_price,
                 'high_price': any(v['additional_discount'] for v in updated_variants),
                 'additional_discount_applied': apply_additional_discount and any(v['additional_discount'] for v in updated_variants),
+                'additional_discount_enabled': apply_additional_discount,
                 'product_id': product_id,
                 'variant_id': reference_variant_id,
-                'updated_variants_count': len(updated_variants),
+                'updated_variants_count': written_count,
                 'updated_variants': updated_variants,
+                'written_variants_count': written_count,
+                'skipped_variants_count': skipped_count,
+                'failed_variants_count': len(failed_variants),
                 'discount_deadline': product_info.get('discount_deadline', '')
             }
+            if failed_variants:
+                result['error'] = f"{len(failed_variants)}/{len(to_write)} 個變體更新失敗: {failed_variants[0]['error']}"
+            return result
             
         except Exception as e:
             logging.error(f"同步折扣失敗: {url} => {e}")
@@ -304,6 +383,89 @@ class ZozoDiscountSyncer:
                 'error': str(e)
             }
 
+    def get_unchanged_result(self, url, product_info, apply_additional_discount=False):
+        """價格與高價額外折扣設定都與最後一次成功同步相同時回傳 'unchanged' 結果，否則為 None"""
+        goods_id = extract_goods_id(url)
+        state_store = get_state_store()
+        if not goods_id or not state_store.is_price_unchanged(
+            goods_id, product_info['price'], product_info['original_price'], product_info['discount_ratio'],
+            apply_additional_discount
+        ):
+            return None
+
+        state = state_store.get_product_state(goods_id)
+        return {
+            'success': True,
+            'outcome': 'unchanged',
+            'url': url,
+            'zozo_discount': product_info['discount_pct'],
+            'easy_discount': self.calculate_easy_discount(product_info['discount_pct']),
+            'zozo_price': product_info['price'],
+            'zozo_discount_ratio': product_info['discount_ratio'],
+            'original_price': product_info['original_price'],
+            'final_price': state['written_price'],
+            'additional_discount_enabled': apply_additional_discount,
+            'product_id': state['product_id'],
+            'updated_variants_count': 0,
+            'written_variants_count': 0,
+            'skipped_variants_count': 0,
+            'failed_variants_count': 0,
+            'discount_deadline': product_info.get('discount_deadline', '')
+        }
+
+    def restore_product_prices(self, product_id):
+        """
+        以 Easy Store 商品 ID 還原所有變體到原價（不需抓取 ZOZO 頁面）
+
+        Returns:
+            dict: success, product_id, restored_variants_count, restored_variants,
+                  written_variants_count, skipped_variants_count, failed_variants_count（失敗時含 error）
+        """
+        # 1. 獲取所有變體
+        all_variants = self.get_all_product_variants(product_id)
+        
+        # 2. 計算所有變體的原價
+        restored_variants = []
+        
+        for variant in all_variants:
+            variant_id = variant["id"]
+            
+            # 取得原價
+            try:
+                compare_price = int(float(variant.get("compare_at_price", 0)))
+                if not compare_price:
+                    compare_price = int(float(variant.get("price", 0)))
+            except (TypeError, ValueError):
+                compare_price = 0
+            
+            if compare_price > 0:
+                restored_variants.append({
+                    "variant_id": variant_id,
+                    "sku": variant.get("sku", ""),
+                    "restored_price": compare_price,
+                    "skipped": variant.get("price") == compare_price
+                })
+        
+        # 3. 只並行還原目前不是原價的變體
+        to_write = [v for v in restored_variants if not v["skipped"]]
+        skipped_count = len(restored_variants) - len(to_write)
+        failed_variants = self.apply_variant_prices(product_id, to_write, "restored_price")
+        restored_count = len(to_write) - len(failed_variants)
+        logging.info(f"成功還原 {restored_count} 個變體的原價，{skipped_count} 個變體已是原價已略過")
+        
+        result = {
+            'success': not failed_variants,
+            'product_id': product_id,
+            'restored_variants_count': restored_count,
+            'restored_variants': restored_variants,
+            'written_variants_count': restored_count,
+            'skipped_variants_count': skipped_count,
+            'failed_variants_count': len(failed_variants)
+        }
+        if failed_variants:
+            result['error'] = f"{len(failed_variants)}/{len(to_write)} 個變體還原失敗: {failed_variants[0]['error']}"
+        return result
+
     def restore_original_prices(self, url):
         """還原商品到原價"""
         try:
@@ -315,46 +477,11 @@ class ZozoDiscountSyncer:
             
             # 3. 獲取變體資訊
             variant_info = self.get_variant_info(easy_sku)
-            product_id = variant_info["product_id"]
-            
-            # 4. 獲取所有變體
-            all_variants = self.get_all_product_variants(product_id)
-            
-            # 5. 還原所有變體的原價
-            restored_variants = []
-            
-            for variant in all_variants:
-                variant_id = variant["id"]
-                
-                # 取得原價
-                try:
-                    compare_price = int(float(variant.get("compare_at_price", 0)))
-                    if not compare_price:
-                        compare_price = int(float(variant.get("price", 0)))
-                except (TypeError, ValueError):
-                    compare_price = 0
-                
-                if compare_price > 0:
-                    # 還原為原價
-                    self.update_variant_price(product_id, variant_id, compare_price)
-                    
-                    restored_variants.append({
-                        "variant_id": variant_id,
-                        "sku": variant.get("sku", ""),
-                        "restored_price": compare_price
-                    })
-            
-            logging.info(f"成功還原 {len(restored_variants)} 個變體的原價")
             
-            return {
-                'success': True,
-                'zozo_sku': zozo_sku,
-                'easy_sku': easy_sku,
-                'url': url,
-                'product_id': product_id,
-                'restored_variants_count': len(restored_variants),
-                'restored_variants': restored_variants
-            }
+            # 4. 還原所有變體
+            result = self.restore_product_prices(variant_info["product_id"])
+            result.update({'zozo_sku': zozo_sku, 'easy_sku': easy_sku, 'url': url})
+            return result
             
         except Exception as e:
             logging.error(f"還原原價失敗: {url} => {e}")
@@ -365,15 +492,42 @@ class ZozoDiscountSyncer:
             }
 
 
+# 程序內共用的同步器（依映射檔區分）
+_shared_syncers = {}
+_shared_syncers_lock = threading.Lock()
+
+
+def get_shared_syncer(sku_mapping_file='sku_variant_mapping.xlsx', reload=False):
+    """
+    取得共用的 ZozoDiscountSyncer，映射檔變更時自動重新載入
+
+    Args:
+        sku_mapping_file: SKU 映射檔
+        reload: 是否強制重新載入映射
+
+    Returns:
+        ZozoDiscountSyncer
+    """
+    with _shared_syncers_lock:
+        syncer = _shared_syncers.get(sku_mapping_file)
+        if syncer is None:
+            syncer = ZozoDiscountSyncer(sku_mapping_file)
+            _shared_syncers[sku_mapping_file] = syncer
+        elif reload or syncer.mapping_changed():
+            logging.info(f"重新載入映射檔案: {syncer.sku_mapping_path}")
+            syncer.reload()
+        return syncer
+
+
 # 便利函數供外部使用
 def sync_zozo_discount(url, apply_additional_discount=False):
     """便利函數：同步單一 ZOZO 商品折扣"""
-    syncer = ZozoDiscountSyncer()
+    syncer = get_shared_syncer()
     return syncer.sync_discount(url, apply_additional_discount)
 
 def restore_zozo_prices(url):
     """便利函數：還原單一 ZOZO 商品原價"""
-    syncer = ZozoDiscountSyncer()
+    syncer = get_shared_syncer()
     return syncer.restore_original_prices(url)
 
 
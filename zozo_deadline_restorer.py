@@ -0,0 +1,157 @@
+# zozo_deadline_restorer.py
+"""
+折扣截止自動還原
+依狀態資料庫中每個商品的 discount_deadline 建立以分鐘為格的時間輪，
+截止時間一到就以保存的 Easy Store 商品 ID 還原原價（不需重新抓取 ZOZO 頁面）
+同一分鐘截止的商品合併為一批並行還原，還原失敗的商品以指數退避延後重試
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from zozo_state_store import get_state_store
+from zozo_priority_scheduler import parse_deadline
+
+DEFAULT_RESTORE_WORKERS = 4        # 同一批次同時還原的商品數
+RESTORE_RETRY_DELAY = 60           # 還原失敗後第一次重試的延遲（秒）
+RESTORE_RETRY_MAX_DELAY = 6 * 3600  # 重試延遲上限（秒）
+
+
+class DeadlineRestorer:
+    """折扣截止自動還原（分鐘時間輪）"""
+
+    def __init__(self, syncer_factory=None, state_store=None, max_workers=DEFAULT_RESTORE_WORKERS, on_restored=None):
+        """
+        Args:
+            syncer_factory: 取得 ZozoDiscountSyncer 的函數（預設為 get_shared_syncer）
+            state_store: ZozoStateStore（預設為全局狀態資料庫）
+            max_workers: 同一批次同時還原的商品數
+            on_restored: 每批還原完成後呼叫 on_restored(results)
+        """
+        if syncer_factory is None:
+            from sync_zozo_discounts_integrated import get_shared_syncer
+            syncer_factory = get_shared_syncer
+        self.syncer_factory = syncer_factory
+        self.state_store = state_store or get_state_store()
+        self.max_workers = max_workers
+        self.on_restored = on_restored
+        self._wheel = {}
+        self._failures = {}  # product_id -> (連續失敗次數, 下次重試時間)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """從狀態資料庫重建時間輪：分鐘 -> 該分鐘截止（或退避後重試）的商品"""
+        wheel = {}
+        with self._lock:
+            failures = dict(self._failures)
+        for product in self.state_store.get_discounted_products():
+            deadline = parse_deadline(product['discount_deadline'], product['fetched_at'])
+            if deadline is None:
+                continue
+            if product['product_id'] in failures:
+                deadline = max(deadline, failures[product['product_id']][1])
+            wheel.setdefault(int(deadline // 60), []).append(product)
+        with self._lock:
+            self._wheel = wheel
+
+    def pop_expired(self, now=None):
+        """取出截止時間已到（含目前這一分鐘）的所有商品"""
+        current_minute = int((time.time() if now is None else now) // 60)
+        with self._lock:
+            expired_minutes = [minute for minute in self._wheel if minute <= current_minute]
+            return [product for minute in sorted(expired_minutes) for product in self._wheel.pop(minute)]
+
+    def next_deadline(self):
+        """最近的截止時間（epoch 秒），沒有時為 None"""
+        with self._lock:
+            return min(self._wheel) * 60 if self._wheel else None
+
+    def restore_batch(self, products):
+        """
+        並行還原一批商品（同一 Easy Store 商品只還原一次）
+
+        Returns:
+            list: 每個商品的還原結果
+        """
+        by_product_id = {}
+        for product in products:
+            by_product_id.setdefault(product['product_id'], []).append(product)
+
+        syncer = self.syncer_factory()
+        run_id = self.state_store.start_run('auto_restore', len(products))
+
+        def restore_one(product_id):
+            try:
+                return syncer.restore_product_prices(product_id)
+            except Exception as e:
+                logging.error(f"自動還原原價失敗: {product_id} => {e}")
+                return {'success': False, 'product_id': product_id, 'error': str(e)}
+
+        results = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for product_id, outcome in zip(by_product_id, executor.map(restore_one, by_product_id)):
+                    for product in by_product_id[product_id]:
+                        results.append(dict(outcome, url=product['url'], goods_id=product['goods_id'],
+                                            discount_deadline=product['discount_deadline']))
+            self.state_store.add_results(run_id, results, operation='restore')
+            self._record_failures(results)
+            self.state_store.mark_restored([result['goods_id'] for result in results if result['success']])
+        finally:
+            self.state_store.finish_run(run_id)
+
+        restored = sum(1 for result in results if result['success'])
+        logging.info(f"折扣截止自動還原: {restored}/{len(results)} 個商品已還原原價")
+        return results
+
+    def _record_failures(self, results):
+        """記錄還原失敗的商品（重試延遲每次加倍），還原成功的商品清除紀錄"""
+        now = time.time()
+        with self._lock:
+            for result in results:
+                product_id = result.get('product_id')
+                if result['success']:
+                    self._failures.pop(product_id, None)
+                    continue
+                count = self._failures.get(product_id, (0, 0))[0] + 1
+                delay = min(RESTORE_RETRY_DELAY * 2 ** (count - 1), RESTORE_RETRY_MAX_DELAY)
+                self._failures[product_id] = (count, now + delay)
+
+    def run_pending(self, now=None):
+        """還原所有已截止的商品，回傳還原結果"""
+        self.refresh()
+        products = self.pop_expired(now)
+        if not products:
+            return []
+        results = self.restore_batch(products)
+        if self.on_restored:
+            self.on_restored(results)
+        return results
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.run_pending()
+            except Exception as e:
+                logging.error(f"折扣截止自動還原錯誤: {e}")
+            # 每分鐘開始時檢查一次
+            self._stop_event.wait(60 - time.time() % 60 + 1)
+
+    def start(self):
+        """啟動背景線程（停止中的線程仍在執行時，清除停止旗標讓它繼續執行）"""
+        self._stop_event.clear()
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止背景線程"""
+        self._stop_event.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop_event.is_set()
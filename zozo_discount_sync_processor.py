@@ -4,17 +4,25 @@ ZOZO折扣同步專用處理器
 專注於價格和折扣信息的同步
 """
 
-import hashlib
 import re
 from zozo_html_parser import ZozoHtmlParser
+from zozo_sku_engine import INVENTORY_SKU_ENGINE, clean_sku, generate_skus_bulk
+from zozo_fetch_scheduler import ZozoFetchScheduler, DEFAULT_FETCH_WORKERS, DEFAULT_HOST_RATE
 
 
 class ZozoDiscountSyncProcessor:
     """ZOZO折扣同步處理器 - 使用與庫存同步完全一致的邏輯"""
     
-    def __init__(self):
-        """初始化處理器"""
+    def __init__(self, fetch_func=None):
+        """
+        初始化處理器
+        
+        Args:
+            fetch_func: 抓取函數 fetch_func(url, headless=...) -> html（預設為經過 HTML 快取的分層抓取；
+                        離線測試可傳入 zozo_page_corpus.ReplayFetcher）
+        """
         self.parser = None
+        self.fetch_func = fetch_func
         
     def process_product_for_discount_sync(self, url, html_content=None):
         """
@@ -28,13 +36,13 @@ class ZozoDiscountSyncProcessor:
             dict: 包含折扣信息和SKU的數據
         """
         try:
-            # ✅ 直接導入並使用 selenium fetcher
-            from zozo_selenium_fetcher import fetch_html_from_url_optimized
+            # ✅ 先查 HTML 快取，過期時 HTTP 條件式請求重新驗證，必要時自動改用 selenium fetcher
+            from zozo_html_cache import fetch_html_cached
             
             # 獲取HTML內容
             if not html_content:
                 print(f"🔍 正在獲取商品頁面: {url}")
-                html_content = fetch_html_from_url_optimized(url, headless=True)
+                html_content = (self.fetch_func or fetch_html_cached)(url, headless=True)
                 
                 if not html_content or len(html_content) < 1000:
                     return {"error": "無法獲取有效的HTML內容", "variants": []}
@@ -42,7 +50,6 @@ class ZozoDiscountSyncProcessor:
             # ✅ 正確初始化解析器
             self.parser = ZozoHtmlParser(url)
             self.parser.html = html_content
-            self.parser.soup = self.parser.get_soup(html_content)
             
             # 解析商品數據（折扣模式）
             parsed_data = self.parser.parse(mode="discount_only")
@@ -164,123 +171,69 @@ class ZozoDiscountSyncProcessor:
             str: 生成的SKU
         """
         try:
-            # ✅ 與庫存同步完全一致的邏輯
-            
-            # 1. 清理輸入
-            clean_product_name = re.sub(r'[^\w\s-]', '', product_name)
-            clean_color = re.sub(r'[^\w]', '', color)
-            clean_size = re.sub(r'[^\w]', '', size)
-            
-            # 2. 提取商品ID（修正版本，支援goods-sale格式）
-            product_id_match = re.search(r'/goods(?:-sale)?[/-](\d+)', url)
-            product_id = product_id_match.group(1) if product_id_match else "UNKNOWN"
-            
-            # 3. 生成唯一字串用於Hash計算
-            unique_string = f"{product_id}-{clean_color}-{clean_size}"
-            hash_part = hashlib.md5(unique_string.encode("utf-8")).hexdigest()[:4].upper()
-            
-            # 4. 生成顏色代碼（與庫存同步一致）
-            color_code = self.enhanced_color_to_code(color)
-            
-            # 5. 生成最終SKU
-            sku = f"ZO-{hash_part}-{color_code}-{size}"
-            
-            # 6. 清理SKU
-            cleaned_sku = self.clean_sku(sku)
-            
-            print(f"🔍 SKU生成（折扣同步）:")
-            print(f"   商品ID: {product_id}")
-            print(f"   原始顏色: {color}")
-            print(f"   顏色代碼: {color_code}")
-            print(f"   unique_string: {unique_string}")
-            print(f"   hash: {hash_part}")
-            print(f"   最終SKU: {cleaned_sku}")
-            
-            return cleaned_sku
+            # ✅ 與 ZozoHtmlParser 共用同一個 SKU 引擎（商品ID + 顏色 + 尺寸 -> Hash）
+            return INVENTORY_SKU_ENGINE.generate(color, size, url)
             
         except Exception as e:
             print(f"❌ SKU生成失敗: {e}")
             return f"ZO-ERROR-{color[:3] if color else 'UNK'}-{size}"
     
     def enhanced_color_to_code(self, color):
-        """✅ 與庫存同步系統完全一致的顏色代碼生成"""
-        
-        # 與庫存同步完全相同的顏色映射表
-        color_map = {
-            "ブラック": "BLK", "ブラック系": "BLK1", "ブラック系1": "BLK2",
-            "ホワイト": "WHT", "ホワイト系": "WHT1", "ホワイト系1": "WHT2",
-            "グレー": "GRY", "グレー系": "GRY1", "グレー系1": "GRY2",
-            "ネイビー": "NVY", "ネイビー系": "NVY1", "ネイビー系1": "NVY2",
-            "ブルー": "BLU", "ブルー系": "BLU1", "ブルー系1": "BLU2",
-            "ブラウン": "BRN", "ブラウン系": "BRN1", "ブラウン系1": "BRN2",
-            "ベージュ": "BEI", "ベージュ系": "BEI1", "ベージュ系1": "BEI2",
-            "レッド": "RED", "レッド系": "RED1", "レッド系1": "RED2",
-            "ピンク": "PNK", "ピンク系": "PNK1", "ピンク系1": "PNK2",
-            "グリーン": "GRN", "グリーン系": "GRN1", "グリーン系1": "GRN2",
-            "イエロー": "YEL", "イエロー系": "YEL1", "イエロー系1": "YEL2",
-            "パープル": "PUR", "パープル系": "PUR1", "パープル系1": "PUR2",
-            "オレンジ": "ORG", "オレンジ系": "ORG1", "オレンジ系1": "ORG2",
-            "カーキ": "KHA", "カーキ系": "KHA1", "カーキ系1": "KHA2",
-            "杢グレー":"GRY","スミクロ":"SBLK","ライトベージュ":"LTB","オートミール":"OT","アッシュブラウン":"ATB","グレイッシュベージュ":"GRYB","グレイッシュブルー":"GRYBU"
-        }
-        
-        # 優先完全匹配
-                # 優先完全匹配
-               
-        if color in color_map:
-            return color_map[color]
-        
-        # ✅ 關鍵修改：如果沒有完全匹配，直接返回 UNK
-        print(f"⚠️ 未映射顏色 '{color}' -> 設為 UNK")
-        return "UNK"
-        
-        # 生成3位縮寫
-        if len(clean_color) >= 3:
-            code = clean_color[:3].upper()
-        else:
-            code = color[:3].upper()
-        
-        # 確保代碼唯一性
-        if '系' in color:
-            if '1' in color:
-                code += '2'
-            else:
-                code += '1'
-        
-        return code
+        """✅ 與庫存同步系統完全一致的顏色代碼生成（未映射顏色為 UNK）"""
+        return INVENTORY_SKU_ENGINE.color_code(color)
     
     def clean_sku(self, sku):
         """✅ 與庫存同步系統完全一致的SKU清理"""
-        if not sku:
-            return ""
-        # 移除所有空白字符（包括空格、制表符、換行等）
-        cleaned_sku = re.sub(r'\s+', '', str(sku))
-        return cleaned_sku
+        return clean_sku(sku)
     
-    def batch_process_discount_sync(self, product_urls):
+    def generate_skus_bulk(self, colors, sizes, urls):
+        """
+        批次版 generate_sku_like_inventory_system（映射表核對用）
+        
+        Args:
+            colors: 顏色欄（list / NumPy 陣列 / pandas Series）
+            sizes: 尺寸欄
+            urls: 商品URL欄
+            
+        Returns:
+            pandas.Series: SKU 欄
+        """
+        return generate_skus_bulk(colors, sizes, urls=urls, engine=INVENTORY_SKU_ENGINE)
+    
+    def batch_process_discount_sync(self, product_urls, max_workers=DEFAULT_FETCH_WORKERS,
+                                    rate_per_host=DEFAULT_HOST_RATE, fetch_func=None):
         """
         批量處理多個商品的折扣同步
+        以並行排程器抓取頁面，每個頁面抓取完成後立即解析
         
         Args:
             product_urls: 商品URL列表
+            max_workers: 同時抓取的工作數
+            rate_per_host: 每個主機每秒請求數（取代固定間隔）
+            fetch_func: 自訂抓取函數（可選）
             
         Returns:
-            list: 所有商品的折扣同步數據
+            list: 所有商品的折扣同步數據（與輸入順序一致）
         """
-        results = []
+        scheduler = ZozoFetchScheduler(
+            fetch_func=fetch_func or self.fetch_func,
+            max_workers=max_workers,
+            rate_per_host=rate_per_host
+        )
+        results_by_url = {}
+        total = len(product_urls)
         
-        for i, url in enumerate(product_urls, 1):
-            print(f"🔄 處理商品 {i}/{len(product_urls)}: {url}")
+        for i, (url, html, error) in enumerate(scheduler.iter_fetch(product_urls), 1):
+            print(f"🔄 處理商品 {i}/{total}: {url}")
             
-            result = self.process_product_for_discount_sync(url)
+            if error:
+                result = {"error": error, "variants": []}
+            else:
+                result = self.process_product_for_discount_sync(url, html_content=html)
             result["url"] = url
-            results.append(result)
-            
-            # 添加處理間隔避免過於頻繁請求
-            import time
-            time.sleep(1)
+            results_by_url[url] = result
         
-        return results
+        return [results_by_url[url] for url in product_urls if url in results_by_url]
     
     def get_sync_summary(self, sync_results):
         """
@@ -338,25 +291,8 @@ class ZozoDiscountSyncProcessor:
             str: 預估的主要SKU
         """
         try:
-            # 提取商品ID
-            product_id_match = re.search(r'/goods(?:-sale)?[/-](\d+)', url)
-            product_id = product_id_match.group(1) if product_id_match else "UNKNOWN"
-            
             # 使用預設值生成SKU（黑色、FREE尺寸）
-            default_color = "ブラック"
-            default_size = "FREE"
-            
-            # 生成唯一字串
-            unique_string = f"{product_id}-{default_color}-{default_size}"
-            hash_part = hashlib.md5(unique_string.encode("utf-8")).hexdigest()[:4].upper()
-            
-            # 生成顏色代碼
-            color_code = self.enhanced_color_to_code(default_color)
-            
-            # 生成SKU
-            sku = f"ZO-{hash_part}-{color_code}-{default_size}"
-            
-            return self.clean_sku(sku)
+            return INVENTORY_SKU_ENGINE.generate("ブラック", "FREE", url)
             
         except Exception as e:
             print(f"❌ 快速SKU提取失敗: {e}")
@@ -0,0 +1,152 @@
+# zozo_fetch_scheduler.py
+"""
+ZOZO 商品頁並行抓取排程器
+以 K 個工作線程同時抓取多個 URL，並以 Token Bucket 限制每個主機的請求速率
+抓取完成的 HTML 依完成順序立即交給呼叫端解析
+"""
+
+import time
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# 預設值
+DEFAULT_FETCH_WORKERS = 3     # 同時抓取的工作數
+DEFAULT_HOST_RATE = 1.0       # 每個主機每秒允許的請求數
+DEFAULT_HOST_BURST = 2        # 每個主機允許的瞬間突發請求數
+
+
+class TokenBucket:
+    """Token Bucket 速率限制器 - 取代固定的 time.sleep 間隔"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, should_stop=None):
+        """取得一個 token，不足時阻塞等待；should_stop() 為真時放棄並回傳 False"""
+        if self.rate <= 0:
+            return True
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+
+                wait_time = (1 - self._tokens) / self.rate
+
+            if should_stop and should_stop():
+                return False
+            time.sleep(min(wait_time, 0.5))
+
+
+class HostRateLimiter:
+    """依主機名稱分別維護 Token Bucket"""
+
+    def __init__(self, rate=DEFAULT_HOST_RATE, burst=DEFAULT_HOST_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url, should_stop=None):
+        """等待 URL 所屬主機的下一個請求配額"""
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[host] = bucket
+        return bucket.acquire(should_stop)
+
+
+class ZozoFetchScheduler:
+    """ZOZO 並行抓取排程器"""
+
+    def __init__(self, fetch_func=None, max_workers=DEFAULT_FETCH_WORKERS,
+                 rate_per_host=DEFAULT_HOST_RATE, burst=DEFAULT_HOST_BURST, headless=True):
+        """
+        Args:
+            fetch_func: 抓取函數 fetch_func(url, headless=...) -> html（預設為經過 HTML 快取的分層抓取）
+            max_workers: 同時抓取的工作數 K
+            rate_per_host: 每個主機每秒請求數
+            burst: 每個主機允許的突發請求數
+            headless: 是否使用無頭瀏覽器
+        """
+        self.max_workers = max(1, int(max_workers))
+        self.headless = headless
+        self.rate_limiter = HostRateLimiter(rate_per_host, burst)
+
+        if fetch_func is None:
+            from zozo_selenium_fetcher import get_driver_pool
+            from zozo_html_cache import fetch_html_cached
+            # 瀏覽器連線池必須至少與工作數一樣大，否則升級到瀏覽器的工作線程會互相等待
+            get_driver_pool(headless=headless, max_size=self.max_workers)
+            fetch_func = fetch_html_cached
+        self.fetch_func = fetch_func
+
+    def _fetch_one(self, url, should_stop):
+        """單一工作：等待速率配額後抓取"""
+        if not self.rate_limiter.acquire(url, should_stop):
+            return url, "", "已停止"
+
+        try:
+            html = self.fetch_func(url, headless=self.headless)
+        except Exception as e:
+            return url, "", str(e)
+
+        if not html or len(html) < 1000:
+            return url, html or "", "無法獲取有效的HTML內容"
+        return url, html, None
+
+    def iter_fetch(self, urls, should_stop=None):
+        """
+        並行抓取所有 URL，依完成順序逐一產出結果
+
+        Args:
+            urls: URL 列表
+            should_stop: 無參數函數，回傳 True 時停止派發新工作
+
+        Yields:
+            tuple: (url, html, error)，成功時 error 為 None
+        """
+        should_stop = should_stop or (lambda: False)
+        pending_urls = list(urls)
+        pending_urls.reverse()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            running = set()
+
+            while pending_urls or running:
+                # 保持最多 K 個工作在執行，避免一次排入全部 URL 後無法停止
+                while pending_urls and len(running) < self.max_workers and not should_stop():
+                    running.add(executor.submit(self._fetch_one, pending_urls.pop(), should_stop))
+
+                if not running:
+                    break
+
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    def fetch_all(self, urls, on_result=None, should_stop=None):
+        """
+        並行抓取所有 URL，每完成一個就呼叫 on_result(url, html, error)
+
+        Returns:
+            dict: url -> (html, error)
+        """
+        results = {}
+        for url, html, error in self.iter_fetch(urls, should_stop):
+            results[url] = (html, error)
+            if on_result:
+                on_result(url, html, error)
+        return results
@@ -0,0 +1,268 @@
+# zozo_html_cache.py
+"""
+ZOZO 商品頁 HTML 磁碟快取
+以商品ID（goods ID）為鍵，HTML 依內容 SHA-256 存成 gzip 檔（內容相同只存一份），索引為 JSON
+有效時間內直接使用快取；過期後以 ETag / Last-Modified 條件式請求重新驗證，304 時沿用快取
+總容量超過上限時依最後使用時間淘汰（LRU）
+"""
+
+import os
+import gzip
+import json
+import time
+import atexit
+import hashlib
+import logging
+import threading
+from config import WORK_DIR
+from zozo_tiered_fetcher import get_tiered_fetcher, has_required_markers
+from zozo_urls import extract_goods_id
+
+# 快取設定
+HTML_CACHE_DIR = os.path.join(WORK_DIR, "zozo_html_cache")
+DEFAULT_HTML_CACHE_TTL = 300                   # 有效時間（秒），0 表示每次都重新驗證
+DEFAULT_HTML_CACHE_MAX_BYTES = 200 * 1024 * 1024  # 快取總容量上限（壓縮後）
+
+
+class ZozoHtmlCache:
+    """商品頁 HTML 快取（內容定址 + JSON 索引）"""
+
+    def __init__(self, cache_dir=HTML_CACHE_DIR, ttl=DEFAULT_HTML_CACHE_TTL,
+                 max_bytes=DEFAULT_HTML_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.index_file = os.path.join(cache_dir, "index.json")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._index = {}
+        self._dirty = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "revalidated": 0, "misses": 0}
+
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.load()
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.blob_dir, content_hash[:2], f"{content_hash}.html.gz")
+
+    def load(self):
+        """載入索引，移除檔案已不存在的項目"""
+        try:
+            if os.path.exists(self.index_file):
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                self._index = {
+                    goods_id: entry for goods_id, entry in index.items()
+                    if os.path.exists(self._blob_path(entry.get("hash", "")))
+                }
+        except Exception as e:
+            logging.warning(f"載入 HTML 快取索引失敗: {e}")
+            self._index = {}
+
+    def save(self):
+        """儲存索引（先寫暫存檔再取代）"""
+        with self._lock:
+            data = json.loads(json.dumps(self._index))
+            self._dirty = 0
+        tmp_path = f"{self.index_file}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_file)
+        except Exception as e:
+            logging.warning(f"儲存 HTML 快取索引失敗: {e}")
+
+    def _mark_dirty(self):
+        """索引變更累積到一定次數後儲存（需在鎖外呼叫）"""
+        with self._lock:
+            self._dirty += 1
+            should_save = self._dirty >= 10
+        if should_save:
+            self.save()
+
+    def lookup(self, url):
+        """
+        查詢快取
+
+        Returns:
+            dict: html, etag, last_modified, age（秒）, fresh（是否仍在有效時間內）；沒有快取時為 None
+        """
+        goods_id = extract_goods_id(url)
+        if goods_id is None:
+            return None
+
+        with self._lock:
+            entry = self._index.get(goods_id)
+            if entry is None:
+                return None
+            entry = dict(entry)
+
+        try:
+            with open(self._blob_path(entry["hash"]), 'rb') as f:
+                html = gzip.decompress(f.read()).decode('utf-8')
+        except Exception as e:
+            logging.warning(f"讀取 HTML 快取失敗 ({goods_id}): {e}")
+            with self._lock:
+                self._index.pop(goods_id, None)
+            return None
+
+        age = time.time() - entry["fetched_at"]
+        with self._lock:
+            if goods_id in self._index:
+                self._index[goods_id]["accessed_at"] = time.time()
+        return {
+            "html": html,
+            "etag": entry.get("etag"),
+            "last_modified": entry.get("last_modified"),
+            "age": age,
+            "fresh": self.ttl > 0 and age < self.ttl
+        }
+
+    def put(self, url, html, etag=None, last_modified=None):
+        """存入快取（沒有商品ID的 URL 不快取）"""
+        goods_id = extract_goods_id(url)
+        if goods_id is None or not html:
+            return
+
+        raw = html.encode('utf-8')
+        content_hash = hashlib.sha256(raw).hexdigest()
+        blob_path = self._blob_path(content_hash)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            tmp_path = f"{blob_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(gzip.compress(raw, compresslevel=5))
+            os.replace(tmp_path, blob_path)
+
+        now = time.time()
+        with self._lock:
+            self._index[goods_id] = {
+                "hash": content_hash,
+                "url": url,
+                "fetched_at": now,
+                "accessed_at": now,
+                "etag": etag,
+                "last_modified": last_modified,
+                "size": os.path.getsize(blob_path)
+            }
+            removed_hashes = self._evict_locked()
+        self._remove_blobs(removed_hashes)
+        self._mark_dirty()
+
+    def touch(self, url):
+        """重新驗證成功（304）後更新抓取時間"""
+        goods_id = extract_goods_id(url)
+        with self._lock:
+            entry = self._index.get(goods_id)
+            if entry is None:
+                return
+            entry["fetched_at"] = entry["accessed_at"] = time.time()
+        self._mark_dirty()
+
+    def _evict_locked(self):
+        """超過容量上限時淘汰最久未使用的項目，回傳不再被引用的內容 Hash"""
+        total = sum(entry.get("size", 0) for entry in self._index.values())
+        evicted = set()
+        if total > self.max_bytes:
+            for goods_id, entry in sorted(self._index.items(), key=lambda item: item[1].get("accessed_at", 0)):
+                if total <= self.max_bytes:
+                    break
+                total -= entry.get("size", 0)
+                evicted.add(entry["hash"])
+                del self._index[goods_id]
+        in_use = {entry["hash"] for entry in self._index.values()}
+        return evicted - in_use
+
+    def _remove_blobs(self, content_hashes):
+        for content_hash in content_hashes:
+            try:
+                os.remove(self._blob_path(content_hash))
+            except OSError:
+                pass
+
+    def clear(self):
+        """清除所有快取"""
+        with self._lock:
+            removed_hashes = {entry["hash"] for entry in self._index.values()}
+            self._index = {}
+        self._remove_blobs(removed_hashes)
+        self.save()
+
+    def count(self, kind):
+        """累計 hits / revalidated / misses"""
+        with self._lock:
+            self._counters[kind] += 1
+
+    def stats(self):
+        """快取統計"""
+        with self._lock:
+            return dict(
+                self._counters,
+                entries=len(self._index),
+                bytes=sum(entry.get("size", 0) for entry in self._index.values())
+            )
+
+
+_html_cache = None
+_html_cache_lock = threading.Lock()
+
+
+def get_html_cache():
+    """取得全局 HTML 快取"""
+    global _html_cache
+    with _html_cache_lock:
+        if _html_cache is None:
+            _html_cache = ZozoHtmlCache()
+        return _html_cache
+
+
+def fetch_html_cached(url, headless=True, cache=None, fetcher=None):
+    """
+    與 fetch_html_from_url_optimized 相同介面的快取抓取
+    有效時間內直接回傳快取；過期時以條件式請求重新驗證，變更時才重新下載
+
+    Args:
+        url: 商品URL
+        headless: 是否使用無頭瀏覽器
+        cache: ZozoHtmlCache（預設為全局快取）
+        fetcher: ZozoTieredFetcher（預設為全局分層抓取器）
+
+    Returns:
+        str: HTML
+    """
+    cache = cache or get_html_cache()
+    cached = cache.lookup(url)
+
+    if cached and cached["fresh"]:
+        cache.count("hits")
+        print(f"💾 使用快取頁面（{cached['age']:.0f}s 前抓取）: {url}")
+        return cached["html"]
+
+    fetcher = fetcher or get_tiered_fetcher()
+    result = fetcher.fetch_detailed(
+        url,
+        headless=headless,
+        etag=cached["etag"] if cached else None,
+        last_modified=cached["last_modified"] if cached else None
+    )
+
+    if result["source"] == "not_modified" and cached:
+        cache.count("revalidated")
+        cache.touch(url)
+        return cached["html"]
+
+    cache.count("misses")
+    html = result["html"]
+    # 只快取可以解析的完整頁面
+    if has_required_markers(html):
+        cache.put(url, html, result["etag"], result["last_modified"])
+    return html
+
+
+def save_html_cache_index():
+    """儲存快取索引（程式結束前呼叫）"""
+    if _html_cache is not None:
+        _html_cache.save()
+
+
+atexit.register(save_html_cache_index)
@@ -4,10 +4,18 @@
 """
 
 import re
-import hashlib
+import sys
+import time
 from collections import defaultdict
-from bs4 import BeautifulSoup
 import requests
+from zozo_sku_engine import INVENTORY_SKU_ENGINE, clean_sku
+from zozo_parse_cache import get_parse_cache, make_parse_key
+from zozo_parser_backends import (
+    resolve_backend, make_document, available_backends, supports_region_parse, BACKEND_HTML_PARSER
+)
+
+# 解析邏輯（選擇器、欄位、SKU 規則）變更時遞增，使舊的解析快取失效
+PARSER_VERSION = 1
 
 # ✅ 與庫存同步完全一致的顏色映射表
 COLOR_MAP = {
@@ -70,26 +78,43 @@ def sort_sizes(sizes):
 class ZozoHtmlParser:
     """統一的ZOZO HTML解析器 - 支援庫存同步和折扣同步"""
     
-    def __init__(self, url):
+    def __init__(self, url, backend=None):
         self.url = url
         self.html = None
         self.soup = None
+        self.soup_region_only = False  # soup 是否只包含商品資訊區塊
         self.data = {}
+        # 解析後端：lxml / html.parser / selectolax（未指定時讀取 ZOZO_PARSER_BACKEND）
+        self.backend = resolve_backend(backend)
         
     def get_soup(self, html):
-        """獲取BeautifulSoup對象"""
-        return BeautifulSoup(html, "html.parser")
+        """獲取解析後的文件對象（BeautifulSoup 或相同介面的 selectolax 包裝）"""
+        return make_document(html, self.backend)
+    
+    def get_region_soup(self, html):
+        """
+        只為商品資訊區塊建構文件對象（折扣同步用）
+        找不到商品資訊區塊時退回完整解析
+
+        Returns:
+            tuple: (文件對象, 是否只包含商品資訊區塊)
+        """
+        if supports_region_parse(self.backend):
+            soup = make_document(html, self.backend, region_only=True)
+            if soup.select_one(".p-goods-information__heading, dl.p-goods-information-action"):
+                return soup, True
+            print("⚠️ 找不到商品資訊區塊，改為完整解析")
+        return self.get_soup(html), False
         
     def fetch_html(self):
         """爬取HTML內容"""
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(self.url, headers=headers, timeout=30)
+            # 使用共用的 keep-alive Session，避免每次重新建立連線
+            from zozo_tiered_fetcher import get_zozo_http_session
+            response = get_zozo_http_session().get(self.url, timeout=30)
             response.raise_for_status()
             self.html = response.text
-            self.soup = self.get_soup(self.html)
+            self.soup = None  # 由 parse() 依模式建構
             return True
         except Exception as e:
             print(f"❌ 爬取HTML失敗: {e}")
@@ -154,9 +179,15 @@ class ZozoHtmlParser:
                 match = re.search(r"(\d{1,2})月(\d{1,2})日\s*(\d{1,2}:\d{2})", text)
                 if match:
                     month, day, time_str = match.groups()
-                    from datetime import datetime
+                    from datetime import datetime, timedelta
                     now = datetime.now()
                     year = now.year
+                    # 頁面只顯示月日：12 月抓到「1月5日」時為隔年的截止日
+                    try:
+                        if datetime(year, int(month), int(day)) < now - timedelta(days=60):
+                            year += 1
+                    except ValueError:
+                        pass
                     deadline_str = f"{year}-{int(month):02d}-{int(day):02d} {time_str}"
                     self.data["discount_deadline"] = deadline_str
                 else:
@@ -277,90 +308,28 @@ class ZozoHtmlParser:
             self.data["main_image"] = ""
     
     def generate_sku(self, name, color, size):
-        """✅ 與庫存同步完全一致的SKU生成邏輯"""
+        """✅ 與庫存同步完全一致的SKU生成邏輯（由共用 SKU 引擎生成並快取）"""
         try:
-            # 清理輸入
-            clean_product_name = re.sub(r'[^\w\s-]', '', name)
-            clean_color = re.sub(r'[^\w]', '', color)
-            clean_size = re.sub(r'[^\w]', '', size)
-            
-            # ✅ 關鍵修正：支援 goods-sale 格式的URL
-            product_id_match = re.search(r'/goods(?:-sale)?[/-](\d+)', self.url)
-            product_id = product_id_match.group(1) if product_id_match else "UNKNOWN"
-            
-            # ✅ 使用固定的商品ID + 顏色 + 尺寸生成唯一hash
-            unique_string = f"{product_id}-{clean_color}-{clean_size}"
-            hash_part = hashlib.md5(unique_string.encode("utf-8")).hexdigest()[:4].upper()
-            
-            # 生成精確的顏色代碼
-            color_code = self.enhanced_color_to_code(color)
-            
             # ✅ 最終SKU格式：ZO-[Hash]-[顏色代碼]-[尺寸]
-            sku = f"ZO-{hash_part}-{color_code}-{size}"
-            
-            print(f"🔍 SKU生成：商品ID:{product_id} + {color}+{size} -> hash:{hash_part} -> {sku}")
-            return self.clean_sku(sku)
+            return INVENTORY_SKU_ENGINE.generate(color, size, self.url)
             
         except Exception as e:
             print(f"❌ SKU生成失敗: {e}")
             return f"ZO-ERROR-{color[:3] if color else 'UNK'}-{size}"
     
     def enhanced_color_to_code(self, color):
-        """✅ 與庫存同步完全一致的顏色代碼生成"""
-        color_map = {
-            "ブラック": "BLK", "ブラック系": "BLK1", "ブラック系1": "BLK2",
-            "ホワイト": "WHT", "ホワイト系": "WHT1", "ホワイト系1": "WHT2",
-            "グレー": "GRY", "グレー系": "GRY1", "グレー系1": "GRY2",
-            "ネイビー": "NVY", "ネイビー系": "NVY1", "ネイビー系1": "NVY2",
-            "ブルー": "BLU", "ブルー系": "BLU1", "ブルー系1": "BLU2",
-            "ブラウン": "BRN", "ブラウン系": "BRN1", "ブラウン系1": "BRN2",
-            "ベージュ": "BEI", "ベージュ系": "BEI1", "ベージュ系1": "BEI2",
-            "レッド": "RED", "レッド系": "RED1", "レッド系1": "RED2",
-            "ピンク": "PNK", "ピンク系": "PNK1", "ピンク系1": "PNK2",
-            "グリーン": "GRN", "グリーン系": "GRN1", "グリーン系1": "GRN2",
-            "イエロー": "YEL", "イエロー系": "YEL1", "イエロー系1": "YEL2",
-            "パープル": "PUR", "パープル系": "PUR1", "パープル系1": "PUR2",
-            "オレンジ": "ORG", "オレンジ系": "ORG1", "オレンジ系1": "ORG2",
-            "カーキ": "KHA", "カーキ系": "KHA1", "カーキ系1": "KHA2",
-            "杢グレー":"GRY","スミクロ":"SBLK","ライトベージュ":"LTB","オートミール":"OT","アッシュブラウン":"ATB","グレイッシュベージュ":"GRYB","グレイッシュブルー":"GRYBU"
-        }
-        
-        # 優先完全匹配
-                # 優先完全匹配
-        if color in color_map:
-            return color_map[color]
-        
-        # ✅ 關鍵修改：如果沒有完全匹配，直接返回 UNK
-        print(f"⚠️ 未映射顏色 '{color}' -> 設為 UNK")
-        return "UNK"
-        
-        # 生成3位縮寫
-        if len(clean_color) >= 3:
-            code = clean_color[:3].upper()
-        else:
-            code = color[:3].upper()
-        
-        # 確保代碼唯一性
-        if '系' in color:
-            if '1' in color:
-                code += '2'
-            else:
-                code += '1'
-        
-        return code
+        """✅ 與庫存同步完全一致的顏色代碼生成（未映射顏色為 UNK）"""
+        return INVENTORY_SKU_ENGINE.color_code(color)
     
     def clean_sku(self, sku):
         """✅ 與庫存同步完全一致的SKU清理"""
-        if not sku:
-            return ""
-        # 移除所有空白字符（包括空格、制表符、換行等）
-        cleaned_sku = re.sub(r'\s+', '', str(sku))
-        return cleaned_sku
+        return clean_sku(sku)
     
-    def parse(self, mode="full"):
+    def parse(self, mode="full", use_cache=True):
         """
         執行解析流程
         mode: "full" (完整解析) 或 "discount_only" (只解析折扣相關)
+        use_cache: HTML 與先前解析過的頁面完全相同時直接回傳快取結果
         """
         try:
             # 如果沒有HTML內容，先爬取
@@ -368,9 +337,21 @@ class ZozoHtmlParser:
                 if not self.fetch_html():
                     return None
             
-            # 確保有soup對象
-            if not self.soup:
-                self.soup = self.get_soup(self.html)
+            # ✅ 相同 HTML 不重複解析
+            cache_key = None
+            if use_cache:
+                cache_key = make_parse_key(self.html, self.url, mode, PARSER_VERSION)
+                cached_data = get_parse_cache().get(cache_key)
+                if cached_data is not None:
+                    self.data = cached_data
+                    return self.data
+            
+            # 確保有soup對象（折扣模式只建構商品資訊區塊；完整模式不能沿用區塊 soup）
+            if not self.soup or (mode == "full" and self.soup_region_only):
+                if mode == "discount_only":
+                    self.soup, self.soup_region_only = self.get_region_soup(self.html)
+                else:
+                    self.soup, self.soup_region_only = self.get_soup(self.html), False
             
             # 基本解析
             self.parse_name_brand()
@@ -387,6 +368,9 @@ class ZozoHtmlParser:
             # ✅ 確保返回的data包含url
             self.data["url"] = self.url
             
+            if cache_key:
+                get_parse_cache().put(cache_key, self.data)
+            
             return self.data
             
         except Exception as e:
@@ -399,12 +383,75 @@ def parse_zozo_html(html, url, mode="full"):
     """便利函數 - 支援舊代碼調用"""
     parser = ZozoHtmlParser(url)
     parser.html = html
-    parser.soup = parser.get_soup(html)
     return parser.parse(mode)
 
 
+def compare_parser_backends(html, url="", repeat=5, backends=None, mode="full"):
+    """
+    以各解析後端解析同一頁面，比較每頁解析時間與結果是否與 html.parser 完整解析一致
+
+    Args:
+        html: 商品頁 HTML
+        url: 商品 URL
+        repeat: 每個後端重複解析次數
+        backends: 要比較的後端（預設為所有已安裝的後端）
+        mode: 解析模式（discount_only 會使用商品資訊區塊解析）
+
+    Returns:
+        dict: backend -> {"avg_ms", "min_ms", "identical", "diff_keys"}
+    """
+    def run(backend, full_tree=False):
+        parser = ZozoHtmlParser(url, backend=backend)
+        parser.html = html
+        start_time = time.perf_counter()
+        if full_tree:
+            parser.soup = parser.get_soup(html)
+        data = parser.parse(mode=mode, use_cache=False)
+        return data, time.perf_counter() - start_time
+
+    reference, _ = run(BACKEND_HTML_PARSER, full_tree=True)
+    reference = reference or {}
+    results = {}
+
+    for backend in backends or available_backends():
+        timings = []
+        data = None
+        for _ in range(max(1, repeat)):
+            data, elapsed = run(backend)
+            timings.append(elapsed)
+
+        data = data or {}
+        diff_keys = sorted(key for key in set(reference) | set(data) if reference.get(key) != data.get(key))
+        results[backend] = {
+            "avg_ms": round(sum(timings) / len(timings) * 1000, 2),
+            "min_ms": round(min(timings) * 1000, 2),
+            "identical": not diff_keys,
+            "diff_keys": diff_keys
+        }
+    return results
+
+
+def with_extra_class_tokens(html):
+    """在商品資訊區塊的 class 前加上額外的 class（驗證區塊解析不只匹配第一個 class）"""
+    return re.sub(r'class="((?:p-goods-information|price-value)[^"]*)"', r'class="extra \1"', html)
+
+
 # 使用範例
 if __name__ == "__main__":
+    # 解析後端基準測試：python zozo_html_parser.py --benchmark page.html [url]
+    if len(sys.argv) >= 3 and sys.argv[1] == "--benchmark":
+        with open(sys.argv[2], 'r', encoding='utf-8') as f:
+            page_html = f.read()
+        page_url = sys.argv[3] if len(sys.argv) > 3 else ""
+        print(f"HTML長度: {len(page_html):,}")
+        for label, bench_html in (("原始頁面", page_html), ("多 class 頁面", with_extra_class_tokens(page_html))):
+            for bench_mode in ("full", "discount_only"):
+                print(f"--- {label} {bench_mode} ---")
+                for name, stats in compare_parser_backends(bench_html, page_url, mode=bench_mode).items():
+                    status = "✅ 一致" if stats["identical"] else f"❌ 不一致: {', '.join(stats['diff_keys'])}"
+                    print(f"{name:12s} 平均 {stats['avg_ms']:8.2f} ms  最快 {stats['min_ms']:8.2f} ms  {status}")
+        sys.exit(0)
+    
     url = "https://zozo.jp/shop/mono-mart/goods-sale/73746072/?did=121049876"
     
     # 完整解析（庫存同步）
@@ -0,0 +1,238 @@
+# zozo_page_corpus.py
+"""
+ZOZO 商品頁離線語料庫（效能測試用）
+CorpusRecorder 在抓取時把 HTML（含 URL 與抓取時間）存入有版本的語料庫，
+ReplayFetcher 以與 fetch_html_from_url_optimized 相同的介面從語料庫回放，可模擬網路延遲，
+整個 sync_discount 流程即可不連線 zozo.jp 重複測試
+
+語料庫目錄結構：
+  zozo_page_corpus/<語料庫名稱>/manifest.json
+  zozo_page_corpus/<語料庫名稱>/pages/<商品ID>.html.gz
+
+使用方式：
+  python zozo_page_corpus.py record urls.txt [語料庫名稱]
+  python zozo_page_corpus.py list
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import hashlib
+import threading
+from datetime import datetime
+from config import WORK_DIR
+from zozo_tiered_fetcher import has_required_markers
+from zozo_urls import dedupe_key
+
+CORPUS_ROOT = os.path.join(WORK_DIR, "zozo_page_corpus")
+CORPUS_FORMAT_VERSION = 1
+
+
+def _page_key(url):
+    """語料庫中的頁面鍵：商品ID，無法辨識時為正規化 URL 的 Hash"""
+    key = dedupe_key(url)
+    return key if key.isdigit() else hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+class PageCorpus:
+    """單一版本的頁面語料庫"""
+
+    def __init__(self, path):
+        self.path = path
+        self.pages_dir = os.path.join(path, "pages")
+        self.manifest_file = os.path.join(path, "manifest.json")
+        self._lock = threading.Lock()
+        self.manifest = {
+            "format_version": CORPUS_FORMAT_VERSION,
+            "name": os.path.basename(path),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "pages": {}
+        }
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+            if self.manifest.get("format_version") != CORPUS_FORMAT_VERSION:
+                raise ValueError(f"不支援的語料庫格式版本: {self.manifest.get('format_version')}")
+
+    @classmethod
+    def create(cls, name=None, root=CORPUS_ROOT):
+        """建立新的語料庫（預設以建立時間命名）"""
+        name = name or datetime.now().strftime("%Y%m%d-%H%M%S")
+        corpus = cls(os.path.join(root, name))
+        os.makedirs(corpus.pages_dir, exist_ok=True)
+        corpus.save()
+        return corpus
+
+    @classmethod
+    def open(cls, name=None, root=CORPUS_ROOT):
+        """開啟語料庫（未指定名稱時為最新的一個）"""
+        if name is None:
+            names = list_corpora(root)
+            if not names:
+                raise FileNotFoundError(f"找不到任何語料庫: {root}")
+            name = names[-1]
+        path = os.path.join(root, name)
+        if not os.path.exists(os.path.join(path, "manifest.json")):
+            raise FileNotFoundError(f"找不到語料庫: {path}")
+        return cls(path)
+
+    def save(self):
+        """儲存 manifest（先寫暫存檔再取代）"""
+        with self._lock:
+            data = json.dumps(self.manifest, ensure_ascii=False, indent=2)
+        tmp_path = f"{self.manifest_file}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.manifest_file)
+
+    def add(self, url, html, recorded_at=None):
+        """加入一個頁面（同一商品以最後一次為準）"""
+        key = _page_key(url)
+        raw = html.encode("utf-8")
+        file_name = f"{key}.html.gz"
+        os.makedirs(self.pages_dir, exist_ok=True)
+        with open(os.path.join(self.pages_dir, file_name), "wb") as f:
+            f.write(gzip.compress(raw, compresslevel=6))
+        with self._lock:
+            self.manifest["pages"][key] = {
+                "url": url,
+                "file": file_name,
+                "sha256": hashlib.sha256(raw).hexdigest(),
+                "size": len(raw),
+                "recorded_at": recorded_at or datetime.now().isoformat(timespec="seconds")
+            }
+
+    def get(self, url):
+        """取得頁面 HTML，沒有時為 None"""
+        with self._lock:
+            entry = self.manifest["pages"].get(_page_key(url))
+        if entry is None:
+            return None
+        with open(os.path.join(self.pages_dir, entry["file"]), "rb") as f:
+            return gzip.decompress(f.read()).decode("utf-8")
+
+    def urls(self):
+        """語料庫中所有頁面的 URL（依加入順序）"""
+        with self._lock:
+            return [entry["url"] for entry in self.manifest["pages"].values()]
+
+    def __len__(self):
+        return len(self.manifest["pages"])
+
+
+def list_corpora(root=CORPUS_ROOT):
+    """所有語料庫名稱（依名稱排序，預設命名下即為建立順序）"""
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if os.path.exists(os.path.join(root, name, "manifest.json")))
+
+
+class CorpusRecorder:
+    """包裝抓取函數，把抓到的完整商品頁存入語料庫（介面與 fetch_html_from_url_optimized 相同）"""
+
+    def __init__(self, corpus, fetch_func=None):
+        """
+        Args:
+            corpus: PageCorpus
+            fetch_func: 實際抓取函數（預設為經過 HTML 快取的分層抓取）
+        """
+        if fetch_func is None:
+            from zozo_html_cache import fetch_html_cached
+            fetch_func = fetch_html_cached
+        self.corpus = corpus
+        self.fetch_func = fetch_func
+        self.recorded = 0
+        self.skipped = 0
+
+    def __call__(self, url, headless=True):
+        html = self.fetch_func(url, headless=headless)
+        # 只保存可以解析的完整頁面（驗證頁 / 錯誤頁不存入）
+        if has_required_markers(html):
+            self.corpus.add(url, html)
+            self.recorded += 1
+        else:
+            self.skipped += 1
+        return html
+
+
+class ReplayFetcher:
+    """從語料庫回放頁面（介面與 fetch_html_from_url_optimized 相同）"""
+
+    def __init__(self, corpus, latency=0.0, jitter=0.0, seed=None):
+        """
+        Args:
+            corpus: PageCorpus 或語料庫名稱（None 為最新的語料庫）
+            latency: 每次抓取的固定延遲（秒），模擬網路
+            jitter: 額外的隨機延遲上限（秒）
+            seed: 亂數種子
+        """
+        self.corpus = corpus if isinstance(corpus, PageCorpus) else PageCorpus.open(corpus)
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._pages = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, url, headless=True):
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+            key = _page_key(url)
+            html = self._pages.get(key)
+        if delay > 0:
+            time.sleep(delay)
+
+        if html is None:
+            html = self.corpus.get(url)
+            if html is not None:
+                with self._lock:
+                    self._pages[key] = html
+
+        with self._lock:
+            if html is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if html is None:
+            print(f"❌ 語料庫中沒有此頁面：{url}")
+            return ""
+        return html
+
+
+def record_urls(urls, name=None, fetch_func=None):
+    """
+    抓取 URL 列表並存成新的語料庫
+
+    Returns:
+        PageCorpus
+    """
+    from zozo_fetch_scheduler import ZozoFetchScheduler, DEFAULT_FETCH_WORKERS
+
+    if fetch_func is None:
+        # 與排程器預設行為相同：瀏覽器連線池至少與工作數一樣大
+        from zozo_selenium_fetcher import get_driver_pool
+        get_driver_pool(headless=True, max_size=DEFAULT_FETCH_WORKERS)
+    corpus = PageCorpus.create(name)
+    recorder = CorpusRecorder(corpus, fetch_func)
+    scheduler = ZozoFetchScheduler(fetch_func=recorder)
+    for url, html, error in scheduler.iter_fetch(urls):
+        print(f"{'❌' if error else '💾'} {url}{f' - {error}' if error else ''}")
+    corpus.save()
+    print(f"✅ 已保存 {recorder.recorded} 個頁面至 {corpus.path}（略過 {recorder.skipped} 個不完整頁面）")
+    return corpus
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "record":
+        with open(sys.argv[2], "r", encoding="utf-8") as f:
+            url_list = [line.strip() for line in f if line.strip()]
+        record_urls(url_list, sys.argv[3] if len(sys.argv) > 3 else None)
+    elif len(sys.argv) >= 2 and sys.argv[1] == "list":
+        for corpus_name in list_corpora():
+            print(f"{corpus_name}: {len(PageCorpus.open(corpus_name))} 個頁面")
+    else:
+        print("用法: python zozo_page_corpus.py record urls.txt [語料庫名稱] | list")
@@ -0,0 +1,149 @@
+# zozo_parse_cache.py
+"""
+ZOZO 解析結果快取
+以 (HTML 內容 Hash, 解析器版本, 模式, URL) 為鍵保存解析後的 dict，
+HTML 與上次完全相同時直接回傳結果，不再建構解析樹
+記憶體 LRU 為第一層，可選的 SQLite 為第二層（重新啟動後仍有效）
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from config import WORK_DIR
+
+PARSE_CACHE_DB = os.path.join(WORK_DIR, "zozo_parse_cache.db")
+DEFAULT_MEMORY_ENTRIES = 512      # 記憶體層最多保存筆數
+DEFAULT_SQLITE_MAX_AGE = 7 * 86400  # SQLite 層保存天數（秒）
+PRUNE_INTERVAL = 3600             # 長時間執行時清除過期資料的間隔（秒）
+
+
+def make_parse_key(html, url, mode, parser_version):
+    """解析快取鍵：解析器版本 + 模式 + URL + HTML 內容"""
+    digest = hashlib.sha1(f"{parser_version}|{mode}|{url}|".encode("utf-8"))
+    digest.update(html.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """解析結果快取（記憶體 LRU + 可選 SQLite）"""
+
+    def __init__(self, sqlite_path=PARSE_CACHE_DB, max_entries=DEFAULT_MEMORY_ENTRIES,
+                 max_age=DEFAULT_SQLITE_MAX_AGE):
+        """
+        Args:
+            sqlite_path: SQLite 檔案路徑，None 表示只使用記憶體
+            max_entries: 記憶體層筆數上限
+            max_age: SQLite 層資料保存秒數
+        """
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._last_prune = 0.0
+        self.hits = 0
+        self.misses = 0
+
+        if sqlite_path:
+            try:
+                self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS parse_cache ("
+                    "key TEXT PRIMARY KEY, data TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS idx_parse_cache_created ON parse_cache (created_at)")
+                self._prune_locked(time.time())
+            except sqlite3.Error as e:
+                logging.warning(f"解析快取資料庫無法使用，只使用記憶體快取: {e}")
+                self._db = None
+
+    def _prune_locked(self, now):
+        """刪除超過保存期限的 SQLite 資料"""
+        self._db.execute("DELETE FROM parse_cache WHERE created_at < ?", (now - self.max_age,))
+        self._db.commit()
+        self._last_prune = now
+
+    def get(self, key):
+        """取得解析結果（每次回傳新的 dict，呼叫端可自由修改）"""
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+            elif self._db is not None:
+                try:
+                    row = self._db.execute("SELECT data FROM parse_cache WHERE key = ?", (key,)).fetchone()
+                except sqlite3.Error as e:
+                    logging.warning(f"讀取解析快取失敗: {e}")
+                    row = None
+                if row:
+                    payload = row[0]
+                    self._remember_locked(key, payload)
+
+            if payload is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(payload)
+
+    def put(self, key, data):
+        """保存解析結果"""
+        payload = json.dumps(data, ensure_ascii=False)
+        with self._lock:
+            self._remember_locked(key, payload)
+            if self._db is not None:
+                now = time.time()
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO parse_cache (key, data, created_at) VALUES (?, ?, ?)",
+                        (key, payload, now)
+                    )
+                    self._db.commit()
+                    # GUI 長時間執行時定期清除過期資料，避免資料庫無限增長
+                    if now - self._last_prune >= PRUNE_INTERVAL:
+                        self._prune_locked(now)
+                except sqlite3.Error as e:
+                    logging.warning(f"寫入解析快取失敗: {e}")
+
+    def _remember_locked(self, key, payload):
+        self._memory[key] = payload
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        """清除所有解析快取"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM parse_cache")
+                self._db.commit()
+
+    def stats(self):
+        """快取統計"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self._memory)}
+
+
+_parse_cache = None
+_parse_cache_lock = threading.Lock()
+
+
+def get_parse_cache():
+    """取得全局解析快取"""
+    global _parse_cache
+    with _parse_cache_lock:
+        if _parse_cache is None:
+            _parse_cache = ParseCache()
+        return _parse_cache
+
+
+def set_parse_cache(cache):
+    """替換全局解析快取（效能測試使用只在記憶體中的快取，或 max_entries=0 停用快取）"""
+    global _parse_cache
+    with _parse_cache_lock:
+        _parse_cache = cache
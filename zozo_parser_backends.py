@@ -0,0 +1,128 @@
+# zozo_parser_backends.py
+"""
+ZOZO HTML 解析後端
+ZozoHtmlParser 只使用 select / select_one / get_text / get 這幾個介面，
+因此可以在 BeautifulSoup（lxml 或 html.parser）與 selectolax（lexbor）之間切換
+以環境變數 ZOZO_PARSER_BACKEND 或 ZozoHtmlParser(backend=...) 指定
+"""
+
+import os
+import logging
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401  BeautifulSoup 的 lxml 樹建構器需要 lxml
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+    SELECTOLAX_AVAILABLE = True
+except ImportError:
+    LexborHTMLParser = None
+    SELECTOLAX_AVAILABLE = False
+
+BACKEND_ENV_VAR = "ZOZO_PARSER_BACKEND"
+BACKEND_LXML = "lxml"
+BACKEND_HTML_PARSER = "html.parser"
+BACKEND_SELECTOLAX = "selectolax"
+PARSER_BACKENDS = (BACKEND_LXML, BACKEND_HTML_PARSER, BACKEND_SELECTOLAX)
+
+# ✅ 折扣同步只讀取商品資訊區塊（.p-goods-information* 與 .price-value 及其子節點）
+GOODS_INFORMATION_PREFIX = "p-goods-information"
+PRICE_VALUE_CLASS = "price-value"
+
+
+def is_goods_information_class(value):
+    """class 屬性中任一個 class 符合商品資訊區塊（解析時傳入的可能是整個屬性字串或已分割的列表）"""
+    if not value:
+        return False
+    tokens = value.split() if isinstance(value, str) else value
+    return any(token.startswith(GOODS_INFORMATION_PREFIX) or token == PRICE_VALUE_CLASS for token in tokens)
+
+
+def available_backends():
+    """目前環境可用的解析後端"""
+    backends = []
+    if LXML_AVAILABLE:
+        backends.append(BACKEND_LXML)
+    backends.append(BACKEND_HTML_PARSER)
+    if SELECTOLAX_AVAILABLE:
+        backends.append(BACKEND_SELECTOLAX)
+    return backends
+
+
+def resolve_backend(backend=None):
+    """
+    決定要使用的解析後端
+
+    Args:
+        backend: 指定的後端名稱；None 時讀取環境變數，仍未指定則優先使用 lxml
+
+    Returns:
+        str: 可用的後端名稱（指定的後端未安裝時退回預設值）
+    """
+    requested = (backend or os.environ.get(BACKEND_ENV_VAR) or "").strip().lower()
+    default = BACKEND_LXML if LXML_AVAILABLE else BACKEND_HTML_PARSER
+
+    if not requested:
+        return default
+    if requested not in PARSER_BACKENDS:
+        logging.warning(f"未知的解析後端 {requested}，改用 {default}")
+        return default
+    if requested not in available_backends():
+        logging.warning(f"解析後端 {requested} 未安裝，改用 {default}")
+        return default
+    return requested
+
+
+class LexborNode:
+    """把 selectolax 節點包裝成 ZozoHtmlParser 使用的 BeautifulSoup 介面"""
+
+    __slots__ = ("_node",)
+
+    def __init__(self, node):
+        self._node = node
+
+    def select_one(self, selector):
+        node = self._node.css_first(selector)
+        return LexborNode(node) if node is not None else None
+
+    def select(self, selector):
+        return [LexborNode(node) for node in self._node.css(selector)]
+
+    def get_text(self, strip=False):
+        return self._node.text(deep=True, separator="", strip=strip)
+
+    def get(self, name, default=None):
+        attributes = self._node.attributes
+        if name not in attributes:
+            return default
+        # 無值屬性在 selectolax 為 None，BeautifulSoup 為空字串
+        value = attributes[name]
+        return "" if value is None else value
+
+
+def supports_region_parse(backend):
+    """後端是否支援只建構商品資訊區塊（SoupStrainer 僅適用於 BeautifulSoup）"""
+    return backend != BACKEND_SELECTOLAX
+
+
+def make_document(html, backend, region_only=False):
+    """
+    以指定後端解析 HTML
+
+    Args:
+        html: HTML 字串
+        backend: resolve_backend() 回傳的後端名稱
+        region_only: 只為商品資訊區塊建構節點（後端不支援時仍完整解析）
+
+    Returns:
+        具有 select / select_one 介面的文件物件
+    """
+    if backend == BACKEND_SELECTOLAX:
+        return LexborNode(LexborHTMLParser(html))
+    if region_only:
+        return BeautifulSoup(html, backend, parse_only=SoupStrainer(class_=is_goods_information_class))
+    return BeautifulSoup(html, backend)
@@ -0,0 +1,203 @@
+# zozo_priority_scheduler.py
+"""
+折扣同步的優先佇列排程
+取代固定間隔逐一同步所有 URL：每個商品依下次到期時間放入 heap，
+同時到期時以折扣截止時間較近、近期價格變動較頻繁的商品優先
+折扣截止後立即重新檢查，價格穩定的商品逐步拉長檢查間隔（退避）
+"""
+
+import time
+import heapq
+import threading
+from datetime import datetime
+from zozo_urls import dedupe_key
+
+# 預設值
+DEFAULT_MIN_INTERVAL = 60           # 最短檢查間隔（秒）
+DEFAULT_BACKOFF_FACTOR = 1.5        # 價格未變動時間隔放大倍數
+DEFAULT_MAX_INTERVAL_FACTOR = 8     # 最長間隔 = 基本間隔 × 此倍數
+DEFAULT_DEADLINE_GRACE = 120        # 折扣截止後多久重新檢查（秒）
+DEFAULT_MAX_PER_TICK = 100          # 每次最多處理的商品數（抓取預算）
+VOLATILITY_ALPHA = 0.3              # 價格變動率的指數移動平均係數
+DEADLINE_FORMAT = "%Y-%m-%d %H:%M"  # ZozoHtmlParser.parse_price 的 discount_deadline 格式
+DEADLINE_ROLLOVER_DAYS = 60         # 截止日比抓取時間早超過此天數時視為隔年（頁面只顯示月日）
+
+
+def parse_deadline(deadline, reference=None):
+    """
+    discount_deadline 字串 -> epoch 秒，空值或格式錯誤時為 None
+
+    Args:
+        deadline: discount_deadline 字串
+        reference: 抓取頁面的時間（epoch 秒）；截止日比它早超過 DEADLINE_ROLLOVER_DAYS 天時
+                   視為跨年的截止日（例如 12 月抓到「1月5日」）而加一年
+    """
+    if not deadline:
+        return None
+    try:
+        parsed = datetime.strptime(deadline, DEADLINE_FORMAT)
+    except (TypeError, ValueError):
+        return None
+    if reference is not None and parsed.timestamp() < reference - DEADLINE_ROLLOVER_DAYS * 86400:
+        try:
+            parsed = parsed.replace(year=parsed.year + 1)
+        except ValueError:  # 2 月 29 日
+            return None
+    return parsed.timestamp()
+
+
+class _ProductSchedule:
+    """單一商品的排程狀態"""
+
+    __slots__ = ("key", "url", "urls", "interval", "due", "deadline", "volatility", "version")
+
+    def __init__(self, key, url, interval, due):
+        self.key = key
+        self.url = url
+        self.urls = [url]
+        self.interval = interval
+        self.due = due
+        self.deadline = None
+        self.volatility = 0.0
+        self.version = 0
+
+
+class SyncPriorityScheduler:
+    """依截止時間與價格變動率排序的同步排程"""
+
+    def __init__(self, base_interval, min_interval=DEFAULT_MIN_INTERVAL, backoff_factor=DEFAULT_BACKOFF_FACTOR,
+                 max_interval=None, deadline_grace=DEFAULT_DEADLINE_GRACE, max_per_tick=DEFAULT_MAX_PER_TICK):
+        """
+        Args:
+            base_interval: 基本檢查間隔（秒），價格有變動的商品以此間隔檢查
+            min_interval: 最短間隔（失敗重試與變動頻繁的商品）
+            backoff_factor: 價格未變動時間隔放大倍數
+            max_interval: 最長間隔（預設為基本間隔的 8 倍）
+            deadline_grace: 折扣截止後多久重新檢查
+            max_per_tick: 每次最多取出的商品數，0 表示不限制
+        """
+        self.base_interval = max(base_interval, min_interval)
+        self.min_interval = min_interval
+        self.backoff_factor = backoff_factor
+        self.max_interval = max_interval or self.base_interval * DEFAULT_MAX_INTERVAL_FACTOR
+        self.deadline_grace = deadline_grace
+        self.max_per_tick = max_per_tick
+        self._products = {}
+        self._heap = []
+        self._lock = threading.Lock()
+
+    def _push_locked(self, product):
+        """放入 heap（舊的項目以 version 判斷失效）"""
+        product.version += 1
+        deadline = product.deadline if product.deadline is not None else float("inf")
+        heapq.heappush(self._heap, (product.due, deadline, -product.volatility, product.version, product.key))
+
+    def set_urls(self, urls, now=None, initial_delay=0):
+        """
+        更新追蹤的 URL：新商品在 initial_delay 秒後到期，已移除的商品不再排程
+        同一商品的多個 URL 合併為一項
+
+        Args:
+            urls: 目前追蹤的 URL 列表
+            now: 目前時間（epoch 秒）
+            initial_delay: 新商品第一次檢查的延遲
+        """
+        now = time.time() if now is None else now
+        groups = {}
+        for url in urls:
+            groups.setdefault(dedupe_key(url), []).append(url)
+
+        with self._lock:
+            for key in list(self._products):
+                if key not in groups:
+                    del self._products[key]
+            for key, group in groups.items():
+                product = self._products.get(key)
+                if product is None:
+                    product = _ProductSchedule(key, group[0], self.base_interval, now + initial_delay)
+                    self._products[key] = product
+                    self._push_locked(product)
+                product.url = group[0]
+                product.urls = group
+
+    def pop_due(self, now=None):
+        """
+        取出所有已到期的商品（最多 max_per_tick 個），依到期時間、截止時間、變動率排序
+
+        Returns:
+            list: [(代表 URL, 同一商品的所有 URL), ...]
+        """
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                if self.max_per_tick and len(due) >= self.max_per_tick:
+                    break
+                _, _, _, version, key = heapq.heappop(self._heap)
+                product = self._products.get(key)
+                if product is None or product.version != version:
+                    continue
+                product.version += 1  # 處理中，等 record / requeue 後重新排入
+                due.append((product.url, list(product.urls)))
+        return due
+
+    def record(self, url, result, now=None):
+        """
+        依同步結果計算下次檢查時間
+
+        - 失敗：最短間隔後重試
+        - 價格有變動：變動率上升，間隔回到基本間隔（變動越頻繁越短）
+        - 價格未變動：變動率下降，間隔依退避倍數拉長
+        - 有折扣截止時間：截止後 deadline_grace 秒必定重新檢查
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            product = self._products.get(dedupe_key(url))
+            if product is None:
+                return
+
+            if not result.get('success'):
+                product.interval = self.min_interval
+            elif result.get('outcome') == 'unchanged':
+                product.volatility *= 1 - VOLATILITY_ALPHA
+                product.interval = min(max(product.interval, self.base_interval) * self.backoff_factor,
+                                       self.max_interval)
+            else:
+                product.volatility = product.volatility * (1 - VOLATILITY_ALPHA) + VOLATILITY_ALPHA
+                product.interval = max(self.base_interval * (1 - product.volatility / 2), self.min_interval)
+
+            if result.get('success'):
+                product.deadline = parse_deadline(result.get('discount_deadline'))
+
+            product.due = now + product.interval
+            if product.deadline is not None and product.deadline > now:
+                product.due = min(product.due, product.deadline + self.deadline_grace)
+            self._push_locked(product)
+
+    def requeue(self, url, now=None):
+        """
+        pop_due 取出後未 record 的商品（處理中發生錯誤或中止）在最短間隔後重新排入，
+        否則該商品不會再被排程
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            product = self._products.get(dedupe_key(url))
+            if product is None:
+                return
+            product.due = now + self.min_interval
+            self._push_locked(product)
+
+    def next_due_time(self):
+        """最近的到期時間，沒有排程時為 None"""
+        with self._lock:
+            while self._heap:
+                _, _, _, version, key = self._heap[0]
+                product = self._products.get(key)
+                if product is not None and product.version == version:
+                    return self._heap[0][0]
+                heapq.heappop(self._heap)
+        return None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._products)
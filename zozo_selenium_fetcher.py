@@ -5,6 +5,10 @@
 """
 
 import time
+import queue
+import atexit
+import threading
+from contextlib import contextmanager
 from selenium import webdriver
 from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.common.by import By
@@ -68,69 +72,78 @@ class ZozoSeleniumFetcherOptimized:
         driver.implicitly_wait(2)         # 縮短隱式等待
         return driver
     
-    def fetch_stock_html_only(self, url):
+    def fetch_stock_html_only(self, url, driver=None):
         """
         只抓取庫存相關的 HTML - 極速版本
         預期時間：15-25 秒（相較原來的 2 分鐘）
+
+        Args:
+            url: 商品URL
+            driver: 已啟動的 WebDriver（可選，由連線池借出時不會在此關閉）
         """
         print(f"🚀 快速載入：{url}")
+        owns_driver = driver is None
         
         try:
-            self.driver = self._setup_driver()
-            start_time = time.time()
-            
-            # 載入頁面
-            self.driver.get(url)
-            print(f"✅ 頁面載入完成 ({time.time() - start_time:.1f}s)")
-            
-            # 只等待庫存關鍵區域載入 - 大幅縮短等待時間
-            try:
-                WebDriverWait(self.driver, 8).until(
-                    EC.presence_of_element_located((
-                        By.CSS_SELECTOR,
-                        ".p-goods-information-action, .p-goods-add-cart, .stock-info"
-                    ))
-                )
-                print("✅ 庫存區域已載入")
-            except TimeoutException:
-                print("⚠️ 庫存區域載入超時，但繼續執行")
-            
-            # 快速處理 Cookie 彈窗（如有）
-            self._quick_handle_popups()
-            
-            # 輕量級滾動 - 只滾動一次到庫存區域
-            self.driver.execute_script("""
-                // 快速滾動到商品資訊區域
-                var stockSection = document.querySelector('.p-goods-information-action');
-                if (stockSection) {
-                    stockSection.scrollIntoView({behavior: 'instant'});
-                }
-            """)
-            time.sleep(1)  # 短暫等待
-            
-            # 獲取 HTML
-            html_content = self.driver.page_source
-            total_time = time.time() - start_time
-            print(f"✅ 抓取完成 ({total_time:.1f}s) - HTML長度: {len(html_content):,}")
-            
-            # 在 return html_content 之前添加
-            print(f"🔍 實際HTML前500字符：")
-            print(html_content[:500])
-            print(f"🔍 HTML是否包含關鍵字：")
-            print(f"  - 'ZOZOTOWN': {'ZOZOTOWN' in html_content}")
-            print(f"  - '商品詳細': {'商品詳細' in html_content}")
-            print(f"  - 'カートに入れる': {'カートに入れる' in html_content}")
-            if 'cloudflare' in html_content.lower() or 'checking your browser' in html_content.lower():
-                print("❌ 被Cloudflare反爬蟲攔截！")
-            return html_content
+            self.driver = driver or self._setup_driver()
+            return self._load_stock_page(url)
             
         except Exception as e:
             print(f"❌ 抓取錯誤：{e}")
             return ""
         finally:
-            if self.driver:
+            if owns_driver and self.driver:
                 self.driver.quit()
     
+    def _load_stock_page(self, url):
+        """使用 self.driver 載入商品頁並回傳 HTML（錯誤會直接拋出，由呼叫端決定是否回收瀏覽器）"""
+        start_time = time.time()
+        
+        # 載入頁面
+        self.driver.get(url)
+        print(f"✅ 頁面載入完成 ({time.time() - start_time:.1f}s)")
+        
+        # 只等待庫存關鍵區域載入 - 大幅縮短等待時間
+        try:
+            WebDriverWait(self.driver, 8).until(
+                EC.presence_of_element_located((
+                    By.CSS_SELECTOR,
+                    ".p-goods-information-action, .p-goods-add-cart, .stock-info"
+                ))
+            )
+            print("✅ 庫存區域已載入")
+        except TimeoutException:
+            print("⚠️ 庫存區域載入超時，但繼續執行")
+        
+        # 快速處理 Cookie 彈窗（如有）
+        self._quick_handle_popups()
+        
+        # 輕量級滾動 - 只滾動一次到庫存區域
+        self.driver.execute_script("""
+            // 快速滾動到商品資訊區域
+            var stockSection = document.querySelector('.p-goods-information-action');
+            if (stockSection) {
+                stockSection.scrollIntoView({behavior: 'instant'});
+            }
+        """)
+        time.sleep(1)  # 短暫等待
+        
+        # 獲取 HTML
+        html_content = self.driver.page_source
+        total_time = time.time() - start_time
+        print(f"✅ 抓取完成 ({total_time:.1f}s) - HTML長度: {len(html_content):,}")
+        
+        # 在 return html_content 之前添加
+        print(f"🔍 實際HTML前500字符：")
+        print(html_content[:500])
+        print(f"🔍 HTML是否包含關鍵字：")
+        print(f"  - 'ZOZOTOWN': {'ZOZOTOWN' in html_content}")
+        print(f"  - '商品詳細': {'商品詳細' in html_content}")
+        print(f"  - 'カートに入れる': {'カートに入れる' in html_content}")
+        if 'cloudflare' in html_content.lower() or 'checking your browser' in html_content.lower():
+            print("❌ 被Cloudflare反爬蟲攔截！")
+        return html_content
+    
     def _quick_handle_popups(self):
         """快速處理彈窗"""
         popup_selectors = [
@@ -151,11 +164,178 @@ class ZozoSeleniumFetcherOptimized:
                 continue
 
 
+# 連線池預設值
+DEFAULT_POOL_SIZE = 2               # 同時保持的瀏覽器數量上限
+DEFAULT_MAX_PAGES_PER_DRIVER = 50   # 每個瀏覽器最多載入的頁數，超過後回收重建
+DEFAULT_ACQUIRE_TIMEOUT = 180       # 等待可用瀏覽器的秒數
+
+
+class ZozoWebDriverPool:
+    """
+    Firefox WebDriver 連線池
+    重複使用已啟動的瀏覽器，避免每個商品都付出數秒的啟動成本
+    """
+    
+    def __init__(self, headless=True, max_size=DEFAULT_POOL_SIZE,
+                 max_pages_per_driver=DEFAULT_MAX_PAGES_PER_DRIVER,
+                 acquire_timeout=DEFAULT_ACQUIRE_TIMEOUT):
+        self.headless = headless
+        self.max_size = max(1, int(max_size))
+        self.max_pages_per_driver = max_pages_per_driver
+        self.acquire_timeout = acquire_timeout
+        
+        self._factory = ZozoSeleniumFetcherOptimized(headless=headless)
+        self._idle = queue.LifoQueue()  # 最近歸還的瀏覽器優先借出（較可能仍是熱的）
+        self._pages_served = {}         # id(driver) -> 已載入頁數
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+    
+    def ensure_capacity(self, max_size):
+        """擴充連線池上限（並行抓取時工作數不可大於池大小）"""
+        with self._lock:
+            self.max_size = max(self.max_size, int(max_size))
+    
+    def acquire(self):
+        """借出一個健康的瀏覽器，必要時建立新的"""
+        deadline = time.time() + self.acquire_timeout
+        
+        while True:
+            if self._closed:
+                raise RuntimeError("WebDriver 連線池已關閉")
+            
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = None
+            
+            if driver is None:
+                with self._lock:
+                    can_create = self._created < self.max_size
+                    if can_create:
+                        self._created += 1
+                
+                if can_create:
+                    try:
+                        driver = self._factory._setup_driver()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                    self._pages_served[id(driver)] = 0
+                    print(f"🦊 連線池建立新瀏覽器 ({self._created}/{self.max_size})")
+                    return driver
+                
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutException("等待可用瀏覽器逾時")
+                try:
+                    driver = self._idle.get(timeout=min(remaining, 1.0))
+                except queue.Empty:
+                    continue
+            
+            if self._is_healthy(driver):
+                return driver
+            
+            print("⚠️ 連線池中的瀏覽器已失效，重新建立")
+            self._discard(driver)
+    
+    def release(self, driver, broken=False):
+        """歸還瀏覽器；發生錯誤或已達頁數上限時直接回收"""
+        pages = self._pages_served.get(id(driver), 0) + 1
+        self._pages_served[id(driver)] = pages
+        
+        if broken or self._closed or pages >= self.max_pages_per_driver:
+            if not broken and not self._closed:
+                print(f"♻️ 瀏覽器已載入 {pages} 頁，回收重建")
+            self._discard(driver)
+        else:
+            self._idle.put(driver)
+    
+    @contextmanager
+    def driver(self):
+        """以 with 區塊借用瀏覽器，例外時自動回收"""
+        driver = self.acquire()
+        broken = False
+        try:
+            yield driver
+        except Exception:
+            broken = True
+            raise
+        finally:
+            self.release(driver, broken=broken)
+    
+    def shutdown(self):
+        """關閉所有閒置瀏覽器；借出中的瀏覽器會在歸還時關閉"""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+    
+    def _is_healthy(self, driver):
+        """簡單健康檢查 - 瀏覽器程序仍可回應指令"""
+        try:
+            driver.execute_script("return document.readyState")
+            return True
+        except Exception:
+            return False
+    
+    def _discard(self, driver):
+        """關閉並移除瀏覽器"""
+        self._pages_served.pop(id(driver), None)
+        with self._lock:
+            self._created = max(0, self._created - 1)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+
+# 全局連線池（依 headless 區分）
+_driver_pools = {}
+_driver_pools_lock = threading.Lock()
+
+
+def get_driver_pool(headless=True, max_size=None):
+    """取得（必要時建立）全局 WebDriver 連線池"""
+    with _driver_pools_lock:
+        pool = _driver_pools.get(headless)
+        if pool is None or pool._closed:
+            pool = ZozoWebDriverPool(headless=headless, max_size=max_size or DEFAULT_POOL_SIZE)
+            _driver_pools[headless] = pool
+        elif max_size:
+            pool.ensure_capacity(max_size)
+        return pool
+
+
+def shutdown_driver_pools():
+    """關閉所有連線池中的瀏覽器，釋放資源"""
+    with _driver_pools_lock:
+        pools = list(_driver_pools.values())
+        _driver_pools.clear()
+    for pool in pools:
+        pool.shutdown()
+
+
+atexit.register(shutdown_driver_pools)
+
+
 # 便利函數 - 與原有代碼兼容
 def fetch_html_from_url_optimized(url, headless=True):
-    """優化版的快速抓取函數"""
+    """優化版的快速抓取函數 - 從連線池借用已啟動的瀏覽器"""
     fetcher = ZozoSeleniumFetcherOptimized(headless=headless)
-    return fetcher.fetch_stock_html_only(url)
+    print(f"🚀 快速載入：{url}")
+    
+    try:
+        with get_driver_pool(headless=headless).driver() as driver:
+            fetcher.driver = driver
+            return fetcher._load_stock_page(url)
+    except Exception as e:
+        print(f"❌ 抓取錯誤：{e}")
+        return ""
 
 
 # 向後兼容 - 替換原有函數
@@ -169,3 +349,4 @@ if __name__ == "__main__":
     test_url = "https://zozo.jp/shop/beams/goods/74917621/"
     html = fetch_html_from_url_optimized(test_url)
     print(f"測試結果：{'成功' if html else '失敗'}")
+    shutdown_driver_pools()
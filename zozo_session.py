@@ -7,7 +7,6 @@ ZOZO Town 會員登入與商品資訊抓取模組
 import logging
 import time
 import re
-import hashlib
 from selenium import webdriver
 from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.firefox.service import Service
@@ -15,6 +14,7 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from bs4 import BeautifulSoup
+from zozo_sku_engine import SkuEngine, LISTING_PRODUCT_ID_PATTERNS, FALLBACK_ABBREVIATION, clean_sku
 import sys
 import os
 
@@ -77,79 +77,20 @@ COLOR_MAP = {
     "スモーキーピンク": "SPK", "スモーキーブルー": "SBL", "スモーキーグリーン": "SGN"
 }
 
+# ✅ 批量上架規則的 SKU 引擎（未映射顏色取縮寫）
+LISTING_SKU_ENGINE = SkuEngine(COLOR_MAP, LISTING_PRODUCT_ID_PATTERNS, fallback=FALLBACK_ABBREVIATION, min_url_length=10)
+
 # 全局瀏覽器實例
 _driver = None
 
 # ✅ 統一使用批量上架的增強版SKU生成邏輯
 def generate_enhanced_sku(product_name, color, size, url):
     """✅ 與批量上架系統完全一致的SKU生成邏輯"""
-    import re
-    
-    # 🔍 商品ID提取（與批量上架一致）
-    if not url:
-        product_id = "UNKNOWN"
-    elif len(url) < 10:
-        product_id = "UNKNOWN"
-    else:
-        # 使用相同的正則表達式模式
-        patterns = [
-            r'/goods(?:-sale)?[/-](\d+)',
-            r'/goods[/-](?:sale/)?(\d+)',
-            r'/goods-sale/(\d+)',
-            r'/(\d+)/',
-            r'goods.*?(\d+)',
-            r'(\d{8})',  # 直接匹配8位數字
-        ]
-        
-        product_id = "UNKNOWN"
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                product_id = match.group(1)
-                break
-    
-    # 生成SKU
-    clean_color = re.sub(r'[^\w]', '', color)
-    clean_size = re.sub(r'[^\w]', '', size)
-    unique_string = f"{product_id}-{clean_color}-{clean_size}"
-    hash_part = hashlib.md5(unique_string.encode("utf-8")).hexdigest()[:4].upper()
-    color_code = enhanced_color_to_code(color)
-    sku = f"ZO-{hash_part}-{color_code}-{size}"
-    
-    return clean_sku(sku)
+    return LISTING_SKU_ENGINE.generate(color, size, url)
 
 def enhanced_color_to_code(color):
     """✅ 與批量上架系統完全一致的顏色代碼生成"""
-    # 優先完全匹配
-    if color in COLOR_MAP:
-        return COLOR_MAP[color]
-    
-    # 如果沒有完全匹配，使用完整顏色名稱的縮寫
-    # 移除常見後綴
-    clean_color = re.sub(r'[系\d]', '', color)
-    
-    # 生成3位縮寫
-    if len(clean_color) >= 3:
-        code = clean_color[:3].upper()
-    else:
-        code = color[:3].upper()
-    
-    # 確保代碼唯一性
-    if '系' in color:
-        if '1' in color:
-            code += '2'
-        else:
-            code += '1'
-    
-    return code
-
-def clean_sku(sku):
-    """✅ 與批量上架系統完全一致的SKU清理"""
-    if not sku:
-        return ""
-    # 移除所有空白字符（包括空格、制表符、換行等）
-    cleaned_sku = re.sub(r'\s+', '', str(sku))
-    return cleaned_sku
+    return LISTING_SKU_ENGINE.color_code(color)
 
 # ⚠️ 保留舊函數名稱以確保向後兼容
 def color_to_code(color):
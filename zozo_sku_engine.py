@@ -0,0 +1,253 @@
+# zozo_sku_engine.py
+"""
+統一的 ZOZO SKU 生成引擎
+SKU 格式：ZO-[Hash]-[顏色代碼]-[尺寸]，Hash 為 md5("商品ID-顏色-尺寸") 前 4 碼
+正則預先編譯，結果以 (商品ID, 顏色, 尺寸) 為鍵快取，熱路徑不輸出任何訊息
+庫存 / 折扣同步與批量上架的差異（顏色表、商品ID規則、未映射顏色的處理）以參數區分
+"""
+
+import re
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from zozo_urls import GOODS_ID_PATTERN
+
+# 預先編譯的正則
+NON_WORD_PATTERN = re.compile(r'[^\w]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+SERIES_SUFFIX_PATTERN = re.compile(r'[系\d]')
+
+# ✅ 庫存 / 折扣同步使用的商品ID規則（支援 goods-sale 格式）
+INVENTORY_PRODUCT_ID_PATTERNS = (
+    GOODS_ID_PATTERN,
+)
+
+# ✅ 批量上架使用的商品ID規則（依序嘗試）
+LISTING_PRODUCT_ID_PATTERNS = (
+    re.compile(r'/goods(?:-sale)?[/-](\d+)'),
+    re.compile(r'/goods[/-](?:sale/)?(\d+)'),
+    re.compile(r'/goods-sale/(\d+)'),
+    re.compile(r'/(\d+)/'),
+    re.compile(r'goods.*?(\d+)'),
+    re.compile(r'(\d{8})'),  # 直接匹配8位數字
+)
+
+# ✅ 與庫存同步完全一致的顏色映射表
+INVENTORY_COLOR_MAP = {
+    "ブラック": "BLK", "ブラック系": "BLK1", "ブラック系1": "BLK2",
+    "ホワイト": "WHT", "ホワイト系": "WHT1", "ホワイト系1": "WHT2",
+    "グレー": "GRY", "グレー系": "GRY1", "グレー系1": "GRY2",
+    "ネイビー": "NVY", "ネイビー系": "NVY1", "ネイビー系1": "NVY2",
+    "ブルー": "BLU", "ブルー系": "BLU1", "ブルー系1": "BLU2",
+    "ブラウン": "BRN", "ブラウン系": "BRN1", "ブラウン系1": "BRN2",
+    "ベージュ": "BEI", "ベージュ系": "BEI1", "ベージュ系1": "BEI2",
+    "レッド": "RED", "レッド系": "RED1", "レッド系1": "RED2",
+    "ピンク": "PNK", "ピンク系": "PNK1", "ピンク系1": "PNK2",
+    "グリーン": "GRN", "グリーン系": "GRN1", "グリーン系1": "GRN2",
+    "イエロー": "YEL", "イエロー系": "YEL1", "イエロー系1": "YEL2",
+    "パープル": "PUR", "パープル系": "PUR1", "パープル系1": "PUR2",
+    "オレンジ": "ORG", "オレンジ系": "ORG1", "オレンジ系1": "ORG2",
+    "カーキ": "KHA", "カーキ系": "KHA1", "カーキ系1": "KHA2",
+    "杢グレー":"GRY","スミクロ":"SBLK","ライトベージュ":"LTB","オートミール":"OT","アッシュブラウン":"ATB","グレイッシュベージュ":"GRYB","グレイッシュブルー":"GRYBU"
+}
+
+# 未映射顏色的處理方式
+FALLBACK_UNK = "unk"                    # 庫存同步：一律為 UNK
+FALLBACK_ABBREVIATION = "abbreviation"  # 批量上架：取顏色名稱前 3 字
+
+DEFAULT_CACHE_SIZE = 8192
+
+
+def clean_sku(sku):
+    """移除 SKU 中所有空白字符（包括空格、制表符、換行等）"""
+    if not sku:
+        return ""
+    return WHITESPACE_PATTERN.sub('', str(sku))
+
+
+class SkuEngine:
+    """ZOZO SKU 生成引擎"""
+
+    def __init__(self, color_map, product_id_patterns, fallback=FALLBACK_UNK,
+                 min_url_length=0, cache_size=DEFAULT_CACHE_SIZE):
+        """
+        Args:
+            color_map: 日文顏色 -> 顏色代碼
+            product_id_patterns: 依序嘗試的商品ID正則（已編譯）
+            fallback: 未映射顏色的處理方式（FALLBACK_UNK / FALLBACK_ABBREVIATION）
+            min_url_length: URL 短於此長度（或為空）時商品ID視為 UNKNOWN，0 表示不檢查
+            cache_size: LRU 快取大小
+        """
+        self.color_map = dict(color_map)
+        self.product_id_patterns = tuple(product_id_patterns)
+        self.fallback = fallback
+        self.min_url_length = min_url_length
+        self._warned_colors = set()
+        self._warned_lock = threading.Lock()
+        self._generate_cached = lru_cache(maxsize=cache_size)(self._generate)
+        self._product_id_cached = lru_cache(maxsize=cache_size)(self._extract_product_id)
+
+    def _extract_product_id(self, url):
+        if self.min_url_length and (not url or len(url) < self.min_url_length):
+            return "UNKNOWN"
+        for pattern in self.product_id_patterns:
+            match = pattern.search(url)
+            if match:
+                return match.group(1)
+        return "UNKNOWN"
+
+    def extract_product_id(self, url):
+        """從 URL 取得商品ID，找不到時為 UNKNOWN"""
+        return self._product_id_cached(url)
+
+    def color_code(self, color):
+        """日文顏色 -> 顏色代碼"""
+        code = self.color_map.get(color)
+        if code is not None:
+            return code
+
+        if self.fallback == FALLBACK_UNK:
+            self._warn_unmapped(color)
+            return "UNK"
+
+        # 移除常見後綴後取 3 位縮寫
+        stripped_color = SERIES_SUFFIX_PATTERN.sub('', color)
+        code = stripped_color[:3].upper() if len(stripped_color) >= 3 else color[:3].upper()
+
+        # 確保代碼唯一性
+        if '系' in color:
+            code += '2' if '1' in color else '1'
+        return code
+
+    def _warn_unmapped(self, color):
+        """每個未映射顏色只警告一次"""
+        with self._warned_lock:
+            if color in self._warned_colors:
+                return
+            self._warned_colors.add(color)
+        logging.warning(f"⚠️ 未映射顏色 '{color}' -> 設為 UNK")
+
+    def _generate(self, product_id, color, size):
+        clean_color = NON_WORD_PATTERN.sub('', color)
+        clean_size = NON_WORD_PATTERN.sub('', size)
+        unique_string = f"{product_id}-{clean_color}-{clean_size}"
+        hash_part = hashlib.md5(unique_string.encode("utf-8")).hexdigest()[:4].upper()
+        return clean_sku(f"ZO-{hash_part}-{self.color_code(color)}-{size}")
+
+    def generate(self, color, size, url=None, product_id=None):
+        """
+        生成單一 SKU
+
+        Args:
+            color: 日文顏色
+            size: 尺寸
+            url: 商品URL（未提供 product_id 時由 URL 取得）
+            product_id: 已知的商品ID
+
+        Returns:
+            str: SKU
+        """
+        if product_id is None:
+            product_id = self.extract_product_id(url)
+        return self._generate_cached(product_id, color, size)
+
+    def generate_batch(self, url, variants):
+        """
+        一次生成同一商品所有變體的 SKU
+
+        Args:
+            url: 商品URL
+            variants: [(color, size), ...]
+
+        Returns:
+            list: 與 variants 順序一致的 SKU
+        """
+        product_id = self.extract_product_id(url)
+        generate = self._generate_cached
+        return [generate(product_id, color, size) for color, size in variants]
+
+    def cache_info(self):
+        """SKU 快取命中統計"""
+        return self._generate_cached.cache_info()
+
+    def clear_cache(self):
+        """清除快取（修改 color_map 後呼叫）"""
+        self._generate_cached.cache_clear()
+        self._product_id_cached.cache_clear()
+
+
+def _factorize_column(values, name):
+    """
+    pandas.factorize 單一欄位；空值（None / NaN）的代碼為 -1，會被當成反向索引取到其他列的值，
+    因此與逐筆 engine.generate 一樣直接拋出錯誤
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    missing = np.flatnonzero(codes < 0)
+    if len(missing):
+        rows = ", ".join(str(row) for row in missing[:10].tolist())
+        raise ValueError(f"{name} 有 {len(missing)} 個空值（第 {rows}{' ...' if len(missing) > 10 else ''} 列）")
+    return codes, uniques
+
+
+def generate_skus_bulk(colors, sizes, urls=None, product_ids=None, engine=None):
+    """
+    以欄為單位批次生成 SKU（映射表核對用），結果與逐筆呼叫 engine.generate 相同
+    各欄先以 pandas.factorize 轉為整數代碼，商品ID / 顏色清理與代碼 / 尺寸清理只對不重複的值計算，
+    再以 NumPy 找出不重複的 (商品ID, 顏色, 尺寸) 組合，只對這些組合計算 Hash
+
+    Args:
+        colors: 日文顏色欄（list / NumPy 陣列 / pandas Series）
+        sizes: 尺寸欄
+        urls: 商品URL欄（與 product_ids 擇一）
+        product_ids: 商品ID欄
+        engine: 使用的 SkuEngine（預設為庫存同步引擎）
+
+    Returns:
+        pandas.Series: SKU 欄（輸入為 Series 時沿用其 index）
+
+    Raises:
+        ValueError: 任一欄有空值時（請先 dropna）
+    """
+    engine = engine or INVENTORY_SKU_ENGINE
+    index = colors.index if isinstance(colors, pd.Series) else None
+
+    color_codes, color_values = _factorize_column(colors, "colors")
+    size_codes, size_values = _factorize_column(sizes, "sizes")
+    if product_ids is not None:
+        pid_codes, pid_values = _factorize_column(product_ids, "product_ids")
+        pid_values = [str(value) for value in pid_values]
+    else:
+        pid_codes, url_values = _factorize_column(urls, "urls")
+        pid_values = [engine.extract_product_id(url) for url in url_values]
+
+    # 不重複值的清理結果與顏色代碼
+    color_values = [str(value) for value in color_values]
+    size_values = [str(value) for value in size_values]
+    clean_colors = [NON_WORD_PATTERN.sub('', value) for value in color_values]
+    codes = [clean_sku(engine.color_code(value)) for value in color_values]
+    clean_sizes = [NON_WORD_PATTERN.sub('', value) for value in size_values]
+    sku_sizes = [clean_sku(value) for value in size_values]
+
+    # 不重複的 (商品ID, 顏色, 尺寸) 組合
+    keys = (pid_codes.astype(np.int64) * len(color_values) + color_codes) * len(size_values) + size_codes
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    pid_index, rest = np.divmod(unique_keys, len(color_values) * len(size_values))
+    color_index, size_index = np.divmod(rest, len(size_values))
+
+    # 顏色代碼與尺寸已預先去除空白，Hash 為十六進位，組合後不需再清理
+    md5 = hashlib.md5
+    unique_skus = [
+        f"ZO-{md5(f'{pid_values[p]}-{clean_colors[c]}-{clean_sizes[z]}'.encode('utf-8')).hexdigest()[:4].upper()}"
+        f"-{codes[c]}-{sku_sizes[z]}"
+        for p, c, z in zip(pid_index.tolist(), color_index.tolist(), size_index.tolist())
+    ]
+
+    return pd.Series(np.asarray(unique_skus, dtype=object)[inverse.reshape(-1)], index=index, dtype=object)
+
+
+# ✅ 庫存 / 折扣同步共用的引擎（ZozoHtmlParser 與 ZozoDiscountSyncProcessor）
+INVENTORY_SKU_ENGINE = SkuEngine(INVENTORY_COLOR_MAP, INVENTORY_PRODUCT_ID_PATTERNS, fallback=FALLBACK_UNK)
@@ -0,0 +1,455 @@
+# zozo_state_store.py
+"""
+ZOZO 折扣同步狀態資料庫（SQLite，WAL 模式）
+保存追蹤 URL、每個商品最後抓到的 ZOZO 價格與最後寫入 Easy Store 的價格、價格歷史，
+以及每次同步執行與逐筆結果；統計與匯出直接以索引查詢，不需掃描記憶體中的列表
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from config import WORK_DIR
+from zozo_urls import extract_goods_id
+
+STATE_DB_FILE = os.path.join(WORK_DIR, "zozo_sync_state.db")
+RESULT_BATCH_SIZE = 50  # 結果累積到此筆數才寫入一次
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracked_urls (
+    url TEXT PRIMARY KEY,
+    goods_id TEXT,
+    position INTEGER NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS product_state (
+    goods_id TEXT PRIMARY KEY,
+    url TEXT,
+    price INTEGER,
+    default_price INTEGER,
+    discount_ratio TEXT,
+    discount_deadline TEXT,
+    fetched_at REAL,
+    product_id INTEGER,
+    written_price INTEGER,
+    written_at REAL,
+    additional_discount_enabled INTEGER
+);
+CREATE TABLE IF NOT EXISTS price_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    goods_id TEXT NOT NULL,
+    price INTEGER,
+    default_price INTEGER,
+    discount_ratio TEXT,
+    recorded_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    total INTEGER DEFAULT 0,
+    success INTEGER DEFAULT 0,
+    failed INTEGER DEFAULT 0,
+    unchanged INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS sync_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL,
+    url TEXT,
+    goods_id TEXT,
+    operation TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    outcome TEXT NOT NULL,
+    zozo_sku TEXT,
+    easy_sku TEXT,
+    product_id INTEGER,
+    zozo_discount INTEGER,
+    easy_discount INTEGER,
+    original_price INTEGER,
+    final_price INTEGER,
+    additional_discount INTEGER,
+    written_count INTEGER,
+    skipped_count INTEGER,
+    restored_count INTEGER,
+    discount_deadline TEXT,
+    error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sync_results_run ON sync_results (run_id);
+CREATE INDEX IF NOT EXISTS idx_sync_results_created ON sync_results (created_at);
+CREATE INDEX IF NOT EXISTS idx_sync_results_goods ON sync_results (goods_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_price_history_goods ON price_history (goods_id, recorded_at);
+CREATE INDEX IF NOT EXISTS idx_sync_runs_started ON sync_runs (started_at);
+"""
+
+# sync_results 欄位 -> 同步結果 dict 的鍵（查詢時以同名鍵回傳，匯出程式沿用原本的結果格式）
+RESULT_COLUMNS = (
+    ("url", "url"),
+    ("goods_id", "goods_id"),
+    ("operation", "operation"),
+    ("success", "success"),
+    ("outcome", "outcome"),
+    ("zozo_sku", "zozo_sku"),
+    ("easy_sku", "easy_sku"),
+    ("product_id", "product_id"),
+    ("zozo_discount", "zozo_discount"),
+    ("easy_discount", "easy_discount"),
+    ("original_price", "original_price"),
+    ("final_price", "final_price"),
+    ("additional_discount", "additional_discount_applied"),
+    ("written_count", "updated_variants_count"),
+    ("skipped_count", "skipped_variants_count"),
+    ("restored_count", "restored_variants_count"),
+    ("discount_deadline", "discount_deadline"),
+    ("error", "error"),
+    ("created_at", "timestamp"),
+)
+
+
+def _to_int(value):
+    """價格等欄位轉為整數，空值或無法轉換時為 None"""
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def result_outcome(result):
+    """同步結果的分類：success / failed / unchanged"""
+    if result.get('outcome'):
+        return result['outcome']
+    return 'success' if result.get('success') else 'failed'
+
+
+class ZozoStateStore:
+    """同步狀態資料庫"""
+
+    def __init__(self, db_file=STATE_DB_FILE, batch_size=RESULT_BATCH_SIZE):
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self._lock = threading.RLock()
+        self._pending = []
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.commit()
+
+    def _migrate(self):
+        """為舊版資料庫加入新增的欄位"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(product_state)")}
+        if 'additional_discount_enabled' not in columns:
+            self._conn.execute("ALTER TABLE product_state ADD COLUMN additional_discount_enabled INTEGER")
+
+    # ---------- 追蹤 URL ----------
+
+    def replace_tracked_urls(self, urls):
+        """以目前的 URL 列表取代資料庫中的追蹤 URL（保留原本的加入時間）"""
+        now = time.time()
+        with self._lock, self._conn:
+            added_at = dict(self._conn.execute("SELECT url, added_at FROM tracked_urls"))
+            self._conn.execute("DELETE FROM tracked_urls")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tracked_urls (url, goods_id, position, added_at) VALUES (?, ?, ?, ?)",
+                [(url, extract_goods_id(url), position, added_at.get(url, now)) for position, url in enumerate(urls)]
+            )
+
+    def get_tracked_urls(self):
+        """依原本順序取得追蹤 URL"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT url FROM tracked_urls ORDER BY position")]
+
+    # ---------- 商品狀態 ----------
+
+    def get_product_state(self, goods_id):
+        """取得商品最後一次的價格狀態，沒有紀錄時為 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM product_state WHERE goods_id = ?", (goods_id,)).fetchone()
+        return dict(row) if row else None
+
+    def is_price_unchanged(self, goods_id, price, default_price, discount_ratio, additional_discount=False):
+        """
+        ZOZO 價格、原價、折扣比例與高價額外折扣設定是否與最後一次成功寫入時相同（增量同步用）
+        """
+        state = self.get_product_state(goods_id)
+        return (
+            state is not None
+            and state['written_at'] is not None
+            and (state['price'], state['default_price'], state['discount_ratio'], state['additional_discount_enabled'])
+            == (_to_int(price), _to_int(default_price), discount_ratio or '', 1 if additional_discount else 0)
+        )
+
+    def get_discounted_products(self):
+        """目前在 Easy Store 以折扣價販售且有折扣截止時間的商品（自動還原用）"""
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute(
+                "SELECT goods_id, url, product_id, discount_deadline, fetched_at FROM product_state "
+                "WHERE written_at IS NOT NULL AND product_id IS NOT NULL AND discount_deadline != ''"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def mark_restored(self, goods_ids):
+        """
+        記錄商品已還原為原價：清除截止時間與最後寫入的價格，
+        下次增量同步會重新寫入 ZOZO 的目前折扣
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE product_state SET discount_deadline = '', written_price = NULL, written_at = NULL "
+                "WHERE goods_id = ?",
+                [(goods_id,) for goods_id in goods_ids]
+            )
+
+    def _update_product_state_locked(self, result, now):
+        """
+        依同步結果更新商品狀態，ZOZO 價格有變動時加入價格歷史
+        商品狀態只在同步成功時更新，寫入失敗的商品下次增量同步仍會重新處理
+        還原成功時與 mark_restored 相同清除最後寫入的價格，下次增量同步會重新寫入折扣
+        """
+        goods_id = extract_goods_id(result.get('url'))
+        if not goods_id:
+            return
+        if result.get('operation') == 'restore':
+            if result.get('success'):
+                self._conn.execute(
+                    "UPDATE product_state SET discount_deadline = '', written_price = NULL, written_at = NULL "
+                    "WHERE goods_id = ?",
+                    (goods_id,)
+                )
+            return
+        if 'zozo_price' not in result:
+            return
+
+        price = _to_int(result.get('zozo_price'))
+        default_price = _to_int(result.get('original_price'))
+        discount_ratio = result.get('zozo_discount_ratio') or ''
+        previous = self._conn.execute(
+            "SELECT price, default_price, discount_ratio FROM price_history "
+            "WHERE goods_id = ? ORDER BY recorded_at DESC, id DESC LIMIT 1",
+            (goods_id,)
+        ).fetchone()
+
+        if previous is None or tuple(previous) != (price, default_price, discount_ratio):
+            self._conn.execute(
+                "INSERT INTO price_history (goods_id, price, default_price, discount_ratio, recorded_at) VALUES (?, ?, ?, ?, ?)",
+                (goods_id, price, default_price, discount_ratio, now)
+            )
+        if not result.get('success'):
+            return
+
+        # 未變動的結果沒有寫入 Easy Store，保留上次寫入的價格
+        written = result.get('operation', 'discount') == 'discount' and result_outcome(result) != 'unchanged'
+        self._conn.execute(
+            """
+            INSERT INTO product_state (goods_id, url, price, default_price, discount_ratio, discount_deadline,
+                                       fetched_at, product_id, written_price, written_at, additional_discount_enabled)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(goods_id) DO UPDATE SET
+                url = excluded.url,
+                price = excluded.price,
+                default_price = excluded.default_price,
+                discount_ratio = excluded.discount_ratio,
+                discount_deadline = excluded.discount_deadline,
+                fetched_at = excluded.fetched_at,
+                product_id = COALESCE(excluded.product_id, product_state.product_id),
+                written_price = CASE WHEN ? THEN excluded.written_price ELSE product_state.written_price END,
+                written_at = CASE WHEN ? THEN excluded.written_at ELSE product_state.written_at END,
+                additional_discount_enabled = CASE WHEN ? THEN excluded.additional_discount_enabled
+                                                   ELSE product_state.additional_discount_enabled END
+            """,
+            (goods_id, result.get('url'), price, default_price, discount_ratio, result.get('discount_deadline', ''),
+             now, _to_int(result.get('product_id')), _to_int(result.get('final_price')) if written else None,
+             now if written else None, (1 if result.get('additional_discount_enabled') else 0) if written else None,
+             bool(written), bool(written), bool(written))
+        )
+
+    # ---------- 同步執行與結果 ----------
+
+    def start_run(self, kind, total=0):
+        """
+        開始一次同步執行
+
+        Args:
+            kind: manual / schedule / restore
+            total: URL 數
+
+        Returns:
+            int: run_id
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO sync_runs (kind, started_at, total) VALUES (?, ?, ?)", (kind, time.time(), total)
+            )
+            return cursor.lastrowid
+
+    def add_results(self, run_id, results, operation='discount'):
+        """加入同步結果（累積到 batch_size 筆才寫入）"""
+        with self._lock:
+            self._pending.extend((run_id, operation, dict(result)) for result in results)
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """寫入所有尚未寫入的結果（寫入失敗時保留至下次）"""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            now = time.time()
+            rows = []
+            for run_id, operation, result in pending:
+                result.setdefault('operation', operation)
+                rows.append((
+                    run_id,
+                    result.get('url'),
+                    extract_goods_id(result.get('url')),
+                    operation,
+                    1 if result.get('success') else 0,
+                    result_outcome(result),
+                    result.get('zozo_sku'),
+                    result.get('easy_sku'),
+                    _to_int(result.get('product_id')),
+                    _to_int(result.get('zozo_discount')),
+                    _to_int(result.get('easy_discount')),
+                    _to_int(result.get('original_price')),
+                    _to_int(result.get('final_price')),
+                    1 if result.get('additional_discount_applied') else 0,
+                    _to_int(result.get('updated_variants_count')),
+                    _to_int(result.get('skipped_variants_count')),
+                    _to_int(result.get('restored_variants_count')),
+                    result.get('discount_deadline'),
+                    result.get('error'),
+                    now
+                ))
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        f"INSERT INTO sync_results (run_id, {', '.join(column for column, _ in RESULT_COLUMNS)}) "
+                        f"VALUES ({', '.join('?' * (len(RESULT_COLUMNS) + 1))})",
+                        rows
+                    )
+                    # 同一批次中每個商品只需以最後一筆結果更新狀態
+                    latest = {extract_goods_id(result.get('url')): result for _, _, result in pending}
+                    for result in latest.values():
+                        self._update_product_state_locked(result, now)
+            except sqlite3.Error as e:
+                # 保留未寫入的結果（例如資料庫暫時鎖定），下次 flush 時重新寫入
+                self._pending = pending + self._pending
+                logging.error(f"寫入同步結果失敗，{len(pending)} 筆結果將於下次重試: {e}")
+
+    def finish_run(self, run_id):
+        """結束同步執行，寫入剩餘結果並彙總成功 / 失敗 / 未變動數"""
+        with self._lock:
+            self.flush()
+            with self._conn:
+                self._conn.execute(
+                    """
+                    UPDATE sync_runs SET
+                        finished_at = ?,
+                        success = (SELECT COUNT(*) FROM sync_results WHERE run_id = ? AND outcome = 'success'),
+                        failed = (SELECT COUNT(*) FROM sync_results WHERE run_id = ? AND outcome = 'failed'),
+                        unchanged = (SELECT COUNT(*) FROM sync_results WHERE run_id = ? AND outcome = 'unchanged')
+                    WHERE id = ?
+                    """,
+                    (time.time(), run_id, run_id, run_id, run_id)
+                )
+
+    def get_run_results(self, run_id):
+        """取得某次執行的所有結果（dict 鍵與 sync_discount 的結果相同）"""
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute(
+                f"SELECT {', '.join(column for column, _ in RESULT_COLUMNS)} FROM sync_results WHERE run_id = ? ORDER BY id",
+                (run_id,)
+            ).fetchall()
+        results = []
+        for row in rows:
+            result = {key: row[column] for column, key in RESULT_COLUMNS}
+            result['success'] = bool(result['success'])
+            result['additional_discount_applied'] = bool(result['additional_discount_applied'])
+            results.append(result)
+        return results
+
+    def get_run_summary(self, run_id):
+        """某次執行的彙總（總數、成功、失敗、未變動、總節省金額）"""
+        with self._lock:
+            self.flush()
+            row = self._conn.execute(
+                """
+                SELECT COUNT(*) AS total,
+                       SUM(outcome = 'success') AS success,
+                       SUM(outcome = 'failed') AS failed,
+                       SUM(outcome = 'unchanged') AS unchanged,
+                       SUM(CASE WHEN outcome = 'success' AND original_price AND final_price
+                                THEN original_price - final_price ELSE 0 END) AS savings
+                FROM sync_results WHERE run_id = ?
+                """,
+                (run_id,)
+            ).fetchone()
+        return {key: row[key] or 0 for key in row.keys()}
+
+    def get_stats(self, since=None):
+        """
+        折扣同步統計
+
+        Args:
+            since: 只統計此時間（epoch 秒）之後的結果，None 表示全部
+
+        Returns:
+            dict: total, success, failed, unchanged, total_savings, avg_discount, last_sync（epoch 秒或 None）
+        """
+        with self._lock:
+            self.flush()
+            row = self._conn.execute(
+                """
+                SELECT COUNT(*) AS total,
+                       SUM(outcome = 'success') AS success,
+                       SUM(outcome = 'failed') AS failed,
+                       SUM(outcome = 'unchanged') AS unchanged,
+                       SUM(CASE WHEN outcome = 'success' AND original_price AND final_price
+                                THEN original_price - final_price ELSE 0 END) AS total_savings,
+                       AVG(CASE WHEN outcome = 'success' AND easy_discount THEN easy_discount END) AS avg_discount,
+                       MAX(CASE WHEN success THEN created_at END) AS last_sync
+                FROM sync_results
+                WHERE operation = 'discount' AND created_at >= ?
+                """,
+                (since or 0,)
+            ).fetchone()
+        stats = {key: row[key] for key in row.keys()}
+        for key in ('total', 'success', 'failed', 'unchanged', 'total_savings', 'avg_discount'):
+            stats[key] = stats[key] or 0
+        return stats
+
+    def get_price_history(self, goods_id, limit=100):
+        """商品的 ZOZO 價格歷史（新到舊）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT price, default_price, discount_ratio, recorded_at FROM price_history "
+                "WHERE goods_id = ? ORDER BY recorded_at DESC LIMIT ?",
+                (goods_id, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        """寫入剩餘結果並關閉資料庫"""
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+
+_state_store = None
+_state_store_lock = threading.Lock()
+
+
+def get_state_store():
+    """取得全局狀態資料庫"""
+    global _state_store
+    with _state_store_lock:
+        if _state_store is None:
+            _state_store = ZozoStateStore()
+        return _state_store
@@ -0,0 +1,281 @@
+# zozo_tiered_fetcher.py
+"""
+ZOZO 分層抓取器
+先以共用連線池的 requests.Session 直接抓取 HTML，
+只有在缺少解析所需的區塊或遇到 Cloudflare 驗證時才升級為 Selenium 瀏覽器
+並記錄每個商店的 HTTP 成功率，自動學習哪些商店需要直接使用瀏覽器
+"""
+
+import os
+import re
+import json
+import time
+import atexit
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from config import WORK_DIR
+from zozo_urls import SHOP_PATTERN
+
+# HTTP 抓取設定
+HTTP_TIMEOUT = 15
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'ja,en-US;q=0.7,en;q=0.3',
+}
+
+# 商店學習設定
+SHOP_STATS_FILE = os.path.join(WORK_DIR, "zozo_shop_fetch_stats.json")
+MIN_HTTP_SAMPLES = 5          # 至少嘗試幾次 HTTP 才開始判斷
+MIN_HTTP_SUCCESS_RATE = 0.3   # HTTP 成功率低於此值的商店直接使用瀏覽器
+HTTP_REPROBE_EVERY = 20       # 直接使用瀏覽器的商店，每 N 次仍重新嘗試一次 HTTP
+
+# ✅ parse_stocks / parse_price 依賴的頁面區塊
+STOCK_BLOCK_PATTERN = re.compile(r'<dl\b[^>]*class="[^"]*\bp-goods-information-action(?=[\s"])')
+PRICE_BLOCK_PATTERN = re.compile(
+    r'class="[^"]*\b(?:p-goods-information__price(?:--discount)?|price-value)(?=[\s"])'
+)
+# ✅ 只使用驗證頁特有的標記（/cdn-cgi/challenge-platform/ 腳本也會注入一般頁面，不能作為判斷依據）
+CLOUDFLARE_MARKERS = (
+    "cf-browser-verification",
+    "cf_chl_opt",
+    "checking your browser",
+    "<title>just a moment...</title>",
+)
+
+
+def has_required_markers(html):
+    """檢查 HTML 是否包含庫存區塊與價格區塊"""
+    if not html:
+        return False
+    return bool(STOCK_BLOCK_PATTERN.search(html)) and bool(PRICE_BLOCK_PATTERN.search(html))
+
+
+def is_cloudflare_challenge(html):
+    """檢查 HTML 是否為 Cloudflare 驗證頁"""
+    if not html:
+        return False
+    lowered = html[:20000].lower()
+    return any(marker in lowered for marker in CLOUDFLARE_MARKERS)
+
+
+def extract_shop(url):
+    """從 URL 取得商店代碼（例如 mono-mart）"""
+    match = SHOP_PATTERN.search(url or "")
+    return match.group(1).lower() if match else "_unknown"
+
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_zozo_http_session(pool_maxsize=8):
+    """取得共用的 ZOZO HTTP Session（keep-alive 連線池）"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(HTTP_HEADERS)
+            _http_session = session
+        return _http_session
+
+
+class ShopFetchStats:
+    """每個商店的 HTTP / 瀏覽器抓取成功率統計（持久化為 JSON）"""
+
+    def __init__(self, stats_file=SHOP_STATS_FILE):
+        self.stats_file = stats_file
+        self._stats = {}
+        self._dirty = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # 多個工作線程同時儲存時依序寫入
+        self.load()
+
+    def load(self):
+        """載入統計檔案"""
+        try:
+            if self.stats_file and os.path.exists(self.stats_file):
+                with open(self.stats_file, 'r', encoding='utf-8') as f:
+                    self._stats = json.load(f)
+        except Exception as e:
+            logging.warning(f"載入商店抓取統計失敗: {e}")
+            self._stats = {}
+
+    def save(self):
+        """儲存統計檔案（先寫暫存檔再取代，避免寫到一半的檔案）"""
+        if not self.stats_file:
+            return
+        with self._save_lock:
+            with self._lock:
+                data = json.loads(json.dumps(self._stats))
+                self._dirty = 0
+            try:
+                tmp_path = f"{self.stats_file}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=4, ensure_ascii=False)
+                os.replace(tmp_path, self.stats_file)
+            except Exception as e:
+                logging.warning(f"儲存商店抓取統計失敗: {e}")
+
+    def record(self, shop, tier, success):
+        """記錄一次抓取結果；tier 為 http 或 browser"""
+        with self._lock:
+            entry = self._stats.setdefault(shop, {
+                "http_ok": 0, "http_fail": 0, "browser_ok": 0, "browser_fail": 0, "skipped_http": 0
+            })
+            entry[f"{tier}_{'ok' if success else 'fail'}"] += 1
+            self._dirty += 1
+            should_save = self._dirty >= 10
+        if should_save:
+            self.save()
+
+    def http_success_rate(self, shop):
+        """回傳 (HTTP 成功率, 嘗試次數)"""
+        with self._lock:
+            entry = self._stats.get(shop, {})
+            attempts = entry.get("http_ok", 0) + entry.get("http_fail", 0)
+            rate = entry.get("http_ok", 0) / attempts if attempts else 1.0
+            return rate, attempts
+
+    def should_try_http(self, shop):
+        """判斷此商店是否值得先嘗試 HTTP"""
+        rate, attempts = self.http_success_rate(shop)
+        if attempts < MIN_HTTP_SAMPLES or rate >= MIN_HTTP_SUCCESS_RATE:
+            return True
+
+        with self._lock:
+            entry = self._stats.setdefault(shop, {})
+            entry["skipped_http"] = entry.get("skipped_http", 0) + 1
+            self._dirty += 1
+            should_save = self._dirty >= 10
+            # 定期重新嘗試，讓商店在 ZOZO 調整後能重新回到 HTTP 快速路徑
+            reprobe = entry["skipped_http"] % HTTP_REPROBE_EVERY == 0
+        if should_save:
+            self.save()
+        return reprobe
+
+    def snapshot(self):
+        """取得統計資料副本"""
+        with self._lock:
+            return json.loads(json.dumps(self._stats))
+
+
+class ZozoTieredFetcher:
+    """分層抓取器：HTTP 快速路徑 → Selenium 瀏覽器備援"""
+
+    def __init__(self, browser_fetch=None, headless=True, stats_file=SHOP_STATS_FILE, timeout=HTTP_TIMEOUT):
+        self.headless = headless
+        self.timeout = timeout
+        self.stats = ShopFetchStats(stats_file)
+        self._browser_fetch = browser_fetch
+
+    @property
+    def browser_fetch(self):
+        """延遲載入 Selenium 抓取函數（只用 HTTP 時不需啟動瀏覽器模組）"""
+        if self._browser_fetch is None:
+            from zozo_selenium_fetcher import fetch_html_from_url_optimized
+            self._browser_fetch = fetch_html_from_url_optimized
+        return self._browser_fetch
+
+    def _request_http(self, url, etag=None, last_modified=None):
+        """送出 HTTP 請求；提供 ETag / Last-Modified 時改為條件式請求"""
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return get_zozo_http_session().get(url, timeout=self.timeout, headers=headers or None)
+
+    def _check_http_response(self, response):
+        """檢查 HTTP 回應是否可直接解析；回傳失敗原因，可用時為 None"""
+        html = response.text
+        if response.status_code == 200 and has_required_markers(html):
+            return None
+        # 只有無法使用的回應才判斷失敗原因
+        if is_cloudflare_challenge(html):
+            return "Cloudflare 驗證"
+        if response.status_code != 200:
+            return f"HTTP {response.status_code}"
+        return "缺少商品資訊區塊"
+
+    def fetch_detailed(self, url, headless=None, etag=None, last_modified=None):
+        """
+        分層抓取商品頁，並回傳快取驗證所需的標頭
+        提供 etag / last_modified 時 HTTP 路徑會以條件式請求重新驗證
+
+        Returns:
+            dict: html, source（http / browser / not_modified）, etag, last_modified
+        """
+        shop = extract_shop(url)
+        headless = self.headless if headless is None else headless
+
+        if self.stats.should_try_http(shop):
+            start_time = time.time()
+            try:
+                response = self._request_http(url, etag, last_modified)
+                if response.status_code == 304:
+                    self.stats.record(shop, "http", True)
+                    print(f"♻️ 頁面未變更 (304, {time.time() - start_time:.1f}s): {url}")
+                    return {"html": "", "source": "not_modified", "etag": etag, "last_modified": last_modified}
+                reason = self._check_http_response(response)
+            except requests.RequestException as e:
+                response, reason = None, f"HTTP 請求失敗: {e}"
+            self.stats.record(shop, "http", reason is None)
+
+            if reason is None:
+                print(f"⚡ HTTP 快速抓取成功 ({time.time() - start_time:.1f}s): {url}")
+                return {
+                    "html": response.text,
+                    "source": "http",
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified")
+                }
+            print(f"↗️ HTTP 抓取不完整（{reason}），改用瀏覽器: {url}")
+
+        html = self.browser_fetch(url, headless=headless)
+        self.stats.record(shop, "browser", bool(html) and len(html) >= 1000)
+        return {"html": html, "source": "browser", "etag": None, "last_modified": None}
+
+    def fetch(self, url, headless=None):
+        """分層抓取商品頁 HTML"""
+        return self.fetch_detailed(url, headless=headless)["html"]
+
+
+_tiered_fetcher = None
+_tiered_fetcher_lock = threading.Lock()
+
+
+def get_tiered_fetcher():
+    """取得全局分層抓取器"""
+    global _tiered_fetcher
+    with _tiered_fetcher_lock:
+        if _tiered_fetcher is None:
+            _tiered_fetcher = ZozoTieredFetcher()
+        return _tiered_fetcher
+
+
+def fetch_html_tiered(url, headless=True):
+    """便利函數：與 fetch_html_from_url_optimized 相同介面的分層抓取"""
+    return get_tiered_fetcher().fetch(url, headless=headless)
+
+
+def save_shop_fetch_stats():
+    """儲存商店抓取統計（程式結束前呼叫）"""
+    if _tiered_fetcher is not None:
+        _tiered_fetcher.stats.save()
+
+
+atexit.register(save_shop_fetch_stats)
+
+
+if __name__ == "__main__":
+    test_url = "https://zozo.jp/shop/mono-mart/goods-sale/73746072/?did=121049876"
+    html = fetch_html_tiered(test_url)
+    print(f"測試結果：{'成功' if html else '失敗'}，HTML長度: {len(html or ''):,}")
+    print(json.dumps(get_tiered_fetcher().stats.snapshot(), indent=2, ensure_ascii=False))
+    save_shop_fetch_stats()
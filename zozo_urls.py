@@ -0,0 +1,62 @@
+# zozo_urls.py
+"""
+ZOZO 商品 URL 正規化
+同一商品的 URL 可能只差在查詢參數（?did=...&rid=...）或 /goods/ 與 /goods-sale/，
+以商品ID（goods ID）合併後每個商品只需抓取、解析一次
+"""
+
+import re
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+# ✅ 與 SKU 生成相同的商品ID規則（支援 goods-sale 格式）
+GOODS_ID_PATTERN = re.compile(r'/goods(?:-sale)?[/-](\d+)')
+SHOP_PATTERN = re.compile(r'/shop/([^/?#]+)')
+
+
+def extract_goods_id(url):
+    """從 URL 取得商品ID，找不到時回傳 None"""
+    match = GOODS_ID_PATTERN.search(url or "")
+    return match.group(1) if match else None
+
+
+def canonicalize_url(url):
+    """
+    商品 URL 正規化：去除查詢參數與錨點，goods-sale 統一為 goods
+
+    Returns:
+        str: 例如 https://zozo.jp/shop/mono-mart/goods/73746072/；無法辨識商品ID時只去除查詢參數
+    """
+    url = (url or "").strip()
+    parts = urlsplit(url)
+    goods_id = extract_goods_id(parts.path)
+    if goods_id is None:
+        return f"{parts.scheme}://{parts.netloc.lower()}{parts.path}" if parts.netloc else url
+
+    shop_match = SHOP_PATTERN.search(parts.path)
+    shop_path = f"/shop/{shop_match.group(1)}" if shop_match else ""
+    return f"https://{parts.netloc.lower() or 'zozo.jp'}{shop_path}/goods/{goods_id}/"
+
+
+def dedupe_key(url):
+    """判斷是否為同一商品的鍵：商品ID，無法辨識時為正規化 URL"""
+    return extract_goods_id(url) or canonicalize_url(url)
+
+
+def group_urls(urls):
+    """
+    依商品合併 URL
+
+    Args:
+        urls: URL 列表
+
+    Returns:
+        OrderedDict: 代表 URL（每個商品第一次出現的 URL）-> 同一商品的所有 URL（保持輸入順序）
+    """
+    groups = OrderedDict()
+    representatives = {}
+    for url in urls:
+        key = dedupe_key(url)
+        representative = representatives.setdefault(key, url)
+        groups.setdefault(representative, []).append(url)
+    return groups